@@ -21,9 +21,14 @@ class CommunitySerializer(serializers.ModelSerializer):
                            'total_answers', 'created_at']
     
     def get_members_count(self, obj):
+        # Querysets that serialize many communities annotate the counts (see qa.views)
+        if hasattr(obj, 'members_count'):
+            return obj.members_count
         return obj.members.count()
     
     def get_mentors_count(self, obj):
+        if hasattr(obj, 'mentors_count'):
+            return obj.mentors_count
         return obj.mentors.count()
 
 
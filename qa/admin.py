@@ -1,5 +1,9 @@
 from django.contrib import admin
-from .models import Question, Answer, LearningJournal, AIService, UserPreference
+from .models import (
+    Question, Answer, Vote, DailyViewerSketch, LearningJournal, ConfidenceSummary, LearningPathCache, AIService,
+    AIServiceArchive, AIJob, AIUsageRollup, AIBudgetBucket, UserPreference
+)
+from .ai_archive import load_archived_record
 
 
 @admin.register(Question)
@@ -7,8 +11,8 @@ class QuestionAdmin(admin.ModelAdmin):
     """Admin configuration for Question model"""
     
     list_display = ('title', 'author', 'community', 'is_resolved', 'view_count', 
-                   'created_at', 'is_featured')
-    list_filter = ('is_resolved', 'is_featured', 'community', 'created_at')
+                   'ai_status', 'created_at', 'is_featured')
+    list_filter = ('is_resolved', 'is_featured', 'ai_status', 'community', 'created_at')
     search_fields = ('title', 'content', 'author__username', 'community__name')
     readonly_fields = ('id', 'view_count', 'created_at', 'updated_at')
     date_hierarchy = 'created_at'
@@ -18,7 +22,7 @@ class QuestionAdmin(admin.ModelAdmin):
             'fields': ('title', 'content', 'author', 'community', 'tags')
         }),
         ('AI Enhancement', {
-            'fields': ('ai_improved_title', 'ai_improved_content', 'ai_suggested_tags', 'ai_similar_questions'),
+            'fields': ('ai_status', 'ai_improved_title', 'ai_improved_content', 'ai_suggested_tags', 'ai_similar_questions'),
             'classes': ('collapse',)
         }),
         ('Status', {
@@ -39,34 +43,34 @@ class AnswerAdmin(admin.ModelAdmin):
                    'mentor_verified', 'vote_score', 'created_at')
     list_filter = ('is_accepted', 'mentor_verified', 'confidence_level', 'created_at')
     search_fields = ('content', 'author__username', 'question__title')
-    readonly_fields = ('id', 'vote_score', 'upvotes_count', 'downvotes_count', 'created_at', 'updated_at')
+    readonly_fields = ('id', 'score', 'upvote_count', 'downvote_count', 'created_at', 'updated_at')
     date_hierarchy = 'created_at'
     
     def vote_score(self, obj):
-        return obj.get_vote_score()
+        return obj.score
     vote_score.short_description = 'Vote Score'
+    vote_score.admin_order_field = 'score'
     
-    def upvotes_count(self, obj):
-        return obj.upvotes.count()
-    upvotes_count.short_description = 'Upvotes'
-    
-    def downvotes_count(self, obj):
-        return obj.downvotes.count()
-    downvotes_count.short_description = 'Downvotes'
+    def save_model(self, request, obj, form, change):
+        # The vote counters are read-only here; writing only the edited fields keeps concurrent votes
+        if change:
+            obj.save(update_fields=[*form.changed_data, 'updated_at'])
+        else:
+            obj.save()
     
     fieldsets = (
         ('Basic Information', {
             'fields': ('question', 'author', 'content', 'confidence_level')
         }),
         ('AI Feedback', {
-            'fields': ('ai_feedback', 'ai_improved_content', 'ai_suggestions'),
+            'fields': ('ai_status', 'ai_feedback', 'ai_improved_content', 'ai_suggestions'),
             'classes': ('collapse',)
         }),
         ('Status', {
             'fields': ('is_accepted', 'mentor_verified', 'verified_by')
         }),
         ('Voting', {
-            'fields': ('upvotes', 'downvotes'),
+            'fields': ('score', 'upvote_count', 'downvote_count'),
             'classes': ('collapse',)
         }),
         ('Timestamps', {
@@ -76,6 +80,17 @@ class AnswerAdmin(admin.ModelAdmin):
     )
 
 
+@admin.register(Vote)
+class VoteAdmin(admin.ModelAdmin):
+    """Admin configuration for Vote model"""
+    
+    list_display = ('answer', 'user', 'value', 'updated_at')
+    list_filter = ('value',)
+    search_fields = ('user__username', 'answer__question__title')
+    raw_id_fields = ('answer', 'user')
+    readonly_fields = ('id', 'created_at', 'updated_at')
+
+
 @admin.register(LearningJournal)
 class LearningJournalAdmin(admin.ModelAdmin):
     """Admin configuration for LearningJournal model"""
@@ -104,28 +119,63 @@ class LearningJournalAdmin(admin.ModelAdmin):
     )
 
 
+@admin.register(DailyViewerSketch)
+class DailyViewerSketchAdmin(admin.ModelAdmin):
+    """Admin configuration for DailyViewerSketch model"""
+    
+    list_display = ('question', 'day')
+    list_filter = ('day',)
+    search_fields = ('question__title',)
+    raw_id_fields = ('question',)
+    readonly_fields = ('id',)
+
+
+@admin.register(ConfidenceSummary)
+class ConfidenceSummaryAdmin(admin.ModelAdmin):
+    """Admin configuration for ConfidenceSummary model"""
+    
+    list_display = ('user', 'answer_count', 'accepted_count', 'ewma', 'last_answer_at', 'updated_at')
+    search_fields = ('user__username',)
+    readonly_fields = ('id', 'updated_at')
+
+
+@admin.register(LearningPathCache)
+class LearningPathCacheAdmin(admin.ModelAdmin):
+    """Admin configuration for LearningPathCache model"""
+    
+    list_display = ('user', 'is_stale', 'generated_at', 'updated_at')
+    list_filter = ('is_stale',)
+    search_fields = ('user__username',)
+    readonly_fields = ('id', 'fingerprint', 'updated_at')
+
+
 @admin.register(AIService)
 class AIServiceAdmin(admin.ModelAdmin):
     """Admin configuration for AIService model"""
     
-    list_display = ('service_type', 'processing_time', 'tokens_used', 'created_at')
+    list_display = ('service_type', 'community', 'processing_time', 'tokens_used', 'created_at')
     list_filter = ('service_type', 'created_at')
     search_fields = ('input_text', 'output_text')
-    readonly_fields = ('id', 'processing_time', 'tokens_used', 'created_at')
+    readonly_fields = ('id', 'processing_time', 'prompt_tokens', 'completion_tokens', 'tokens_used', 'created_at')
+    raw_id_fields = ('user', 'community')
     date_hierarchy = 'created_at'
     
     fieldsets = (
         ('Service Information', {
-            'fields': ('service_type', 'input_text', 'output_text')
+            'fields': ('service_type', 'user', 'community', 'input_text', 'output_text')
         }),
         ('Performance', {
-            'fields': ('processing_time', 'tokens_used'),
+            'fields': ('processing_time', 'prompt_tokens', 'completion_tokens', 'tokens_used'),
             'classes': ('collapse',)
         }),
         ('Metadata', {
             'fields': ('metadata',),
             'classes': ('collapse',)
         }),
+        ('Cache', {
+            'fields': ('cache_key', 'expires_at'),
+            'classes': ('collapse',)
+        }),
         ('Timestamps', {
             'fields': ('created_at',),
             'classes': ('collapse',)
@@ -133,6 +183,107 @@ class AIServiceAdmin(admin.ModelAdmin):
     )
 
 
+@admin.register(AIServiceArchive)
+class AIServiceArchiveAdmin(admin.ModelAdmin):
+    """Admin configuration for archived AIService records; content is read from the archive on demand"""
+    
+    list_display = ('service_type', 'created_at', 'archive_file', 'output_stored', 'archived_at')
+    list_filter = ('service_type', 'archive_file')
+    search_fields = ('id', 'output_hash')
+    date_hierarchy = 'created_at'
+    readonly_fields = (
+        'id', 'service_type', 'created_at', 'archive_file', 'offset', 'length',
+        'output_hash', 'output_stored', 'archived_at', 'archived_input', 'archived_output', 'archived_details'
+    )
+    
+    fieldsets = (
+        ('Service Information', {
+            'fields': ('id', 'service_type', 'created_at', 'archived_at')
+        }),
+        ('Archived Content', {
+            'fields': ('archived_input', 'archived_output', 'archived_details')
+        }),
+        ('Storage', {
+            'fields': ('archive_file', 'offset', 'length', 'output_hash', 'output_stored'),
+            'classes': ('collapse',)
+        }),
+    )
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def _record(self, obj):
+        # Decompressed once per change view, not for list pages
+        if getattr(obj, '_archived_record', None) is None:
+            try:
+                obj._archived_record = load_archived_record(obj)
+            except (OSError, LookupError, ValueError) as e:
+                obj._archived_record = {'error': str(e)}
+        return obj._archived_record
+    
+    @admin.display(description='Input')
+    def archived_input(self, obj):
+        record = self._record(obj)
+        return record.get('input_text', record.get('error', ''))
+    
+    @admin.display(description='Output')
+    def archived_output(self, obj):
+        return self._record(obj).get('output_text', '')
+    
+    @admin.display(description='Details')
+    def archived_details(self, obj):
+        record = self._record(obj)
+        return {
+            key: record.get(key)
+            for key in ('user_id', 'community_id', 'processing_time', 'prompt_tokens', 'completion_tokens')
+        }
+
+
+@admin.register(AIJob)
+class AIJobAdmin(admin.ModelAdmin):
+    """Admin configuration for AIJob model"""
+    
+    list_display = ('job_type', 'status', 'attempts', 'locked_by', 'created_at', 'finished_at')
+    list_filter = ('job_type', 'status', 'created_at')
+    search_fields = ('last_error', 'locked_by')
+    readonly_fields = ('id', 'created_at', 'finished_at')
+    raw_id_fields = ('question', 'answer', 'user')
+    date_hierarchy = 'created_at'
+    
+    fieldsets = (
+        ('Job', {
+            'fields': ('job_type', 'status', 'question', 'answer', 'user')
+        }),
+        ('Execution', {
+            'fields': ('attempts', 'run_after', 'locked_by', 'locked_at', 'last_error', 'result')
+        }),
+        ('Timestamps', {
+            'fields': ('created_at', 'finished_at'),
+            'classes': ('collapse',)
+        }),
+    )
+
+
+@admin.register(AIUsageRollup)
+class AIUsageRollupAdmin(admin.ModelAdmin):
+    """Admin configuration for AIUsageRollup model"""
+    
+    list_display = ('service_type', 'period', 'bucket_start', 'calls', 'prompt_tokens', 'completion_tokens')
+    list_filter = ('period', 'service_type')
+    readonly_fields = ('id', 'updated_at')
+    date_hierarchy = 'bucket_start'
+
+
+@admin.register(AIBudgetBucket)
+class AIBudgetBucketAdmin(admin.ModelAdmin):
+    """Admin configuration for AIBudgetBucket model"""
+    
+    list_display = ('scope', 'key', 'tokens', 'refilled_at')
+    list_filter = ('scope',)
+    search_fields = ('key',)
+    readonly_fields = ('id', 'version')
+
+
 @admin.register(UserPreference)
 class UserPreferenceAdmin(admin.ModelAdmin):
     """Admin configuration for UserPreference model"""
@@ -0,0 +1,186 @@
+import gzip
+import hashlib
+import json
+import os
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import AIService, AIServiceArchive
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+ARCHIVE_FIELDS = [
+    'id', 'service_type', 'input_text', 'output_text', 'metadata', 'user_id', 'community_id',
+    'processing_time', 'prompt_tokens', 'completion_tokens', 'tokens_used', 'created_at',
+]
+
+
+def _compress(data, extension):
+    if extension == '.zst':
+        return zstandard.ZstdCompressor(level=10).compress(data)
+    return gzip.compress(data)
+
+
+def _decompress(data, extension):
+    if extension == '.zst':
+        return zstandard.ZstdDecompressor().decompress(data)
+    return gzip.decompress(data)
+
+
+def archive_extension():
+    """zstd when the zstandard package is installed, gzip otherwise"""
+    return '.zst' if zstandard is not None else '.gz'
+
+
+def output_hash(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def _serialize(row):
+    record = {field: row[field] for field in ARCHIVE_FIELDS}
+    record['id'] = str(record['id'])
+    record['community_id'] = str(record['community_id']) if record['community_id'] else None
+    record['created_at'] = record['created_at'].isoformat()
+    return record
+
+
+def _append_member(archive_dir, month, records):
+    """Append records as one compressed member to the month's file; returns (file name, offset, length)"""
+    extension = archive_extension()
+    file_name = f"ai_services-{month}.ndjson{extension}"
+    payload = ''.join(json.dumps(record, separators=(',', ':')) + '\n' for record in records)
+    data = _compress(payload.encode('utf-8'), extension)
+    
+    # Concatenated gzip members and zstd frames are both valid files, so each chunk is an append
+    with open(os.path.join(archive_dir, file_name), 'ab') as f:
+        offset = f.seek(0, os.SEEK_END)
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    
+    return file_name, offset, len(data)
+
+
+def _archive_path(archive_dir, file_name):
+    """Path kept on index entries: the bare name inside AI_ARCHIVE_DIR, absolute for any other directory"""
+    if os.path.abspath(archive_dir) == os.path.abspath(settings.AI_ARCHIVE_DIR):
+        return file_name
+    return os.path.abspath(os.path.join(archive_dir, file_name))
+
+
+def archive_chunk(rows, archive_dir, dedupe=False):
+    """Write a chunk of AIService rows to cold storage, index them and delete the originals"""
+    hashes = {row['id']: output_hash(row['output_text']) for row in rows}
+    
+    stored_hashes = set()
+    if dedupe:
+        stored_hashes = set(AIServiceArchive.objects.filter(
+            output_hash__in=set(hashes.values()), output_stored=True
+        ).values_list('output_hash', flat=True))
+    
+    by_month = defaultdict(list)
+    for row in rows:
+        by_month[row['created_at'].strftime('%Y-%m')].append(row)
+    
+    index = []
+    for month, month_rows in by_month.items():
+        records = []
+        stored = []
+        for row in month_rows:
+            record = _serialize(row)
+            record['output_hash'] = hashes[row['id']]
+            is_stored = not (dedupe and record['output_hash'] in stored_hashes)
+            if is_stored:
+                stored_hashes.add(record['output_hash'])
+            else:
+                # The text lives with the first archived record that had it
+                del record['output_text']
+            records.append(record)
+            stored.append(is_stored)
+        
+        file_name, offset, length = _append_member(archive_dir, month, records)
+        index += [
+            AIServiceArchive(
+                id=row['id'],
+                service_type=row['service_type'],
+                created_at=row['created_at'],
+                archive_file=_archive_path(archive_dir, file_name),
+                offset=offset,
+                length=length,
+                output_hash=hashes[row['id']],
+                output_stored=is_stored
+            )
+            for row, is_stored in zip(month_rows, stored)
+        ]
+    
+    # The files are already on disk; index and delete together so no record is lost or orphaned
+    with transaction.atomic():
+        AIServiceArchive.objects.bulk_create(index, ignore_conflicts=True)
+        AIService.objects.filter(id__in=list(hashes)).delete()
+    
+    return len(index)
+
+
+def archive_ai_history(days=None, dedupe=False, chunk_size=None, archive_dir=None):
+    """Move AIService records older than `days` to compressed monthly NDJSON files"""
+    days = days if days is not None else settings.AI_ARCHIVE_RETENTION_DAYS
+    chunk_size = chunk_size or settings.AI_ARCHIVE_CHUNK_SIZE
+    archive_dir = archive_dir or settings.AI_ARCHIVE_DIR
+    os.makedirs(archive_dir, exist_ok=True)
+    
+    now = timezone.now()
+    # Records still serving as live cache entries are kept until they expire
+    candidates = AIService.objects.filter(
+        created_at__lt=now - timedelta(days=days)
+    ).exclude(expires_at__gt=now).order_by('created_at', 'id')
+    
+    archived = 0
+    while True:
+        rows = list(candidates.values(*ARCHIVE_FIELDS)[:chunk_size])
+        if not rows:
+            break
+        archived += archive_chunk(rows, archive_dir, dedupe=dedupe)
+    
+    return archived
+
+
+def _read_member(entry, archive_dir):
+    # Absolute paths (archives written outside AI_ARCHIVE_DIR) are used as they are
+    path = os.path.join(archive_dir, entry.archive_file)
+    with open(path, 'rb') as f:
+        f.seek(entry.offset)
+        data = f.read(entry.length)
+    return _decompress(data, os.path.splitext(entry.archive_file)[1])
+
+
+def load_archived_record(entry, archive_dir=None):
+    """Full archived record for an AIServiceArchive entry, read and decompressed on demand"""
+    archive_dir = archive_dir or settings.AI_ARCHIVE_DIR
+    record_id = str(entry.id)
+    
+    record = None
+    for line in _read_member(entry, archive_dir).splitlines():
+        candidate = json.loads(line)
+        if candidate['id'] == record_id:
+            record = candidate
+            break
+    if record is None:
+        raise LookupError(f"Record {record_id} not found in {entry.archive_file}")
+    
+    if 'output_text' not in record:
+        source = AIServiceArchive.objects.filter(output_hash=entry.output_hash, output_stored=True).first()
+        if source is None:
+            raise LookupError(f"Stored output {entry.output_hash} not found for record {record_id}")
+        record['output_text'] = load_archived_record(source, archive_dir)['output_text']
+    
+    record['created_at'] = parse_datetime(record['created_at'])
+    return record
@@ -0,0 +1,106 @@
+import atexit
+import threading
+
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+
+from .models import AIService
+from .ai_rollups import record_usage
+
+
+class AIAuditWriter:
+    """Buffers AIService records in memory and writes them with bulk_create off the request thread"""
+    
+    def __init__(self):
+        self._buffer = []
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._closed = False
+        self._counters = {'written': 0, 'batches': 0, 'failed_batches': 0, 'dropped': 0}
+    
+    def record(self, **fields):
+        """Queue an AIService record and return it; its id is assigned now, the row is written later"""
+        # auto_now_add only fills created_at at flush time; set it so the record is usable meanwhile
+        fields.setdefault('created_at', timezone.now())
+        ai_service = AIService(**fields)
+        
+        if not settings.AI_AUDIT_BUFFERED or self._closed:
+            ai_service.save()
+            self._roll_up([ai_service])
+            return ai_service
+        
+        with self._lock:
+            self._buffer.append(ai_service)
+            full = len(self._buffer) >= settings.AI_AUDIT_BATCH_SIZE
+            self._ensure_thread()
+        
+        if full:
+            self._wakeup.set()
+        return ai_service
+    
+    def _ensure_thread(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='ai-audit-writer', daemon=True)
+            self._thread.start()
+            atexit.register(self.close)
+    
+    def _run(self):
+        try:
+            while not self._closed:
+                self._wakeup.wait(settings.AI_AUDIT_FLUSH_INTERVAL)
+                self._wakeup.clear()
+                self.flush()
+        finally:
+            connection.close()
+    
+    def flush(self):
+        """Write everything buffered so far; returns the number of rows written"""
+        with self._lock:
+            batch, self._buffer = self._buffer, []
+        if not batch:
+            return 0
+        
+        try:
+            AIService.objects.bulk_create(batch, batch_size=settings.AI_AUDIT_BATCH_SIZE)
+        except Exception as e:
+            print(f"Warning: AI audit flush failed - {e}")
+            with self._lock:
+                self._counters['failed_batches'] += 1
+                # Keep the records for the next flush, but never let the buffer grow without bound
+                self._buffer = batch + self._buffer
+                overflow = len(self._buffer) - settings.AI_AUDIT_MAX_BUFFER
+                if overflow > 0:
+                    del self._buffer[:overflow]
+                    self._counters['dropped'] += overflow
+            return 0
+        
+        with self._lock:
+            self._counters['written'] += len(batch)
+            self._counters['batches'] += 1
+        
+        self._roll_up(batch)
+        return len(batch)
+    
+    @staticmethod
+    def _roll_up(ai_services):
+        # Usage statistics are derived data; a failure here must not lose audit records
+        try:
+            record_usage(ai_services)
+        except Exception as e:
+            print(f"Warning: AI usage rollup failed - {e}")
+    
+    def close(self):
+        """Stop buffering and write what is left (registered with atexit)"""
+        self._closed = True
+        self._wakeup.set()
+        self.flush()
+    
+    def stats(self):
+        with self._lock:
+            return {'buffered': len(self._buffer), **self._counters}
+
+
+# Global audit writer instance
+ai_audit = AIAuditWriter()
@@ -0,0 +1,251 @@
+import asyncio
+import weakref
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from .fake_llm import FakeLLM
+
+
+class Completion:
+    """Text returned by a backend with the token counts it reported (None when unknown)"""
+    
+    def __init__(self, text, prompt_tokens=None, completion_tokens=None):
+        self.text = text
+        self.prompt_tokens = prompt_tokens
+        self.completion_tokens = completion_tokens
+
+
+class StreamedCompletion(Completion):
+    """Completion whose text arrives in chunks; text and token counts are complete once iterated"""
+    
+    def __init__(self, deltas):
+        super().__init__('')
+        self._deltas = deltas
+    
+    def __iter__(self):
+        # Backends yield partial Completions; token counts usually come with the last one
+        for delta in self._deltas:
+            self.prompt_tokens = delta.prompt_tokens or self.prompt_tokens
+            self.completion_tokens = delta.completion_tokens or self.completion_tokens
+            if delta.text:
+                self.text += delta.text
+                yield delta.text
+
+
+class AIBackend:
+    """Interface between AIServiceManager and a model provider"""
+    
+    name = None
+    
+    def __init__(self, model_name=None):
+        self.model_name = model_name or settings.AI_MODEL_NAMES[self.name]
+    
+    def generate(self, prompt, timeout=None, schema=None):
+        """Send a prompt and return a Completion; timeout is in seconds
+
+        schema is a qa.ai_schemas schema; backends that support structured
+        output ask the model to follow it, the others rely on the prompt.
+        """
+        raise NotImplementedError
+    
+    def stream(self, prompt, timeout=None, schema=None):
+        """Send a prompt and return a StreamedCompletion; backends without streaming send it in one chunk"""
+        return StreamedCompletion(iter([self.generate(prompt, timeout=timeout, schema=schema)]))
+    
+    async def agenerate(self, prompt, timeout=None, schema=None):
+        """generate() for async callers; backends without an async client run it on a worker thread"""
+        return await sync_to_async(self.generate, thread_sensitive=False)(prompt, timeout=timeout, schema=schema)
+    
+    def warm_up(self):
+        """Open a connection to the provider ahead of the first real request"""
+
+
+class GeminiBackend(AIBackend):
+    name = 'gemini'
+    
+    def __init__(self, model_name=None):
+        super().__init__(model_name)
+        # The SDK takes about a second to import, so it is only loaded once this backend is used
+        import google.generativeai as genai
+        
+        self.genai = genai
+        genai.configure(api_key=settings.GEMINI_API_KEY)
+        self.model = genai.GenerativeModel(self.model_name)
+    
+    def warm_up(self):
+        self.genai.get_model(f"models/{self.model_name}")
+    
+    @staticmethod
+    def _request_options(timeout=None, schema=None):
+        generation_config = None
+        if schema is not None:
+            generation_config = {
+                'response_mime_type': 'application/json',
+                'response_schema': schema.json_schema(),
+            }
+        return {
+            'generation_config': generation_config,
+            'request_options': {'timeout': timeout} if timeout else None,
+        }
+    
+    def _generate_content(self, prompt, timeout=None, schema=None, stream=False):
+        return self.model.generate_content(prompt, stream=stream, **self._request_options(timeout, schema))
+    
+    @staticmethod
+    def _completion(response, partial=False):
+        usage = getattr(response, 'usage_metadata', None)
+        try:
+            text = response.text
+        except ValueError:
+            # Stream chunks that only carry the finish reason or usage have no text part
+            if not partial:
+                raise
+            text = ''
+        return Completion(
+            text,
+            getattr(usage, 'prompt_token_count', None),
+            getattr(usage, 'candidates_token_count', None)
+        )
+    
+    def generate(self, prompt, timeout=None, schema=None):
+        return self._completion(self._generate_content(prompt, timeout, schema))
+    
+    def stream(self, prompt, timeout=None, schema=None):
+        response = self._generate_content(prompt, timeout, schema, stream=True)
+        return StreamedCompletion(self._completion(chunk, partial=True) for chunk in response)
+    
+    async def agenerate(self, prompt, timeout=None, schema=None):
+        # The SDK's async client uses gRPC asyncio, so no thread is held while waiting
+        response = await self.model.generate_content_async(prompt, **self._request_options(timeout, schema))
+        return self._completion(response)
+
+
+class OpenAIBackend(AIBackend):
+    """OpenAI chat completions, or any compatible server such as run_fake_llm"""
+    
+    name = 'openai'
+    
+    def __init__(self, model_name=None):
+        super().__init__(model_name)
+        import openai
+        
+        self.openai = openai
+        # Retries are left to the resilience layer so they stay inside the call deadline
+        self.client = openai.OpenAI(
+            api_key=settings.OPENAI_API_KEY or 'unused',
+            base_url=settings.OPENAI_BASE_URL,
+            max_retries=0
+        )
+        # Async clients per event loop: httpx connection pools cannot be shared between loops
+        self._async_clients = weakref.WeakKeyDictionary()
+    
+    def warm_up(self):
+        self.client.models.retrieve(self.model_name)
+    
+    def _async_client(self):
+        """AsyncOpenAI client for the running event loop, reused so requests share pooled connections"""
+        loop = asyncio.get_running_loop()
+        client = self._async_clients.get(loop)
+        if client is None:
+            import httpx
+            
+            client = self.openai.AsyncOpenAI(
+                api_key=settings.OPENAI_API_KEY or 'unused',
+                base_url=settings.OPENAI_BASE_URL,
+                max_retries=0,
+                http_client=self.openai.DefaultAsyncHttpxClient(limits=httpx.Limits(
+                    max_connections=settings.AI_ASYNC_MAX_CONNECTIONS,
+                    max_keepalive_connections=settings.AI_ASYNC_MAX_CONNECTIONS
+                ))
+            )
+            self._async_clients[loop] = client
+        return client
+    
+    def _request(self, prompt, timeout=None, schema=None, **extra):
+        if schema is not None:
+            # Not strict: strict mode requires every property to be listed as required
+            extra['response_format'] = {
+                'type': 'json_schema',
+                'json_schema': {'name': 'response', 'schema': schema.json_schema(), 'strict': False},
+            }
+        return {
+            'model': self.model_name,
+            'messages': [{'role': 'user', 'content': prompt}],
+            'timeout': timeout,
+            **extra
+        }
+    
+    def _create(self, prompt, timeout=None, schema=None, **extra):
+        return self.client.chat.completions.create(**self._request(prompt, timeout, schema, **extra))
+    
+    @staticmethod
+    def _completion(response):
+        usage = response.usage
+        return Completion(
+            response.choices[0].message.content or '',
+            getattr(usage, 'prompt_tokens', None),
+            getattr(usage, 'completion_tokens', None)
+        )
+    
+    def stream(self, prompt, timeout=None, schema=None):
+        chunks = self._create(prompt, timeout, schema, stream=True, stream_options={'include_usage': True})
+        
+        def deltas():
+            for chunk in chunks:
+                text = chunk.choices[0].delta.content if chunk.choices else None
+                usage = chunk.usage
+                yield Completion(
+                    text or '',
+                    getattr(usage, 'prompt_tokens', None),
+                    getattr(usage, 'completion_tokens', None)
+                )
+        
+        return StreamedCompletion(deltas())
+    
+    def generate(self, prompt, timeout=None, schema=None):
+        return self._completion(self._create(prompt, timeout, schema))
+    
+    async def agenerate(self, prompt, timeout=None, schema=None):
+        response = await self._async_client().chat.completions.create(**self._request(prompt, timeout, schema))
+        return self._completion(response)
+
+
+class FakeBackend(AIBackend):
+    """In-process fake model for load tests and CI; never calls a paid API"""
+    
+    name = 'fake'
+    
+    def __init__(self, model_name=None, fake=None):
+        super().__init__(model_name)
+        self.fake = fake or FakeLLM(**settings.FAKE_LLM)
+    
+    def generate(self, prompt, timeout=None, schema=None):
+        text, prompt_tokens, completion_tokens = self.fake.complete(prompt, timeout=timeout)
+        return Completion(text, prompt_tokens, completion_tokens)
+    
+    def stream(self, prompt, timeout=None, schema=None):
+        return StreamedCompletion(
+            Completion(text, prompt_tokens, completion_tokens)
+            for text, prompt_tokens, completion_tokens in self.fake.stream(prompt, timeout=timeout)
+        )
+    
+    async def agenerate(self, prompt, timeout=None, schema=None):
+        text, prompt_tokens, completion_tokens = await self.fake.acomplete(prompt, timeout=timeout)
+        return Completion(text, prompt_tokens, completion_tokens)
+
+
+BACKENDS = {
+    backend.name: backend
+    for backend in (GeminiBackend, OpenAIBackend, FakeBackend)
+}
+
+
+def get_backend(name=None, model_name=None):
+    """Instantiate the named backend, AI_BACKEND by default"""
+    name = name or settings.AI_BACKEND
+    try:
+        backend_class = BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"Unknown AI backend '{name}', expected one of: {', '.join(BACKENDS)}")
+    return backend_class(model_name)
@@ -0,0 +1,148 @@
+import math
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Value
+from django.db.models.functions import Least
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import APIException, Throttled
+
+from .models import AIBudgetBucket
+
+
+class AIBudgetExceeded(Throttled):
+    """Raised before an upstream AI call when a token budget is exhausted (HTTP 429)"""
+    
+    default_detail = 'AI token budget exceeded.'
+    
+    def __init__(self, scope, wait):
+        super().__init__(
+            wait=math.ceil(wait) if wait is not None else None,
+            detail=f"AI token budget exceeded for this {scope}. Try again later."
+        )
+        self.scope = scope
+
+
+class AIRequestTooLarge(APIException):
+    """Raised when one AI call needs more tokens than a budget can ever hold (HTTP 413)"""
+    
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = 'AI request is larger than the token budget.'
+    
+    def __init__(self, scope, estimate, capacity):
+        super().__init__(
+            detail=f"This AI request needs about {estimate} tokens, more than the {scope} budget of {capacity}. "
+                   f"Shorten the text and try again."
+        )
+        self.scope = scope
+
+
+def estimate_tokens(text):
+    """Rough token count for text the model has not seen yet (about 4 characters per token)"""
+    return max(1, len(text) // 4)
+
+
+def _pk(obj):
+    return getattr(obj, 'pk', obj)
+
+
+def _limits(scope):
+    limits = settings.AI_BUDGETS[scope]
+    return limits['capacity'], limits['refill_per_hour'] / 3600
+
+
+def _available(bucket, now):
+    """Tokens in a bucket at `now`, refilled continuously since it was last written"""
+    capacity, refill_per_second = _limits(bucket.scope)
+    elapsed = max((now - bucket.refilled_at).total_seconds(), 0)
+    return min(capacity, bucket.tokens + elapsed * refill_per_second)
+
+
+class AIBudgetManager:
+    """Per-community and per-user token budgets enforced before upstream AI calls
+
+    Buckets are AIBudgetBucket rows, so every web and worker process draws
+    on the same budget and budgets survive restarts. A reservation is a
+    compare-and-set UPDATE on each bucket's version; when another process
+    changed a bucket in between, the reservation is recomputed.
+    """
+    
+    def _scopes(self, user, community):
+        scopes = []
+        if community is not None and 'community' in settings.AI_BUDGETS:
+            scopes.append(('community', str(_pk(community))))
+        if user is not None and 'user' in settings.AI_BUDGETS:
+            scopes.append(('user', str(_pk(user))))
+        return scopes
+    
+    def _buckets(self, scopes):
+        buckets = []
+        for scope, key in scopes:
+            bucket, _ = AIBudgetBucket.objects.get_or_create(
+                scope=scope, key=key, defaults={'tokens': _limits(scope)[0]}
+            )
+            buckets.append(bucket)
+        return buckets
+    
+    def reserve(self, estimate, user=None, community=None):
+        """Take the estimated tokens from every applicable bucket or raise AIBudgetExceeded"""
+        scopes = self._scopes(user, community)
+        for scope, key in scopes:
+            capacity = _limits(scope)[0]
+            if estimate > capacity:
+                # Waiting would never help, so this is not a 429
+                raise AIRequestTooLarge(scope, estimate, capacity)
+        
+        for attempt in range(settings.AI_BUDGET_RESERVE_ATTEMPTS):
+            buckets = self._buckets(scopes)
+            now = timezone.now()
+            levels = [_available(bucket, now) for bucket in buckets]
+            
+            # Check every bucket first so a rejected call consumes nothing
+            for bucket, level in zip(buckets, levels):
+                if level < estimate:
+                    refill_per_second = _limits(bucket.scope)[1]
+                    wait = (estimate - level) / refill_per_second if refill_per_second > 0 else None
+                    raise AIBudgetExceeded(bucket.scope, wait)
+            
+            # Only the writes are in the transaction; the version check makes reading outside it safe
+            with transaction.atomic():
+                reserved = all(
+                    AIBudgetBucket.objects.filter(pk=bucket.pk, version=bucket.version).update(
+                        tokens=level - estimate, refilled_at=now, version=F('version') + 1
+                    )
+                    for bucket, level in zip(buckets, levels)
+                )
+                if reserved:
+                    return [(bucket.pk, bucket.scope, estimate) for bucket in buckets]
+                # Another process reserved from one of the buckets in between; read them again
+                transaction.set_rollback(True)
+        
+        raise AIBudgetExceeded(scopes[0][0], 1)
+    
+    def settle(self, reservation, actual_tokens):
+        """Correct a reservation once the real token usage is known"""
+        for bucket_id, scope, estimate in reservation:
+            # Refills are only added by reserve(), so this is a plain increment and needs no retry
+            AIBudgetBucket.objects.filter(pk=bucket_id).update(
+                tokens=Least(F('tokens') - (actual_tokens - estimate), Value(float(_limits(scope)[0]))),
+                version=F('version') + 1
+            )
+    
+    def snapshot(self):
+        """Current level of every budget bucket"""
+        now = timezone.now()
+        return [
+            {
+                'scope': bucket.scope,
+                'id': bucket.key,
+                'available_tokens': int(_available(bucket, now)),
+                'capacity': _limits(bucket.scope)[0],
+            }
+            for bucket in AIBudgetBucket.objects.filter(scope__in=list(settings.AI_BUDGETS)).order_by('scope', 'key')
+        ]
+
+
+# Global budget manager instance
+ai_budget = AIBudgetManager()
@@ -0,0 +1,145 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict, defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import AIService
+
+
+def normalize_input(value):
+    """Collapse whitespace so trivially different inputs share a cache entry"""
+    if isinstance(value, (list, tuple)):
+        return [normalize_input(item) for item in value]
+    if isinstance(value, dict):
+        return {key: normalize_input(item) for key, item in value.items()}
+    if isinstance(value, str):
+        return ' '.join(value.split())
+    return value
+
+
+class AIResponseCache:
+    """Two-tier cache for AI responses: an in-process LRU backed by AIService rows"""
+    
+    # Write this many entries between sweeps of the persistent tier
+    EVICTION_INTERVAL = 100
+    
+    def __init__(self, max_entries=None):
+        self.max_entries = max_entries or settings.AI_CACHE_MEMORY_MAX_ENTRIES
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._writes_since_eviction = 0
+        self._counters = defaultdict(lambda: {'memory_hits': 0, 'db_hits': 0, 'misses': 0})
+    
+    @staticmethod
+    def make_key(service_type, model_name, prompt_version, inputs):
+        """Content address for a request: service, model, prompt template version and inputs"""
+        payload = json.dumps(
+            [service_type, model_name, prompt_version, normalize_input(inputs)],
+            sort_keys=True, default=str
+        )
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+    
+    @staticmethod
+    def get_ttl(service_type):
+        return settings.AI_CACHE_TTLS.get(service_type, settings.AI_CACHE_DEFAULT_TTL)
+    
+    def get(self, service_type, key):
+        """Return (result, ai_service) for a live entry, or None on a miss"""
+        now = timezone.now()
+        
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                result, ai_service, expires_at = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self._counters[service_type]['memory_hits'] += 1
+                    return result, ai_service
+                del self._entries[key]
+        
+        ai_service = AIService.objects.filter(
+            cache_key=key, expires_at__gt=now
+        ).order_by('-created_at').first()
+        
+        if ai_service is not None:
+            self._remember(key, ai_service.output_text, ai_service, ai_service.expires_at)
+            with self._lock:
+                self._counters[service_type]['db_hits'] += 1
+            return ai_service.output_text, ai_service
+        
+        with self._lock:
+            self._counters[service_type]['misses'] += 1
+        return None
+    
+    def expiry_for(self, service_type):
+        """Expiry timestamp for a new entry, or None if the service type is not cached"""
+        ttl = self.get_ttl(service_type)
+        if not ttl:
+            return None
+        return timezone.now() + timedelta(seconds=ttl)
+    
+    def set(self, key, result, ai_service, expires_at):
+        """Store a fresh response; the AIService row already carries the persistent copy"""
+        if expires_at is None:
+            return
+        
+        self._remember(key, result, ai_service, expires_at)
+        
+        with self._lock:
+            self._writes_since_eviction += 1
+            should_evict = self._writes_since_eviction >= self.EVICTION_INTERVAL
+            if should_evict:
+                self._writes_since_eviction = 0
+        
+        if should_evict:
+            self.evict_persistent()
+    
+    def _remember(self, key, result, ai_service, expires_at):
+        with self._lock:
+            self._entries[key] = (result, ai_service, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+    
+    def evict_persistent(self):
+        """Drop expired entries and trim the persistent tier to its size bound"""
+        cached = AIService.objects.exclude(cache_key='')
+        
+        # Rows stay as audit records; only their cache key is cleared
+        evicted = cached.filter(expires_at__lte=timezone.now()).update(cache_key='', expires_at=None)
+        
+        max_entries = settings.AI_CACHE_DB_MAX_ENTRIES
+        cutoff = cached.order_by('-created_at').values_list('created_at', flat=True)[max_entries:max_entries + 1]
+        cutoff = list(cutoff)
+        if cutoff:
+            evicted += cached.filter(created_at__lte=cutoff[0]).update(cache_key='', expires_at=None)
+        
+        return evicted
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+    
+    def stats(self):
+        """Hit/miss counters for this process, per service type and in total"""
+        with self._lock:
+            by_service = {service_type: dict(counts) for service_type, counts in self._counters.items()}
+            memory_entries = len(self._entries)
+        
+        totals = {'memory_hits': 0, 'db_hits': 0, 'misses': 0}
+        for counts in by_service.values():
+            for name, value in counts.items():
+                totals[name] += value
+        
+        lookups = sum(totals.values())
+        totals['hit_rate'] = (totals['memory_hits'] + totals['db_hits']) / lookups if lookups else 0
+        
+        return {
+            'memory_entries': memory_entries,
+            'totals': totals,
+            'by_service': by_service,
+        }
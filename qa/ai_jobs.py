@@ -0,0 +1,288 @@
+import json
+import os
+import signal
+import socket
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, connection
+from django.db.models import F
+from django.utils import timezone
+
+from .models import AIJob
+from .ai_budget import AIBudgetExceeded
+from .ai_resilience import AIServiceUnavailable
+from .ai_audit import ai_audit
+
+
+class AIJobError(Exception):
+    """Raised when an AI job could not produce a usable result"""
+
+
+def enqueue_job(job_type, question=None, answer=None, user=None):
+    """Queue an AI job for a question, answer or user, reusing one that is already queued"""
+    existing = AIJob.objects.filter(
+        job_type=job_type, question=question, answer=answer, user=user, status__in=['pending', 'running']
+    ).first()
+    if existing is not None:
+        return existing
+    
+    return AIJob.objects.create(job_type=job_type, question=question, answer=answer, user=user)
+
+
+def claim_next_job(worker_id):
+    """Atomically claim the oldest runnable job, or return None if the queue is empty"""
+    now = timezone.now()
+    candidates = AIJob.objects.filter(
+        status='pending', run_after__lte=now
+    ).order_by('run_after').values_list('id', flat=True)[:10]
+    
+    for job_id in candidates:
+        # The conditional UPDATE is the lock: only one worker can move the row out of 'pending'
+        claimed = AIJob.objects.filter(id=job_id, status='pending').update(
+            status='running',
+            locked_by=worker_id,
+            locked_at=now,
+            attempts=F('attempts') + 1
+        )
+        if claimed:
+            return AIJob.objects.select_related('question', 'answer__question', 'user').get(id=job_id)
+    
+    return None
+
+
+def requeue_stale_jobs():
+    """Return jobs abandoned by crashed workers to the queue; returns the number requeued"""
+    now = timezone.now()
+    stale = AIJob.objects.filter(status='running', locked_at__lt=now - timedelta(seconds=settings.AI_JOB_STALE_AFTER))
+    
+    # The abandoned run used the attempt taken when the job was claimed, so a job
+    # that keeps killing its worker fails once it is out of attempts
+    for job in stale.filter(attempts__gte=settings.AI_JOB_MAX_ATTEMPTS).select_related('question', 'answer'):
+        failed = AIJob.objects.filter(pk=job.pk, status='running').update(
+            status='failed', locked_by='', locked_at=None, finished_at=now,
+            last_error='Worker stopped before the job finished'
+        )
+        if failed:
+            _fail_target(job)
+    
+    return stale.update(
+        status='pending', locked_by='', locked_at=None, last_error='Worker stopped before the job finished'
+    )
+
+
+def _run_question_improvement(job):
+    from .ai_services import ai_manager
+    question = job.question
+    
+    ai_result, ai_service = ai_manager.improve_question(
+        question.title, question.content,
+        user=question.author_id, community=question.community_id, allow_local=True
+    )
+    if not ai_result:
+        raise AIJobError('AI service returned no result')
+    
+    try:
+        ai_data = json.loads(ai_result)
+    except json.JSONDecodeError:
+        raise AIJobError('Failed to parse AI response')
+    
+    question.ai_improved_title = ai_data.get('improved_title', '')[:200]
+    question.ai_improved_content = ai_data.get('improved_content', '')
+    question.ai_suggested_tags = ai_data.get('suggested_tags', [])
+    question.ai_similar_questions = ai_data.get('similar_questions', [])
+    question.ai_status = 'completed'
+    question.save(update_fields=[
+        'ai_improved_title', 'ai_improved_content', 'ai_suggested_tags',
+        'ai_similar_questions', 'ai_status', 'updated_at'
+    ])
+    
+    return {'ai_service': str(ai_service.id) if ai_service else None}
+
+
+def _run_question_enrichment(job):
+    from .ai_services import ai_manager
+    
+    outcomes = ai_manager.enrich_question(
+        job.question, allow_local=True, index_wait=settings.SIMILARITY_INDEX_JOB_WAIT
+    )
+    if 'completed' not in outcomes.values():
+        raise AIJobError(f"All enrichment tasks failed: {outcomes}")
+    # What completed is saved; the retry fills in the similar questions (the rest comes from the cache)
+    if outcomes['similar'] == 'not_ready' and job.attempts < settings.AI_JOB_MAX_ATTEMPTS:
+        raise AIJobError('The similarity index is still being built')
+    
+    return {'tasks': outcomes}
+
+
+def _run_answer_feedback(job):
+    from .ai_services import ai_manager
+    answer = job.answer
+    
+    ai_result, ai_service = ai_manager.provide_answer_feedback(
+        answer.content, answer.question.title,
+        user=answer.author_id, community=answer.question.community_id, allow_local=True
+    )
+    if not ai_result:
+        raise AIJobError('AI service returned no result')
+    
+    try:
+        ai_data = json.loads(ai_result)
+    except json.JSONDecodeError:
+        raise AIJobError('Failed to parse AI response')
+    
+    answer.ai_feedback = ai_data.get('feedback', '')
+    answer.ai_improved_content = ai_data.get('improved_answer', '')
+    answer.ai_suggestions = ai_data.get('suggestions', [])
+    answer.ai_status = 'completed'
+    answer.save(update_fields=[
+        'ai_feedback', 'ai_improved_content', 'ai_suggestions', 'ai_status', 'updated_at'
+    ])
+    
+    return {'ai_service': str(ai_service.id) if ai_service else None}
+
+
+def _run_learning_path(job):
+    from .learning_paths import refresh_learning_path
+    
+    entry = refresh_learning_path(job.user)
+    if entry is None:
+        raise AIJobError('AI service returned no result')
+    
+    return {'fingerprint': entry.fingerprint}
+
+
+JOB_HANDLERS = {
+    'question_improvement': _run_question_improvement,
+    'question_enrichment': _run_question_enrichment,
+    'answer_feedback': _run_answer_feedback,
+    'learning_path': _run_learning_path,
+}
+
+
+def _job_target(job):
+    return job.question or job.answer
+
+
+def _fail_target(job):
+    target = _job_target(job)
+    if target is not None:
+        type(target).objects.filter(pk=target.pk).update(ai_status='failed')
+
+
+def process_job(job):
+    """Run a claimed job and record its outcome"""
+    handler = JOB_HANDLERS.get(job.job_type)
+    
+    try:
+        if handler is None:
+            raise AIJobError(f"Unknown job type: {job.job_type}")
+        result = handler(job)
+    except (AIBudgetExceeded, AIServiceUnavailable) as e:
+        # Out of budget or an open circuit is not a failure; run again once it has recovered
+        job.status = 'pending'
+        job.attempts -= 1
+        job.run_after = timezone.now() + timedelta(seconds=e.wait or settings.AI_JOB_RETRY_DELAY)
+        job.last_error = str(e.detail)
+        job.locked_by = ''
+        job.locked_at = None
+        job.save(update_fields=['status', 'attempts', 'run_after', 'last_error', 'locked_by', 'locked_at'])
+        return False
+    except Exception as e:
+        job.last_error = str(e)
+        job.locked_by = ''
+        job.locked_at = None
+        
+        if job.attempts < settings.AI_JOB_MAX_ATTEMPTS:
+            # Exponential backoff before the next attempt
+            delay = settings.AI_JOB_RETRY_DELAY * (2 ** (job.attempts - 1))
+            job.status = 'pending'
+            job.run_after = timezone.now() + timedelta(seconds=delay)
+        else:
+            job.status = 'failed'
+            job.finished_at = timezone.now()
+            _fail_target(job)
+        
+        job.save(update_fields=['status', 'run_after', 'last_error', 'locked_by', 'locked_at', 'finished_at'])
+        return False
+    
+    job.status = 'completed'
+    job.result = result or {}
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'result', 'finished_at'])
+    return True
+
+
+class AIJobWorker(threading.Thread):
+    """Worker thread that claims and processes AI jobs until stopped"""
+    
+    def __init__(self, name, stop_event, poll_interval=None, drain=False):
+        super().__init__(name=name, daemon=True)
+        self.stop_event = stop_event
+        self.poll_interval = poll_interval or settings.AI_JOB_POLL_INTERVAL
+        self.drain = drain
+        self.processed = 0
+        self.next_sweep = 0
+    
+    def sweep(self):
+        """Requeue jobs of crashed workers every AI_JOB_STALE_SWEEP_INTERVAL seconds"""
+        now = time.monotonic()
+        if now >= self.next_sweep:
+            self.next_sweep = now + settings.AI_JOB_STALE_SWEEP_INTERVAL
+            requeue_stale_jobs()
+    
+    def run(self):
+        try:
+            while not self.stop_event.is_set():
+                close_old_connections()
+                self.sweep()
+                job = claim_next_job(self.name)
+                
+                if job is None:
+                    if self.drain:
+                        break
+                    self.stop_event.wait(self.poll_interval)
+                    continue
+                
+                process_job(job)
+                self.processed += 1
+        finally:
+            # Each thread owns its own connection
+            connection.close()
+
+
+def run_worker_pool(workers=None, poll_interval=None, drain=False):
+    """Run a pool of AI job workers in this process until interrupted"""
+    workers = workers or settings.AI_JOB_WORKERS
+    prefix = f"{socket.gethostname()}:{os.getpid()}"
+    stop_event = threading.Event()
+    
+    # Stop the way Ctrl-C does: workers finish their current job, then exit
+    previous_handler = None
+    if threading.current_thread() is threading.main_thread():
+        previous_handler = signal.signal(signal.SIGTERM, lambda signum, frame: stop_event.set())
+    
+    pool = [
+        AIJobWorker(f"{prefix}:{i}", stop_event, poll_interval=poll_interval, drain=drain)
+        for i in range(workers)
+    ]
+    for worker in pool:
+        worker.start()
+    
+    try:
+        while any(worker.is_alive() for worker in pool):
+            for worker in pool:
+                worker.join(timeout=0.5)
+    except KeyboardInterrupt:
+        stop_event.set()
+        for worker in pool:
+            worker.join()
+    finally:
+        if previous_handler is not None:
+            signal.signal(signal.SIGTERM, previous_handler)
+        # Write out audit records buffered by the workers before the process exits
+        ai_audit.flush()
+    
+    return sum(worker.processed for worker in pool)
@@ -0,0 +1,414 @@
+import asyncio
+import math
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from django.conf import settings
+from rest_framework.exceptions import APIException
+
+
+class AIServiceUnavailable(APIException):
+    """Raised without calling the model while the circuit breaker is open (HTTP 503)"""
+    
+    status_code = 503
+    default_detail = 'AI service is temporarily unavailable. Try again later.'
+    default_code = 'ai_unavailable'
+    
+    def __init__(self, wait=None, detail=None):
+        super().__init__(detail)
+        # DRF turns `wait` into a Retry-After header
+        self.wait = math.ceil(wait) if wait else None
+
+
+class AIDeadlineExceeded(Exception):
+    """Raised when an upstream call does not finish within its service deadline"""
+
+
+# HTTP status codes of upstream errors worth retrying
+RETRYABLE_STATUS_CODES = frozenset([408, 429, 500, 502, 503, 504])
+
+
+def is_retryable(error):
+    """Timeouts and transient upstream errors are retried; bad requests are not"""
+    if isinstance(error, APIException):
+        return False
+    if isinstance(error, (AIDeadlineExceeded, TimeoutError, ConnectionError)):
+        return True
+    # Google SDK errors carry the HTTP status as `code`, OpenAI SDK errors as `status_code`
+    code = getattr(error, 'status_code', None) or getattr(error, 'code', None)
+    if isinstance(code, int):
+        return code in RETRYABLE_STATUS_CODES
+    return True
+
+
+class CircuitBreaker:
+    """Fails fast once the rolling error or slow-call rate of an upstream crosses a threshold"""
+    
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+    
+    def __init__(self, name, config=None):
+        self.name = name
+        self.config = config or settings.AI_CIRCUIT_BREAKER
+        self._lock = threading.Lock()
+        self._calls = deque()
+        self.state = self.CLOSED
+        self.opened_at = None
+        self.half_opened_at = None
+        self._trial_calls = 0
+        self._trial_successes = 0
+        self._counters = {'succeeded': 0, 'failed': 0, 'slow': 0, 'rejected': 0, 'opened': 0}
+    
+    def _prune(self, now):
+        horizon = now - self.config['window']
+        while self._calls and self._calls[0][0] < horizon:
+            self._calls.popleft()
+    
+    def _rates(self):
+        calls = len(self._calls)
+        if not calls:
+            return 0, 0
+        failed = sum(1 for _, is_failure, _ in self._calls if is_failure)
+        slow = sum(1 for _, _, is_slow in self._calls if is_slow)
+        return failed / calls, slow / calls
+    
+    def _open(self, now):
+        self.state = self.OPEN
+        self.opened_at = now
+        self._calls.clear()
+        self._counters['opened'] += 1
+        print(f"Warning: AI circuit breaker '{self.name}' opened")
+    
+    def _close(self):
+        self.state = self.CLOSED
+        self.opened_at = None
+        self._calls.clear()
+        print(f"AI circuit breaker '{self.name}' closed")
+    
+    def before_call(self):
+        """Admit a call or raise AIServiceUnavailable while the breaker is open"""
+        with self._lock:
+            now = time.monotonic()
+            if self.state == self.OPEN:
+                remaining = self.opened_at + self.config['reset_timeout'] - now
+                if remaining > 0:
+                    self._counters['rejected'] += 1
+                    raise AIServiceUnavailable(wait=remaining)
+                # Let a few trial calls through to probe whether the upstream recovered
+                self.state = self.HALF_OPEN
+                self.half_opened_at = now
+                self._trial_calls = 0
+                self._trial_successes = 0
+            
+            if self.state == self.HALF_OPEN:
+                if self._trial_calls >= self.config['half_open_calls']:
+                    if now - self.half_opened_at >= self.config['reset_timeout']:
+                        # Trial calls that never reported back count as failed, so the breaker cannot stay half open
+                        self._open(now)
+                    self._counters['rejected'] += 1
+                    raise AIServiceUnavailable(wait=self.config['reset_timeout'])
+                self._trial_calls += 1
+    
+    def release(self):
+        """Give back the slot of an admitted call that was abandoned without an outcome"""
+        with self._lock:
+            if self.state == self.HALF_OPEN and self._trial_calls > 0:
+                self._trial_calls -= 1
+    
+    def record(self, latency, failed):
+        """Record the outcome of an admitted call"""
+        with self._lock:
+            now = time.monotonic()
+            slow = latency >= self.config['slow_call_seconds']
+            self._counters['failed' if failed else 'succeeded'] += 1
+            if slow:
+                self._counters['slow'] += 1
+            
+            if self.state == self.HALF_OPEN:
+                if failed or slow:
+                    self._open(now)
+                else:
+                    self._trial_successes += 1
+                    if self._trial_successes >= self.config['half_open_calls']:
+                        self._close()
+                return
+            
+            if self.state != self.CLOSED:
+                return
+            
+            self._calls.append((now, failed, slow))
+            self._prune(now)
+            if len(self._calls) < self.config['min_calls']:
+                return
+            
+            failure_rate, slow_rate = self._rates()
+            if failure_rate >= self.config['failure_rate'] or slow_rate >= self.config['slow_call_rate']:
+                self._open(now)
+    
+    def snapshot(self):
+        with self._lock:
+            now = time.monotonic()
+            self._prune(now)
+            failure_rate, slow_rate = self._rates()
+            retry_after = None
+            if self.state == self.OPEN:
+                retry_after = max(0, math.ceil(self.opened_at + self.config['reset_timeout'] - now))
+            return {
+                'name': self.name,
+                'state': self.state,
+                'window_calls': len(self._calls),
+                'failure_rate': failure_rate,
+                'slow_call_rate': slow_rate,
+                'retry_after': retry_after,
+                'counters': dict(self._counters),
+            }
+
+
+class ResilientCaller:
+    """Runs upstream calls under a deadline, with jittered retries, hedging and a circuit breaker"""
+    
+    def __init__(self, name):
+        self.breaker = CircuitBreaker(name)
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        self._counters = {'retries': 0, 'timeouts': 0, 'hedges': 0, 'hedge_wins': 0, 'streams': 0}
+        self._counters_lock = threading.Lock()
+    
+    def _get_executor(self):
+        # Calls run on their own threads so a hung request can be abandoned at its deadline
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=settings.AI_CALL_MAX_WORKERS,
+                    thread_name_prefix='ai-call'
+                )
+            return self._executor
+    
+    def _count(self, name):
+        with self._counters_lock:
+            self._counters[name] += 1
+    
+    def _submit(self, fn, deadline):
+        self.breaker.before_call()
+        try:
+            return self._get_executor().submit(fn, deadline - time.monotonic()), time.monotonic()
+        except BaseException:
+            self.breaker.release()
+            raise
+    
+    def _finish(self, future, started):
+        """Result of a completed request, recording its outcome with the breaker"""
+        if future.cancelled():
+            # No outcome to record; exception() raises CancelledError below
+            self.breaker.release()
+        error = future.exception()
+        # Only upstream errors count against the breaker
+        self.breaker.record(time.monotonic() - started, failed=error is not None and is_retryable(error))
+        if error is not None:
+            raise error
+        return future.result()
+    
+    def _attempt(self, fn, deadline, hedge_delay=None):
+        """One attempt, hedged by a duplicate request if the first is still running after hedge_delay"""
+        future, started = self._submit(fn, deadline)
+        requests = {future: started}
+        hedge = None
+        hedge_at = started + hedge_delay if hedge_delay is not None else None
+        
+        try:
+            while requests:
+                now = time.monotonic()
+                if now >= deadline:
+                    for future, started in requests.items():
+                        # A running request cannot be interrupted; it is abandoned and counted as failed
+                        future.cancel()
+                        self.breaker.record(now - started, failed=True)
+                    requests.clear()
+                    self._count('timeouts')
+                    raise AIDeadlineExceeded('AI call did not finish before its deadline')
+                
+                timeout = deadline - now
+                if hedge_at is not None:
+                    timeout = max(0, min(timeout, hedge_at - now))
+                
+                done, _ = wait(list(requests), timeout=timeout, return_when=FIRST_COMPLETED)
+                
+                if not done and hedge_at is not None and time.monotonic() >= hedge_at:
+                    hedge_at = None
+                    try:
+                        hedge, started = self._submit(fn, deadline)
+                    except AIServiceUnavailable:
+                        continue
+                    requests[hedge] = started
+                    self._count('hedges')
+                    continue
+                
+                for future in done:
+                    started = requests.pop(future)
+                    try:
+                        result = self._finish(future, started)
+                    except Exception:
+                        if requests:
+                            # The other request of a hedged pair may still succeed
+                            continue
+                        raise
+                    if future is hedge:
+                        self._count('hedge_wins')
+                    return result
+        finally:
+            for future in requests:
+                # The losing request of a hedged pair is abandoned without an outcome; it
+                # cannot be interrupted once started, but its breaker slot is given back
+                future.cancel()
+                self.breaker.release()
+    
+    def call(self, fn, deadline, hedge=False):
+        """Call fn(timeout) until it succeeds, retries run out or the deadline passes
+
+        fn receives the seconds left before the deadline so it can pass them to the SDK.
+        """
+        retry = settings.AI_RETRY
+        hedge_delay = settings.AI_HEDGE_DELAY if hedge else None
+        deadline_at = time.monotonic() + deadline
+        
+        for attempt in range(retry['attempts']):
+            try:
+                return self._attempt(fn, deadline_at, hedge_delay)
+            except Exception as e:
+                if attempt + 1 >= retry['attempts'] or not is_retryable(e):
+                    raise
+                # Full jitter keeps retrying clients from hitting the upstream in lockstep
+                delay = random.uniform(0, min(retry['max_delay'], retry['base_delay'] * (2 ** attempt)))
+                if time.monotonic() + delay >= deadline_at:
+                    raise
+                self._count('retries')
+                time.sleep(delay)
+    
+    async def _aattempt(self, fn, deadline, hedge_delay=None):
+        """_attempt() for coroutines; unlike threads, abandoned requests are cancelled"""
+        self.breaker.before_call()
+        started = time.monotonic()
+        requests = {asyncio.ensure_future(fn(deadline - started)): started}
+        hedge = None
+        hedge_at = started + hedge_delay if hedge_delay is not None else None
+        
+        try:
+            while requests:
+                now = time.monotonic()
+                if now >= deadline:
+                    for task, started in requests.items():
+                        task.cancel()
+                        self.breaker.record(now - started, failed=True)
+                    requests.clear()
+                    self._count('timeouts')
+                    raise AIDeadlineExceeded('AI call did not finish before its deadline')
+                
+                timeout = deadline - now
+                if hedge_at is not None:
+                    timeout = max(0, min(timeout, hedge_at - now))
+                
+                done, _ = await asyncio.wait(list(requests), timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                
+                if not done and hedge_at is not None and time.monotonic() >= hedge_at:
+                    hedge_at = None
+                    try:
+                        self.breaker.before_call()
+                    except AIServiceUnavailable:
+                        continue
+                    started = time.monotonic()
+                    hedge = asyncio.ensure_future(fn(deadline - started))
+                    requests[hedge] = started
+                    self._count('hedges')
+                    continue
+                
+                for task in done:
+                    started = requests.pop(task)
+                    try:
+                        result = self._finish(task, started)
+                    except Exception:
+                        if requests:
+                            # The other request of a hedged pair may still succeed
+                            continue
+                        raise
+                    if task is hedge:
+                        self._count('hedge_wins')
+                    return result
+        finally:
+            # Losing or abandoned (client disconnected) requests give back their breaker slot
+            for task in requests:
+                task.cancel()
+                self.breaker.release()
+    
+    async def acall(self, fn, deadline, hedge=False):
+        """call() for async callers: fn(timeout) returns a coroutine and waiting never blocks the event loop"""
+        retry = settings.AI_RETRY
+        hedge_delay = settings.AI_HEDGE_DELAY if hedge else None
+        deadline_at = time.monotonic() + deadline
+        
+        for attempt in range(retry['attempts']):
+            try:
+                return await self._aattempt(fn, deadline_at, hedge_delay)
+            except Exception as e:
+                if attempt + 1 >= retry['attempts'] or not is_retryable(e):
+                    raise
+                delay = random.uniform(0, min(retry['max_delay'], retry['base_delay'] * (2 ** attempt)))
+                if time.monotonic() + delay >= deadline_at:
+                    raise
+                self._count('retries')
+                await asyncio.sleep(delay)
+    
+    def stream(self, fn, deadline):
+        """Iterate the chunks of fn(timeout), retrying like call() until the first chunk arrives
+
+        Once a chunk has been yielded the caller may have forwarded it, so later
+        failures are raised rather than retried. There is no hedging for streams.
+        """
+        retry = settings.AI_RETRY
+        deadline_at = time.monotonic() + deadline
+        
+        for attempt in range(retry['attempts']):
+            self.breaker.before_call()
+            started = time.monotonic()
+            try:
+                chunks = iter(fn(max(deadline_at - started, 0)))
+                first = next(chunks, None)
+                break
+            except Exception as e:
+                self.breaker.record(time.monotonic() - started, failed=is_retryable(e))
+                if attempt + 1 >= retry['attempts'] or not is_retryable(e):
+                    raise
+                delay = random.uniform(0, min(retry['max_delay'], retry['base_delay'] * (2 ** attempt)))
+                if time.monotonic() + delay >= deadline_at:
+                    raise
+                self._count('retries')
+                time.sleep(delay)
+            except BaseException:
+                self.breaker.release()
+                raise
+        
+        self._count('streams')
+        try:
+            if first is not None:
+                yield first
+            yield from chunks
+        except Exception as e:
+            self.breaker.record(time.monotonic() - started, failed=is_retryable(e))
+            raise
+        except BaseException:
+            # Closed by the caller (client disconnected): no outcome to record, but the slot is given back
+            self.breaker.release()
+            raise
+        self.breaker.record(time.monotonic() - started, failed=False)
+    
+    def stats(self):
+        with self._counters_lock:
+            counters = dict(self._counters)
+        return {
+            'breaker': self.breaker.snapshot(),
+            'deadlines': settings.AI_DEADLINES,
+            **counters,
+        }
@@ -0,0 +1,116 @@
+import json
+
+
+# Response bodies of the AI actions, shared by the DRF viewsets (qa/views.py)
+# and their async versions (qa/async_views.py) so the two cannot drift apart
+
+
+def ai_user(user):
+    """User an AI call is charged to, or None for anonymous requests"""
+    return user if user.is_authenticated else None
+
+
+def draft_scope(request, user):
+    """Session (or user) that improved drafts are remembered for, or None"""
+    session_key = getattr(getattr(request, 'session', None), 'session_key', None)
+    if session_key:
+        return f"session:{session_key}"
+    if user.is_authenticated:
+        return f"user:{user.pk}"
+    return None
+
+
+def decode_ai_result(ai_result, failure):
+    """(data, None) for a JSON AI result, else (None, error body) for a 400 response"""
+    if not ai_result:
+        return None, {'error': failure}
+    try:
+        return json.loads(ai_result), None
+    except json.JSONDecodeError:
+        return None, {'error': 'Failed to parse AI response'}
+
+
+# Saved with update_fields so view counts and viewer sketches flushed meanwhile are kept
+QUESTION_IMPROVEMENT_FIELDS = [
+    'ai_improved_title', 'ai_improved_content', 'ai_suggested_tags', 'ai_similar_questions', 'updated_at'
+]
+
+
+def apply_question_improvement(question, ai_data):
+    """Copy an improvement onto the question; the caller saves QUESTION_IMPROVEMENT_FIELDS"""
+    question.ai_improved_title = ai_data.get('improved_title', '')
+    question.ai_improved_content = ai_data.get('improved_content', '')
+    question.ai_suggested_tags = ai_data.get('suggested_tags', [])
+    question.ai_similar_questions = ai_data.get('similar_questions', [])
+
+
+def question_improvement(question, ai_data):
+    return {
+        'message': 'Question improved with AI',
+        'improved_title': question.ai_improved_title,
+        'improved_content': question.ai_improved_content,
+        'suggested_tags': question.ai_suggested_tags,
+        'confidence_score': ai_data.get('confidence_score', 0),
+        'improvement_notes': ai_data.get('improvement_notes', '')
+    }
+
+
+def draft_improvement(ai_data):
+    """The part of a draft improvement that is remembered in the draft cache"""
+    return {
+        'improved_title': ai_data.get('improved_title', ''),
+        'improved_content': ai_data.get('improved_content', ''),
+        'suggested_tags': ai_data.get('suggested_tags', []),
+        'confidence_score': ai_data.get('confidence_score', 0),
+        'improvement_notes': ai_data.get('improvement_notes', '')
+    }
+
+
+def draft_response(improvement, served_from):
+    return {
+        'message': 'Question draft improved with AI',
+        **improvement,
+        'served_from': served_from
+    }
+
+
+def answer_feedback(ai_data):
+    return {
+        'assessment_score': ai_data.get('assessment_score', 0),
+        'feedback': ai_data.get('feedback', ''),
+        'suggestions': ai_data.get('suggestions', []),
+        'improved_answer': ai_data.get('improved_answer', ''),
+        'learning_points': ai_data.get('learning_points', []),
+        'confidence_boost': ai_data.get('confidence_boost', '')
+    }
+
+
+def answer_improvement(ai_result):
+    return {
+        'message': 'Answer improved with AI',
+        'improved_content': ai_result
+    }
+
+
+def confidence_trend(ai_data, trend):
+    return {
+        'trend_analysis': ai_data.get('trend_analysis', ''),
+        'learning_insights': ai_data.get('learning_insights', []),
+        'recommendations': ai_data.get('recommendations', []),
+        'encouragement': ai_data.get('encouragement', ''),
+        'growth_score': ai_data.get('growth_score', 0),
+        'trend': trend
+    }
+
+
+def learning_path(entry, stale):
+    ai_data = entry.content
+    return {
+        'skill_level': ai_data.get('skill_level', 'beginner'),
+        'next_steps': ai_data.get('next_steps', []),
+        'focus_topics': ai_data.get('focus_topics', []),
+        'learning_goals': ai_data.get('learning_goals', []),
+        'mentor_advice': ai_data.get('mentor_advice', ''),
+        'generated_at': entry.generated_at,
+        'stale': stale
+    }
@@ -0,0 +1,196 @@
+import bisect
+from collections import defaultdict
+from datetime import timedelta, timezone as dt_timezone
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .models import AIService, AIUsageRollup
+
+
+# Upper bounds of the latency histogram buckets in milliseconds; a final bucket catches the rest
+LATENCY_BUCKETS_MS = [
+    50, 100, 200, 300, 500, 750, 1000, 1500, 2000, 3000, 5000, 7500, 10000, 15000, 20000, 30000, 60000,
+]
+
+PERIODS = ('hour', 'day')
+
+
+def latency_bucket(seconds):
+    return bisect.bisect_left(LATENCY_BUCKETS_MS, seconds * 1000)
+
+
+def bucket_start(created_at, period):
+    """Start of the hour or day (UTC) a timestamp falls in"""
+    created_at = created_at.astimezone(dt_timezone.utc)
+    if period == 'day':
+        return created_at.replace(hour=0, minute=0, second=0, microsecond=0)
+    return created_at.replace(minute=0, second=0, microsecond=0)
+
+
+def percentile(histogram, q):
+    """Approximate q-th percentile in milliseconds, interpolated within the matching bucket"""
+    total = sum(histogram)
+    if not total:
+        return None
+    
+    rank = q / 100 * total
+    seen = 0
+    for i, count in enumerate(histogram):
+        if count and seen + count >= rank:
+            low = LATENCY_BUCKETS_MS[i - 1] if i > 0 else 0
+            # The overflow bucket has no upper bound; report its lower edge
+            high = LATENCY_BUCKETS_MS[i] if i < len(LATENCY_BUCKETS_MS) else low
+            return low + (high - low) * (rank - seen) / count
+        seen += count
+    return LATENCY_BUCKETS_MS[-1]
+
+
+def _empty_totals():
+    return {
+        'calls': 0,
+        'prompt_tokens': 0,
+        'completion_tokens': 0,
+        'total_processing_time': 0.0,
+        'latency_histogram': [0] * (len(LATENCY_BUCKETS_MS) + 1),
+    }
+
+
+def aggregate(rows):
+    """Fold (service_type, created_at, processing_time, prompt_tokens, completion_tokens) rows into rollup deltas"""
+    deltas = defaultdict(_empty_totals)
+    for service_type, created_at, processing_time, prompt_tokens, completion_tokens in rows:
+        for period in PERIODS:
+            totals = deltas[(period, bucket_start(created_at, period), service_type)]
+            totals['calls'] += 1
+            totals['prompt_tokens'] += prompt_tokens or 0
+            totals['completion_tokens'] += completion_tokens or 0
+            totals['total_processing_time'] += processing_time or 0
+            totals['latency_histogram'][latency_bucket(processing_time or 0)] += 1
+    return deltas
+
+
+def _merge(rollup, totals):
+    rollup.calls += totals['calls']
+    rollup.prompt_tokens += totals['prompt_tokens']
+    rollup.completion_tokens += totals['completion_tokens']
+    rollup.total_processing_time += totals['total_processing_time']
+    
+    histogram = list(rollup.latency_histogram or [])
+    histogram += [0] * (len(totals['latency_histogram']) - len(histogram))
+    rollup.latency_histogram = [a + b for a, b in zip(histogram, totals['latency_histogram'])]
+
+
+def apply_deltas(deltas):
+    """Add rollup deltas to the stored rows, creating rows for new buckets"""
+    for (period, start, service_type), totals in deltas.items():
+        for _ in range(2):
+            try:
+                with transaction.atomic():
+                    # The histogram is read-modify-write, so the row is locked for the update
+                    rollup = AIUsageRollup.objects.select_for_update().filter(
+                        period=period, bucket_start=start, service_type=service_type
+                    ).first()
+                    if rollup is None:
+                        rollup = AIUsageRollup(
+                            period=period, bucket_start=start, service_type=service_type,
+                            latency_histogram=[0] * len(totals['latency_histogram'])
+                        )
+                    _merge(rollup, totals)
+                    rollup.save()
+                break
+            except IntegrityError:
+                # Another process created the bucket first; retry as an update
+                continue
+
+
+def record_usage(ai_services):
+    """Roll newly written AIService records into the hourly and daily totals"""
+    apply_deltas(aggregate(
+        (s.service_type, s.created_at, s.processing_time, s.prompt_tokens, s.completion_tokens)
+        for s in ai_services
+    ))
+
+
+def rebuild_rollups(since=None, chunk_size=5000):
+    """Recompute rollups from the AIService table, for all history or from a day onwards"""
+    rollups = AIUsageRollup.objects.all()
+    services = AIService.objects.all()
+    if since is None:
+        # Rollups older than the oldest record cover archived history; they cannot be recomputed
+        since = services.order_by('created_at').values_list('created_at', flat=True).first()
+    if since is not None:
+        since = bucket_start(since, 'day')
+        rollups = rollups.filter(bucket_start__gte=since)
+        services = services.filter(created_at__gte=since)
+    
+    with transaction.atomic():
+        rollups.delete()
+        rows = services.values_list(
+            'service_type', 'created_at', 'processing_time', 'prompt_tokens', 'completion_tokens'
+        ).iterator(chunk_size=chunk_size)
+        deltas = aggregate(rows)
+        apply_deltas(deltas)
+    
+    return len(deltas)
+
+
+def _merge_values(totals, calls, prompt_tokens, completion_tokens, processing_time, histogram):
+    totals['calls'] += calls
+    totals['prompt_tokens'] += prompt_tokens
+    totals['completion_tokens'] += completion_tokens
+    totals['total_processing_time'] += processing_time
+    for i, count in enumerate(histogram or []):
+        totals['latency_histogram'][i] += count
+
+
+def _describe(totals):
+    calls = totals['calls']
+    histogram = totals['latency_histogram']
+    return {
+        'count': calls,
+        'prompt_tokens': totals['prompt_tokens'],
+        'completion_tokens': totals['completion_tokens'],
+        'avg_processing_time': totals['total_processing_time'] / calls if calls else 0,
+        'latency_ms': {
+            'p50': percentile(histogram, 50),
+            'p95': percentile(histogram, 95),
+            'p99': percentile(histogram, 99),
+        },
+    }
+
+
+def usage_summary(since, until=None, period=None):
+    """Totals and latency percentiles per service type between two timestamps, read from rollups"""
+    until = until or timezone.now()
+    if period is None:
+        # Daily rows keep long ranges cheap; hourly rows keep short ranges precise
+        period = 'day' if until - since > timedelta(days=3) else 'hour'
+    
+    rollups = AIUsageRollup.objects.filter(
+        period=period,
+        bucket_start__gte=bucket_start(since, period),
+        bucket_start__lte=until
+    ).values_list(
+        'service_type', 'calls', 'prompt_tokens', 'completion_tokens',
+        'total_processing_time', 'latency_histogram'
+    )
+    
+    by_service = defaultdict(_empty_totals)
+    for service_type, calls, prompt_tokens, completion_tokens, processing_time, histogram in rollups:
+        _merge_values(by_service[service_type], calls, prompt_tokens, completion_tokens, processing_time, histogram)
+    
+    overall = _empty_totals()
+    service_types = []
+    for service_type, totals in sorted(by_service.items(), key=lambda item: -item[1]['calls']):
+        _merge_values(overall, totals['calls'], totals['prompt_tokens'], totals['completion_tokens'],
+                      totals['total_processing_time'], totals['latency_histogram'])
+        service_types.append({'service_type': service_type, **_describe(totals)})
+    
+    return {
+        'period': period,
+        'since': since,
+        'until': until,
+        'totals': _describe(overall),
+        'service_types': service_types,
+    }
@@ -0,0 +1,281 @@
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+
+from django.conf import settings
+
+
+# Keywords that map directly to a tag when they appear in a question
+KNOWN_TAGS = {
+    'python': 'python', 'django': 'django', 'flask': 'flask', 'fastapi': 'fastapi', 'numpy': 'numpy',
+    'pandas': 'pandas', 'javascript': 'javascript', 'typescript': 'typescript', 'nodejs': 'nodejs',
+    'vue': 'vue', 'angular': 'angular', 'html': 'html', 'css': 'css', 'tailwind': 'tailwindcss', 'java': 'java',
+    'kotlin': 'kotlin', 'c#': 'csharp', 'csharp': 'csharp', 'c++': 'cpp', 'cpp': 'cpp', 'golang': 'go',
+    'ruby': 'ruby', 'php': 'php', 'laravel': 'laravel', 'sql': 'sql', 'mysql': 'mysql', 'postgres': 'postgresql',
+    'postgresql': 'postgresql', 'sqlite': 'sqlite', 'mongodb': 'mongodb', 'redis': 'redis', 'docker': 'docker',
+    'kubernetes': 'kubernetes', 'git': 'git', 'github': 'github', 'linux': 'linux', 'bash': 'bash', 'aws': 'aws',
+    'graphql': 'graphql', 'regex': 'regex', 'json': 'json', 'async': 'async', 'asyncio': 'asyncio',
+    'pytest': 'pytest', 'algorithm': 'algorithms', 'algorithms': 'algorithms',
+}
+
+# Keywords that are also everyday words ("go through the rest"); they only count inside
+# inline code or code fences, or right next to another keyword or a TAG_CONTEXT_WORDS word
+AMBIGUOUS_TAGS = {
+    'go': 'go', 'rest': 'rest', 'node': 'nodejs', 'spring': 'spring', 'api': 'api', 'js': 'javascript',
+    'ts': 'typescript', 'react': 'react', 'rust': 'rust', 'rails': 'ruby-on-rails',
+}
+
+TAG_CONTEXT_WORDS = {
+    'app', 'apis', 'boot', 'client', 'code', 'component', 'components', 'endpoint', 'endpoints', 'framework',
+    'hook', 'hooks', 'language', 'library', 'module', 'modules', 'native', 'package', 'project', 'router',
+    'runtime', 'script', 'server', 'service', 'version',
+}
+
+QUESTION_WORDS = {
+    'how', 'what', 'why', 'when', 'where', 'which', 'who', 'can', 'could', 'is', 'are', 'does', 'do',
+    'should', 'would', 'will', 'was', 'did',
+}
+
+ENGLISH_STOPWORDS = {
+    'the', 'a', 'an', 'and', 'or', 'to', 'of', 'in', 'on', 'for', 'with', 'is', 'are', 'it', 'this', 'that',
+    'i', 'my', 'how', 'what', 'do', 'does', 'not', 'but', 'when', 'from', 'be', 'can', 'have',
+}
+
+_TOKEN_RE = re.compile(r"[a-z0-9#+]+(?:'[a-z]+)?")
+_CODE_SPAN_RE = re.compile(r'```.*?```|`[^`\n]+`', re.S)
+_SENTENCE_RE = re.compile(r'[.!?]+(?:\s|$)')
+_CODE_LINE_RE = re.compile(
+    r'^(?:\s{4,}\S|\t\S)'
+    r'|^\s*(?:def|class|import|from\s+\S+\s+import|function|const|let|var|return|public|private|#include)\b'
+    r'|^\s*(?:for|while|if|elif|else|try|except|finally|with)\b.*:\s*$'
+    r'|[;{}]\s*$|=>|^\s*[\w.\[\]]+\s*=\s*\S.*$'
+)
+
+
+def _words(text):
+    return _TOKEN_RE.findall(text.lower())
+
+
+def code_lines(text):
+    """Indexes of lines outside code fences that look like source code"""
+    lines = []
+    fenced = False
+    for i, line in enumerate(text.splitlines()):
+        if line.strip().startswith('```'):
+            fenced = not fenced
+            continue
+        if not fenced and line.strip() and _CODE_LINE_RE.search(line):
+            lines.append(i)
+    return lines
+
+
+def detect_language(text):
+    """'en' or 'other', from the share of non-ASCII letters and of common English words"""
+    letters = [c for c in text if c.isalpha()]
+    if letters and sum(1 for c in letters if not c.isascii()) / len(letters) > 0.1:
+        return 'other'
+    words = _words(text)
+    if len(words) >= 8 and sum(1 for w in words if w in ENGLISH_STOPWORDS) / len(words) < 0.15:
+        return 'other'
+    return 'en'
+
+
+def question_features(title, content):
+    title_words = _words(title)
+    return {
+        'title_words': len(title_words),
+        'title_is_question': title.strip().endswith('?'),
+        'content_words': len(_words(content)),
+        'sentences': len(_SENTENCE_RE.findall(content.strip() + ' ')),
+        'code_fenced': '```' in content,
+        'unfenced_code_lines': len(code_lines(content)),
+        'language': detect_language(f"{title}\n{content}"),
+    }
+
+
+def extract_tags(text, limit=5):
+    """Known technology keywords in a text, most frequent first"""
+    counts = Counter()
+    for code in _CODE_SPAN_RE.findall(text):
+        counts.update(KNOWN_TAGS.get(word) or AMBIGUOUS_TAGS.get(word) for word in _words(code))
+    
+    words = _words(_CODE_SPAN_RE.sub(' ', text))
+    context = TAG_CONTEXT_WORDS | KNOWN_TAGS.keys() | AMBIGUOUS_TAGS.keys()
+    for i, word in enumerate(words):
+        if word in KNOWN_TAGS:
+            counts[KNOWN_TAGS[word]] += 1
+        elif word in AMBIGUOUS_TAGS and context & set(words[max(i - 1, 0):i] + words[i + 1:i + 2]):
+            counts[AMBIGUOUS_TAGS[word]] += 1
+    
+    counts.pop(None, None)
+    return [tag for tag, count in counts.most_common(limit)]
+
+
+def tidy_title(title):
+    """Collapse whitespace, capitalize, and end questions with a question mark"""
+    title = ' '.join(title.split())
+    is_question = title.endswith('?')
+    title = title.rstrip(' .!?')
+    if not title:
+        return title
+    title = title[0].upper() + title[1:]
+    if is_question or title.split()[0].lower() in QUESTION_WORDS:
+        title += '?'
+    return title[:200]
+
+
+def fence_code(content):
+    """Wrap runs of unfenced code-looking lines in code fences"""
+    found = set(code_lines(content))
+    if not found:
+        return content
+    
+    lines = content.splitlines()
+    result = []
+    for i, line in enumerate(lines):
+        if i in found and (i - 1) not in found:
+            result.append('```')
+        result.append(line)
+        if i in found and (i + 1) not in found:
+            result.append('```')
+    return '\n'.join(result)
+
+
+class RouteDecision:
+    """Tier chosen for a request; result is set when the local tier answered it"""
+    
+    def __init__(self, tier, reason, result=None):
+        self.tier = tier
+        self.reason = reason
+        self.result = result
+
+
+class AIRouter:
+    """Sends trivial or already well-formed requests to deterministic local handlers instead of the model"""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tiers = defaultdict(lambda: defaultdict(lambda: {'requests': 0, 'seconds': 0.0}))
+        self._reasons = defaultdict(Counter)
+    
+    def record(self, service_type, tier, seconds, reason=None):
+        """Count a request served by a tier (local, cache or model) and how long it took"""
+        with self._lock:
+            counts = self._tiers[service_type][tier]
+            counts['requests'] += 1
+            counts['seconds'] += seconds
+            if reason is not None:
+                self._reasons[service_type][reason] += 1
+    
+    def _route(self, service_type, classify):
+        if not settings.AI_ROUTING['enabled']:
+            return RouteDecision('model', 'routing_disabled')
+        
+        start = time.perf_counter()
+        decision = classify()
+        if decision.tier == 'local':
+            self.record(service_type, 'local', time.perf_counter() - start, decision.reason)
+        else:
+            with self._lock:
+                self._reasons[service_type][decision.reason] += 1
+        return decision
+    
+    def route_question(self, title, content):
+        return self._route('question_improvement', lambda: self._classify_question(title, content))
+    
+    def route_answer_feedback(self, answer_content, question_context=''):
+        return self._route('answer_feedback', lambda: self._classify_answer(answer_content, question_context))
+    
+    def _classify_question(self, title, content):
+        features = question_features(title, content)
+        limits = settings.AI_ROUTING
+        
+        if features['language'] != 'en':
+            return RouteDecision('model', 'non_english')
+        
+        if features['content_words'] <= limits['trivial_max_words']:
+            reason = 'trivial'
+        elif (
+            features['title_is_question']
+            and 4 <= features['title_words'] <= 25
+            and features['sentences'] >= 2
+            and features['content_words'] <= limits['well_formed_max_words']
+        ):
+            reason = 'well_formed'
+        else:
+            return RouteDecision('model', 'complex')
+        
+        improved_title = tidy_title(title)
+        improved_content = fence_code(content.strip())
+        notes = []
+        if improved_title != title:
+            notes.append('tidied the title')
+        if improved_content != content.strip():
+            notes.append('wrapped code in code fences')
+        
+        return RouteDecision('local', reason, {
+            'improved_title': improved_title,
+            'improved_content': improved_content,
+            'suggested_tags': extract_tags(f"{title}\n{content}"),
+            'similar_questions': [],
+            'confidence_score': 6 if reason == 'well_formed' else 4,
+            'improvement_notes': (
+                'The question is already clear and well structured'
+                if reason == 'well_formed' else
+                'Add more detail: what you tried, what you expected and what happened instead'
+            ) + (f" ({', '.join(notes)})" if notes else ''),
+        })
+    
+    def _classify_answer(self, answer_content, question_context):
+        words = _words(answer_content)
+        if len(words) > settings.AI_ROUTING['answer_trivial_max_words'] or code_lines(answer_content) \
+                or '```' in answer_content or detect_language(answer_content) != 'en':
+            return RouteDecision('model', 'complex')
+        
+        has_link = 'http://' in answer_content or 'https://' in answer_content
+        suggestions = ['Explain why this works, not only what to do', 'Add a short example']
+        if code_lines(question_context) or '```' in question_context:
+            suggestions.append('Show the corrected code')
+        if not has_link:
+            suggestions.append('Link to the relevant documentation')
+        
+        return RouteDecision('local', 'trivial', {
+            'assessment_score': min(5, 2 + len(words) // 4 + has_link),
+            'feedback': (
+                'This answer is very short. A sentence or two explaining the reasoning, '
+                'and an example, would make it much more useful to the person asking.'
+            ),
+            'suggestions': suggestions,
+            'improved_answer': '',
+            'learning_points': ['Answers that explain the why are easier to learn from and to trust'],
+            'confidence_boost': 'A short answer is a good start; expanding it is the next step.',
+        })
+    
+    def stats(self):
+        with self._lock:
+            tiers = {service: {tier: dict(counts) for tier, counts in by_tier.items()}
+                     for service, by_tier in self._tiers.items()}
+            reasons = {service: dict(counts) for service, counts in self._reasons.items()}
+        
+        result = {}
+        for service_type, by_tier in tiers.items():
+            for counts in by_tier.values():
+                counts['avg_ms'] = counts['seconds'] / counts['requests'] * 1000 if counts['requests'] else 0
+            model = by_tier.get('model')
+            saved = 0.0
+            if model and model['requests']:
+                # Time the requests answered locally or from cache would have spent at the model's average
+                model_avg = model['seconds'] / model['requests']
+                saved = sum(
+                    counts['requests'] * model_avg - counts['seconds']
+                    for tier, counts in by_tier.items() if tier != 'model'
+                )
+            result[service_type] = {
+                'tiers': by_tier,
+                'reasons': reasons.get(service_type, {}),
+                'estimated_seconds_saved': round(saved, 3),
+            }
+        for service_type, counts in reasons.items():
+            result.setdefault(service_type, {'tiers': {}, 'reasons': counts, 'estimated_seconds_saved': 0.0})
+        return result
@@ -0,0 +1,229 @@
+import json
+import re
+import threading
+from collections import defaultdict
+
+
+class SchemaError(ValueError):
+    """Raised when a model response cannot be parsed into its service's schema"""
+
+
+_decoder = json.JSONDecoder()
+_FENCE_RE = re.compile(r'^```[a-zA-Z]*\s*|\s*```$')
+_TRAILING_COMMA_RE = re.compile(r',\s*([}\]])')
+
+
+def extract_json(text, opening='{'):
+    """First JSON value starting with `opening` in a model response
+
+    Tries the whole (unfenced) text first, then decodes from each candidate
+    start position instead of backtracking with a greedy regex.
+    """
+    text = _FENCE_RE.sub('', text.strip())
+    try:
+        return json.loads(text)
+    except ValueError:
+        pass
+    
+    pos = text.find(opening)
+    while pos != -1:
+        candidate = text[pos:]
+        for attempt in (candidate, _TRAILING_COMMA_RE.sub(r'\1', candidate)):
+            try:
+                value, _ = _decoder.raw_decode(attempt)
+                return value
+            except ValueError:
+                continue
+        pos = text.find(opening, pos + 1)
+    
+    raise SchemaError('No JSON value found in response')
+
+
+class Field:
+    """A typed field of a structured response, coerced leniently and defaulted when absent"""
+    
+    TYPES = {str: 'string', int: 'integer', float: 'number', bool: 'boolean', list: 'array'}
+    
+    def __init__(self, kind, default=None, required=False, max_length=None, minimum=None, maximum=None):
+        self.kind = kind
+        self.default = default
+        self.required = required
+        self.max_length = max_length
+        self.minimum = minimum
+        self.maximum = maximum
+    
+    def json_schema(self):
+        schema = {'type': self.TYPES[self.kind]}
+        if self.kind is list:
+            schema['items'] = {'type': 'string'}
+        return schema
+    
+    def coerce(self, value):
+        if self.kind is str:
+            if isinstance(value, (dict, list)):
+                value = json.dumps(value)
+            value = str(value).strip()
+            return value[:self.max_length] if self.max_length else value
+        
+        if self.kind in (int, float):
+            try:
+                value = self.kind(float(value))
+            except (TypeError, ValueError):
+                raise SchemaError(f"Expected a number, got {value!r}")
+            if self.minimum is not None:
+                value = max(self.minimum, value)
+            if self.maximum is not None:
+                value = min(self.maximum, value)
+            return value
+        
+        if self.kind is bool:
+            if isinstance(value, str):
+                return value.strip().lower() in ('true', 'yes', '1')
+            return bool(value)
+        
+        # Lists of strings; a comma separated string is accepted as well
+        if isinstance(value, str):
+            value = [item for item in value.split(',')]
+        if not isinstance(value, list):
+            raise SchemaError(f"Expected a list, got {value!r}")
+        items = [str(item).strip() for item in value if item is not None and not isinstance(item, (dict, list))]
+        return [item for item in items if item]
+
+
+class ObjectSchema:
+    """Schema of a JSON object response"""
+    
+    opening = '{'
+    
+    def __init__(self, **fields):
+        self.fields = fields
+    
+    def json_schema(self):
+        return {
+            'type': 'object',
+            'properties': {name: field.json_schema() for name, field in self.fields.items()},
+            'required': [name for name, field in self.fields.items() if field.required],
+        }
+    
+    def validate(self, value):
+        if not isinstance(value, dict):
+            raise SchemaError('Expected a JSON object')
+        
+        result = {}
+        for name, field in self.fields.items():
+            if value.get(name) in (None, ''):
+                if field.required:
+                    raise SchemaError(f"Missing required field '{name}'")
+                result[name] = field.default() if callable(field.default) else field.default
+                continue
+            result[name] = field.coerce(value[name])
+            if field.required and result[name] in ('', []):
+                raise SchemaError(f"Empty required field '{name}'")
+        return result
+    
+    def parse(self, text):
+        return self.validate(extract_json(text, self.opening))
+
+
+class ListSchema:
+    """Schema of a JSON array of strings response"""
+    
+    opening = '['
+    
+    def __init__(self, min_items=0, max_items=None):
+        self.min_items = min_items
+        self.max_items = max_items
+        self.field = Field(list)
+    
+    def json_schema(self):
+        return {'type': 'array', 'items': {'type': 'string'}}
+    
+    def validate(self, value):
+        if isinstance(value, dict) and len(value) == 1:
+            # Some models wrap arrays in an object, e.g. {"tags": [...]}
+            value = next(iter(value.values()))
+        items = self.field.coerce(value)
+        if len(items) < self.min_items:
+            raise SchemaError(f"Expected at least {self.min_items} item(s)")
+        return items[:self.max_items] if self.max_items else items
+    
+    def parse(self, text):
+        return self.validate(extract_json(text, self.opening))
+
+
+# Response schema per service type; services without one return free text
+SCHEMAS = {
+    'question_improvement': ObjectSchema(
+        improved_title=Field(str, required=True, max_length=200),
+        improved_content=Field(str, required=True),
+        suggested_tags=Field(list, default=list),
+        similar_questions=Field(list, default=list),
+        confidence_score=Field(int, default=0, minimum=0, maximum=10),
+        improvement_notes=Field(str, default=''),
+    ),
+    'answer_feedback': ObjectSchema(
+        assessment_score=Field(int, default=0, minimum=0, maximum=10),
+        feedback=Field(str, required=True),
+        suggestions=Field(list, default=list),
+        improved_answer=Field(str, default=''),
+        learning_points=Field(list, default=list),
+        confidence_boost=Field(str, default=''),
+    ),
+    'tag_suggestion': ListSchema(min_items=1, max_items=10),
+    'similar_questions': ListSchema(),
+    'confidence_analysis': ObjectSchema(
+        trend_analysis=Field(str, required=True),
+        learning_insights=Field(list, default=list),
+        recommendations=Field(list, default=list),
+        encouragement=Field(str, default=''),
+        growth_score=Field(int, default=0, minimum=0, maximum=10),
+    ),
+    'learning_path': ObjectSchema(
+        skill_level=Field(str, required=True),
+        next_steps=Field(list, default=list),
+        focus_topics=Field(list, default=list),
+        learning_goals=Field(list, default=list),
+        mentor_advice=Field(str, default=''),
+    ),
+}
+
+
+REPAIR_PROMPT = """
+Your previous response could not be parsed: {error}
+
+Previous response:
+{response}
+
+Return only valid JSON matching this JSON schema, with no other text:
+{schema}
+"""
+
+
+def repair_prompt(schema, response, error):
+    # Long responses are cut so the repair call stays cheap
+    return REPAIR_PROMPT.format(
+        error=error, response=response[:4000], schema=json.dumps(schema.json_schema())
+    )
+
+
+class ParseStats:
+    """Structured output parse outcomes per service type and prompt version"""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = defaultdict(lambda: {'parsed': 0, 'repaired': 0, 'failed': 0, 'repair_tokens': 0})
+    
+    def record(self, service_type, prompt_version, outcome, repair_tokens=0):
+        with self._lock:
+            counts = self._counts[f"{service_type}@v{prompt_version}"]
+            counts[outcome] += 1
+            counts['repair_tokens'] += repair_tokens
+    
+    def stats(self):
+        with self._lock:
+            counts = {key: dict(value) for key, value in self._counts.items()}
+        for value in counts.values():
+            total = value['parsed'] + value['repaired'] + value['failed']
+            # Share of responses that needed a second model call
+            value['parse_failure_rate'] = (value['repaired'] + value['failed']) / total if total else 0
+        return counts
@@ -1,31 +1,425 @@
-import google.generativeai as genai
 from django.conf import settings
 from django.utils import timezone
 import time
 import json
-import re
-from .models import AIService
+import threading
+import asyncio
+import functools
+from asgiref.sync import sync_to_async
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from django.db import connection
+from django.utils.functional import LazyObject, empty
+from rest_framework.exceptions import APIException
+from .ai_cache import AIResponseCache
+from .similarity import similarity_index, IndexNotReady
+from .tag_model import tag_suggester
+from .ai_budget import ai_budget, estimate_tokens, AIBudgetExceeded
+from .ai_resilience import ResilientCaller, AIServiceUnavailable
+from .ai_backends import get_backend
+from .ai_audit import ai_audit
+from .ai_schemas import SCHEMAS, SchemaError, ParseStats, repair_prompt
+from .ai_routing import AIRouter
 
 
-class AIServiceManager:
-    """Manager for AI services in StackIt using Gemini API"""
+# Bump a service's version whenever its prompt template changes so stale
+# cached responses are no longer served
+PROMPT_VERSIONS = {
+    'question_improvement': 2,
+    'answer_feedback': 2,
+    'tag_suggestion': 2,
+    'similar_questions': 2,
+    'answer_improvement': 1,
+    'confidence_analysis': 3,
+    'learning_path': 2,
+}
+
+
+class _Flight:
+    """A single upstream call that concurrent identical requests wait on"""
+    
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Merge identical in-flight calls across threads into one upstream call"""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights = {}
+        self.calls = 0
+        self.coalesced = 0
+    
+    def do(self, key, fn):
+        """Run fn once per key at a time; concurrent callers share its result or exception"""
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = _Flight()
+                self._flights[key] = flight
+                self.calls += 1
+            else:
+                self.coalesced += 1
+        
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+        
+        try:
+            flight.result = fn()
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+        
+        return flight.result
+    
+    def stats(self):
+        with self._lock:
+            return {
+                'upstream_calls': self.calls,
+                'coalesced_calls': self.coalesced,
+                'in_flight': len(self._flights),
+            }
+
+
+class AsyncSingleFlight:
+    """SingleFlight for coroutines: identical calls on one event loop share a single upstream call"""
     
     def __init__(self):
+        self._flights = {}
+        self.calls = 0
+        self.coalesced = 0
+    
+    async def do(self, key, fn):
+        """Await fn() once per key at a time; concurrent callers share its result or exception
+
+        The call runs in a task owned by the flight. A cancelled caller (say
+        its client disconnected) only stops waiting; the task is cancelled
+        once no caller is waiting for it any more.
+        """
+        loop = asyncio.get_running_loop()
+        # Tasks belong to one event loop, so flights are never shared between loops
+        flight_key = (id(loop), key)
+        flight = self._flights.get(flight_key)
+        if flight is None:
+            flight = {'task': loop.create_task(fn()), 'waiters': 0}
+            flight['task'].add_done_callback(lambda task: self._land(flight_key, flight))
+            self._flights[flight_key] = flight
+            self.calls += 1
+        else:
+            self.coalesced += 1
+        
+        flight['waiters'] += 1
+        try:
+            return await asyncio.shield(flight['task'])
+        except asyncio.CancelledError:
+            if flight['waiters'] == 1 and not flight['task'].done():
+                flight['task'].cancel()
+            raise
+        finally:
+            flight['waiters'] -= 1
+    
+    def _land(self, flight_key, flight):
+        if self._flights.get(flight_key) is flight:
+            del self._flights[flight_key]
+        # Mark the outcome as retrieved even when every caller had stopped waiting
+        task = flight['task']
+        task.cancelled() or task.exception()
+    
+    def stats(self):
+        return {
+            'upstream_calls': self.calls,
+            'coalesced_calls': self.coalesced,
+            'in_flight': len(self._flights),
+        }
+
+
+class AIServiceManager:
+    """Manager for AI services in StackIt using a pluggable model backend (see qa/ai_backends.py)"""
+    
+    def __init__(self, backend=None):
+        self.cache = AIResponseCache()
+        self.single_flight = SingleFlight()
+        self.async_single_flight = AsyncSingleFlight()
+        self.parse_stats = ParseStats()
+        self.router = AIRouter()
+        self._executor = None
+        self._executor_lock = threading.Lock()
         try:
-            genai.configure(api_key=settings.GEMINI_API_KEY)
-            self.model = genai.GenerativeModel('gemini-1.5-flash')
+            self.backend = backend or get_backend()
         except Exception as e:
             print(f"Warning: AI services not available - {e}")
-            self.model = None
+            self.backend = None
+        self.resilience = ResilientCaller(self.model_name or 'ai')
     
-    def improve_question(self, title, content):
-        """Improve question title and content using AI"""
-        if not self.model:
-            return None, None
-            
+    @property
+    def model_name(self):
+        return self.backend.model_name if self.backend else None
+    
+    def _generate(self, service_type, prompt, input_text, cache_inputs, user=None, community=None, hedge=False):
+        """Answer a prompt from the cache or the model and record the call"""
+        cache_key = self.cache.make_key(
+            service_type, self.model_name, PROMPT_VERSIONS.get(service_type, 1), cache_inputs
+        )
+        start = time.perf_counter()
+        cached = self.cache.get(service_type, cache_key)
+        if cached is not None:
+            self.router.record(service_type, 'cache', time.perf_counter() - start)
+            return cached
+        
+        # Every caller pays from its own budget, also when it joins another caller's flight;
+        # nothing inside the flight checks a budget, so one user's 429 never reaches the others
+        reservation = ai_budget.reserve(self._estimate(service_type, prompt), user=user, community=community)
+        try:
+            # Identical requests already in flight share that call's result
+            result = self.single_flight.do(
+                cache_key,
+                lambda: self._call_model(service_type, prompt, input_text, cache_key, user, community, hedge)
+            )
+        except Exception as e:
+            ai_budget.settle(reservation, getattr(e, 'tokens_used', 0))
+            raise
+        ai_budget.settle(reservation, result[1].tokens_used)
+        
+        self.router.record(service_type, 'model', time.perf_counter() - start)
+        return result
+    
+    @staticmethod
+    def _estimate(service_type, prompt):
+        """Tokens reserved from the budgets before a prompt is sent"""
+        return estimate_tokens(prompt) + settings.AI_COMPLETION_TOKEN_ESTIMATES.get(service_type, 500)
+    
+    def _complete(self, service_type, prompt, schema=None, hedge=False):
+        """One resilient model call; returns the Completion and its token counts"""
+        # Deadline, retries and circuit breaking; the SDK also gets the time left as its timeout
+        response = self.resilience.call(
+            lambda timeout: self.backend.generate(prompt, timeout=timeout, schema=schema),
+            settings.AI_DEADLINES.get(service_type, settings.AI_DEFAULT_DEADLINE),
+            hedge=hedge
+        )
+        prompt_tokens, completion_tokens = self._token_usage(response, prompt)
+        return response, prompt_tokens, completion_tokens
+    
+    def _call_model(self, service_type, prompt, input_text, cache_key, user=None, community=None, hedge=False):
+        """Send a prompt to the model, then record and cache the (validated) response"""
         start_time = time.time()
+        response, prompt_tokens, completion_tokens = self._complete(
+            service_type, prompt, SCHEMAS.get(service_type), hedge
+        )
+        return self._store(
+            service_type, input_text, cache_key, response.text, prompt_tokens, completion_tokens, start_time,
+            user, community
+        )
+    
+    async def _agenerate(self, service_type, prompt, input_text, cache_inputs, user=None, community=None,
+                         hedge=False):
+        """_generate() for async views; the model call awaits the backend's async client"""
+        cache_key = self.cache.make_key(
+            service_type, self.model_name, PROMPT_VERSIONS.get(service_type, 1), cache_inputs
+        )
+        start = time.perf_counter()
+        # A memory miss falls through to the database tier
+        cached = await sync_to_async(self.cache.get)(service_type, cache_key)
+        if cached is not None:
+            self.router.record(service_type, 'cache', time.perf_counter() - start)
+            return cached
         
-        prompt = f"""
+        # Budgets are database rows, reached through a thread like the other ORM calls
+        reservation = await sync_to_async(ai_budget.reserve)(
+            self._estimate(service_type, prompt), user=user, community=community
+        )
+        try:
+            result = await self.async_single_flight.do(
+                cache_key,
+                lambda: self._acall_model(service_type, prompt, input_text, cache_key, user, community, hedge)
+            )
+        except BaseException as e:
+            # Also when the request is cancelled because the client went away
+            await sync_to_async(ai_budget.settle)(reservation, getattr(e, 'tokens_used', 0))
+            raise
+        await sync_to_async(ai_budget.settle)(reservation, result[1].tokens_used)
+        
+        self.router.record(service_type, 'model', time.perf_counter() - start)
+        return result
+    
+    async def _acomplete(self, service_type, prompt, schema=None, hedge=False):
+        """_complete() for async callers"""
+        response = await self.resilience.acall(
+            lambda timeout: self.backend.agenerate(prompt, timeout=timeout, schema=schema),
+            settings.AI_DEADLINES.get(service_type, settings.AI_DEFAULT_DEADLINE),
+            hedge=hedge
+        )
+        prompt_tokens, completion_tokens = self._token_usage(response, prompt)
+        return response, prompt_tokens, completion_tokens
+    
+    async def _acall_model(self, service_type, prompt, input_text, cache_key, user=None, community=None,
+                           hedge=False):
+        start_time = time.time()
+        response, prompt_tokens, completion_tokens = await self._acomplete(
+            service_type, prompt, SCHEMAS.get(service_type), hedge
+        )
+        fix_prompt = self._repair_prompt(service_type, response.text)
+        repair = None
+        if fix_prompt is not None:
+            repair = await self._acomplete(service_type, fix_prompt, SCHEMAS.get(service_type))
+        # Only the recording touches the database
+        return await sync_to_async(self._record)(
+            service_type, input_text, cache_key, response.text, repair, prompt_tokens, completion_tokens,
+            start_time, user, community
+        )
+    
+    @staticmethod
+    def _repair_prompt(service_type, result):
+        """Prompt asking the model to fix a response that does not match its schema, or None"""
+        schema = SCHEMAS.get(service_type)
+        if schema is None:
+            return None
+        try:
+            schema.parse(result)
+        except SchemaError as e:
+            return repair_prompt(schema, result, e)
+        return None
+    
+    def _store(self, service_type, input_text, cache_key, result, prompt_tokens, completion_tokens, start_time,
+               user=None, community=None):
+        """Validate a model response against its schema, then record and cache it"""
+        fix_prompt = self._repair_prompt(service_type, result)
+        repair = None
+        if fix_prompt is not None:
+            # One repair attempt: show the model its output and the schema instead of failing the request
+            repair = self._complete(service_type, fix_prompt, SCHEMAS.get(service_type))
+        return self._record(
+            service_type, input_text, cache_key, result, repair, prompt_tokens, completion_tokens, start_time,
+            user, community
+        )
+    
+    def _record(self, service_type, input_text, cache_key, result, repair, prompt_tokens, completion_tokens,
+                start_time, user=None, community=None):
+        """Record and cache a response; repair is the (response, prompt_tokens, completion_tokens) of a repair call"""
+        schema = SCHEMAS.get(service_type)
+        prompt_version = PROMPT_VERSIONS.get(service_type, 1)
+        
+        metadata = {'prompt_version': prompt_version}
+        error = None
+        if schema is not None:
+            if repair is None:
+                result = json.dumps(schema.parse(result))
+                metadata['parse'] = 'parsed'
+            else:
+                repair, repair_prompt_tokens, repair_completion_tokens = repair
+                prompt_tokens += repair_prompt_tokens
+                completion_tokens += repair_completion_tokens
+                metadata['repair_tokens'] = repair_prompt_tokens + repair_completion_tokens
+                try:
+                    result = json.dumps(schema.parse(repair.text))
+                    metadata['parse'] = 'repaired'
+                except SchemaError as repair_error:
+                    result = repair.text
+                    metadata['parse'] = 'failed'
+                    error = repair_error
+            self.parse_stats.record(service_type, prompt_version, metadata['parse'], metadata.get('repair_tokens', 0))
+        processing_time = time.time() - start_time
+        
+        # Unparseable output is audited but never cached
+        expires_at = self.cache.expiry_for(service_type) if error is None else None
+        
+        # The audit record is written in the background; its id is valid right away
+        ai_service = ai_audit.record(
+            service_type=service_type,
+            input_text=input_text,
+            output_text=result,
+            metadata=metadata,
+            processing_time=processing_time,
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            tokens_used=prompt_tokens + completion_tokens,
+            user_id=getattr(user, 'pk', user),
+            community_id=getattr(community, 'pk', community),
+            cache_key=cache_key if expires_at else '',
+            expires_at=expires_at
+        )
+        
+        if error is not None:
+            # The callers' budgets are still charged for the unusable output
+            error.tokens_used = prompt_tokens + completion_tokens
+            raise error
+        
+        self.cache.set(cache_key, result, ai_service, expires_at)
+        
+        return result, ai_service
+    
+    def _stream(self, service_type, prompt, input_text, cache_inputs, user=None, community=None):
+        """Stream a prompt's answer as ('delta', text) events, then ('done', result, ai_service)
+
+        The result is recorded and cached like a regular call once the stream completes.
+        """
+        cache_key = self.cache.make_key(
+            service_type, self.model_name, PROMPT_VERSIONS.get(service_type, 1), cache_inputs
+        )
+        start = time.perf_counter()
+        cached = self.cache.get(service_type, cache_key)
+        if cached is not None:
+            self.router.record(service_type, 'cache', time.perf_counter() - start)
+            yield 'delta', cached[0]
+            yield 'done', cached[0], cached[1]
+            return
+        
+        schema = SCHEMAS.get(service_type)
+        reservation = ai_budget.reserve(self._estimate(service_type, prompt), user=user, community=community)
+        
+        streams = []
+        
+        def open_stream(timeout):
+            streams.append(self.backend.stream(prompt, timeout=timeout, schema=schema))
+            return streams[-1]
+        
+        start_time = time.time()
+        try:
+            for chunk in self.resilience.stream(
+                open_stream, settings.AI_DEADLINES.get(service_type, settings.AI_DEFAULT_DEADLINE)
+            ):
+                yield 'delta', chunk
+        except BaseException:
+            # Failed or abandoned by the client: charge what was generated so far
+            partial = streams[-1].text if streams else ''
+            ai_budget.settle(reservation, estimate_tokens(prompt) + estimate_tokens(partial) if partial else 0)
+            raise
+        
+        completion = streams[-1]
+        prompt_tokens, completion_tokens = self._token_usage(completion, prompt)
+        try:
+            result, ai_service = self._store(
+                service_type, input_text, cache_key, completion.text, prompt_tokens, completion_tokens, start_time,
+                user, community
+            )
+        except Exception as e:
+            ai_budget.settle(reservation, getattr(e, 'tokens_used', prompt_tokens + completion_tokens))
+            raise
+        # Includes the tokens of a schema repair call
+        ai_budget.settle(reservation, ai_service.tokens_used)
+        self.router.record(service_type, 'model', time.perf_counter() - start)
+        yield 'done', result, ai_service
+    
+    @staticmethod
+    def _token_usage(completion, prompt):
+        """Prompt and completion token counts reported by the backend, estimated if missing"""
+        if not completion.prompt_tokens and not completion.completion_tokens:
+            return estimate_tokens(prompt), estimate_tokens(completion.text)
+        return completion.prompt_tokens or 0, completion.completion_tokens or 0
+    
+    @staticmethod
+    def _question_improvement_prompt(title, content):
+        """Prompt for question improvement"""
+        return f"""
         You are an expert at helping learners ask better questions. Improve this question to make it clearer, more specific, and more likely to get helpful answers.
         
         Original Title: {title}
@@ -48,40 +442,41 @@ class AIServiceManager:
             "improvement_notes": "Brief explanation of what was improved"
         }}
         """
+    
+    def improve_question(self, title, content, user=None, community=None, hedge=False, allow_local=False):
+        """Improve question title and content using AI (hedge for interactive callers)"""
+        # Background jobs let trivial or already well-formed questions be handled locally (see
+        # qa/ai_routing.py); a user who asks for an improvement always gets the model's
+        if allow_local:
+            route = self.router.route_question(title, content)
+            if route.result is not None:
+                return json.dumps(route.result), None
+        
+        if not self.backend:
+            return None, None
+        
+        prompt = self._question_improvement_prompt(title, content)
         
         try:
-            response = self.model.generate_content(prompt)
-            result = response.text
-            processing_time = time.time() - start_time
-            
-            # Clean the response to extract JSON
-            json_match = re.search(r'\{.*\}', result, re.DOTALL)
-            if json_match:
-                result = json_match.group()
-            
-            # Save AI service record
-            ai_service = AIService.objects.create(
-                service_type='question_improvement',
+            return self._generate(
+                'question_improvement', prompt,
                 input_text=f"Title: {title}\nContent: {content}",
-                output_text=result,
-                processing_time=processing_time,
-                tokens_used=len(result.split())  # Approximate token count
+                cache_inputs=[title, content],
+                user=user,
+                community=community,
+                hedge=hedge
             )
-            
-            return result, ai_service
-            
+        except APIException:
+            # Budget and circuit breaker errors reach the client as a 429 or 503
+            raise
         except Exception as e:
             print(f"AI question improvement failed: {e}")
             return None, None
     
-    def provide_answer_feedback(self, answer_content, question_context=""):
-        """Provide AI feedback on answer quality"""
-        if not self.model:
-            return None, None
-            
-        start_time = time.time()
-        
-        prompt = f"""
+    @staticmethod
+    def _answer_feedback_prompt(answer_content, question_context):
+        """Prompt for answer feedback"""
+        return f"""
         You are an expert mentor reviewing a student's answer. Provide constructive feedback to help them improve.
         
         Question Context: {question_context}
@@ -104,39 +499,47 @@ class AIServiceManager:
             "confidence_boost": "How this answer shows growth"
         }}
         """
+    
+    def provide_answer_feedback(self, answer_content, question_context="", user=None, community=None,
+                                allow_local=False):
+        """Provide AI feedback on answer quality"""
+        # Only background feedback on very short answers is handled locally (see qa/ai_routing.py);
+        # a user who asks for feedback always gets the model's
+        if allow_local:
+            route = self.router.route_answer_feedback(answer_content, question_context)
+            if route.result is not None:
+                return json.dumps(route.result), None
+        
+        if not self.backend:
+            return None, None
+        
+        prompt = self._answer_feedback_prompt(answer_content, question_context)
         
         try:
-            response = self.model.generate_content(prompt)
-            result = response.text
-            processing_time = time.time() - start_time
-            
-            # Clean the response to extract JSON
-            json_match = re.search(r'\{.*\}', result, re.DOTALL)
-            if json_match:
-                result = json_match.group()
-            
-            # Save AI service record
-            ai_service = AIService.objects.create(
-                service_type='answer_feedback',
+            return self._generate(
+                'answer_feedback', prompt,
                 input_text=f"Question: {question_context}\nAnswer: {answer_content}",
-                output_text=result,
-                processing_time=processing_time,
-                tokens_used=len(result.split())  # Approximate token count
+                cache_inputs=[question_context, answer_content],
+                user=user,
+                community=community
             )
-            
-            return result, ai_service
-            
+        except APIException:
+            # Budget and circuit breaker errors reach the client as a 429 or 503
+            raise
         except Exception as e:
             print(f"AI answer feedback failed: {e}")
             return None, None
     
-    def suggest_tags(self, title, content):
+    def suggest_tags(self, title, content, user=None, community=None):
         """Suggest relevant tags for a question"""
-        if not self.model:
+        # Fast path: the offline tag model answers when it is confident enough
+        local_tags = tag_suggester.suggest_if_confident(title, content)
+        if local_tags is not None:
+            return json.dumps(local_tags), None
+        
+        if not self.backend:
             return None, None
             
-        start_time = time.time()
-        
         prompt = f"""
         Suggest 3-5 relevant tags for this question. Focus on programming languages, frameworks, tools, and concepts.
         
@@ -148,37 +551,25 @@ class AIServiceManager:
         """
         
         try:
-            response = self.model.generate_content(prompt)
-            result = response.text
-            processing_time = time.time() - start_time
-            
-            # Clean the response to extract JSON array
-            array_match = re.search(r'\[.*\]', result)
-            if array_match:
-                result = array_match.group()
-            
-            # Save AI service record
-            ai_service = AIService.objects.create(
-                service_type='tag_suggestion',
+            return self._generate(
+                'tag_suggestion', prompt,
                 input_text=f"Title: {title}\nContent: {content}",
-                output_text=result,
-                processing_time=processing_time,
-                tokens_used=len(result.split())  # Approximate token count
+                cache_inputs=[title, content],
+                user=user,
+                community=community
             )
-            
-            return result, ai_service
-            
+        except APIException:
+            # Budget and circuit breaker errors reach the client as a 429 or 503
+            raise
         except Exception as e:
             print(f"AI tag suggestion failed: {e}")
             return None, None
     
-    def find_similar_questions(self, title, content, community_questions):
-        """Find similar questions in the community"""
-        if not self.model:
+    def find_similar_questions(self, title, content, community_questions, user=None, community=None):
+        """Find similar questions in the community (prefer qa.similarity for large communities)"""
+        if not self.backend:
             return None, None
             
-        start_time = time.time()
-        
         # Create a list of existing questions for context
         existing_questions = "\n".join([
             f"ID: {q.id} - Q: {q.title}\nA: {q.content[:200]}..." 
@@ -200,38 +591,24 @@ class AIServiceManager:
         """
         
         try:
-            response = self.model.generate_content(prompt)
-            result = response.text
-            processing_time = time.time() - start_time
-            
-            # Clean the response to extract JSON array
-            array_match = re.search(r'\[.*\]', result)
-            if array_match:
-                result = array_match.group()
-            
-            # Save AI service record
-            ai_service = AIService.objects.create(
-                service_type='similar_questions',
+            return self._generate(
+                'similar_questions', prompt,
                 input_text=f"Title: {title}\nContent: {content}",
-                output_text=result,
-                processing_time=processing_time,
-                tokens_used=len(result.split())  # Approximate token count
+                cache_inputs=[title, content, existing_questions],
+                user=user,
+                community=community
             )
-            
-            return result, ai_service
-            
+        except APIException:
+            # Budget and circuit breaker errors reach the client as a 429 or 503
+            raise
         except Exception as e:
             print(f"AI similar questions failed: {e}")
             return None, None
     
-    def improve_answer(self, answer_content, question_context):
-        """Improve an answer using AI assistance"""
-        if not self.model:
-            return None, None
-            
-        start_time = time.time()
-        
-        prompt = f"""
+    @staticmethod
+    def _answer_improvement_prompt(answer_content, question_context):
+        """Prompt for answer improvement"""
+        return f"""
         Improve this answer to make it more helpful, comprehensive, and well-structured.
         
         Question Context: {question_context}
@@ -246,48 +623,78 @@ class AIServiceManager:
         
         Return the improved answer directly.
         """
+    
+    def improve_answer(self, answer_content, question_context, user=None, community=None):
+        """Improve an answer using AI assistance"""
+        if not self.backend:
+            return None, None
+        
+        prompt = self._answer_improvement_prompt(answer_content, question_context)
         
         try:
-            response = self.model.generate_content(prompt)
-            result = response.text
-            processing_time = time.time() - start_time
-            
-            # Save AI service record
-            ai_service = AIService.objects.create(
-                service_type='answer_improvement',
+            return self._generate(
+                'answer_improvement', prompt,
                 input_text=f"Question: {question_context}\nAnswer: {answer_content}",
-                output_text=result,
-                processing_time=processing_time,
-                tokens_used=len(result.split())  # Approximate token count
+                cache_inputs=[question_context, answer_content],
+                user=user,
+                community=community
             )
-            
-            return result, ai_service
-            
+        except APIException:
+            # Budget and circuit breaker errors reach the client as a 429 or 503
+            raise
         except Exception as e:
             print(f"AI answer improvement failed: {e}")
             return None, None
     
-    def analyze_confidence_trend(self, user_answers):
-        """Analyze user's confidence trends and provide insights"""
-        if not self.model:
-            return None, None
-            
-        start_time = time.time()
+    def stream_answer_improvement(self, answer_content, question_context, user=None, community=None):
+        """Improve an answer, streamed as ('delta', text) events and a final ('done', result, ai_service)"""
+        if not self.backend:
+            yield 'error', 'AI service unavailable'
+            return
         
-        # Create a summary of user's answer history
-        confidence_data = []
-        for answer in user_answers:
-            confidence_data.append({
-                'confidence': answer.confidence_level,
-                'date': answer.created_at.strftime('%Y-%m-%d'),
-                'question_title': answer.question.title[:50]
-            })
+        try:
+            yield from self._stream(
+                'answer_improvement', self._answer_improvement_prompt(answer_content, question_context),
+                input_text=f"Question: {question_context}\nAnswer: {answer_content}",
+                cache_inputs=[question_context, answer_content],
+                user=user,
+                community=community
+            )
+        except APIException:
+            raise
+        except Exception as e:
+            print(f"AI answer improvement stream failed: {e}")
+            yield 'error', 'Failed to improve answer with AI'
+    
+    def stream_answer_feedback(self, answer_content, question_context="", user=None, community=None):
+        """Answer feedback streamed like stream_answer_improvement; the final result is the validated JSON"""
+        if not self.backend:
+            yield 'error', 'AI service unavailable'
+            return
         
-        prompt = f"""
+        try:
+            yield from self._stream(
+                'answer_feedback', self._answer_feedback_prompt(answer_content, question_context),
+                input_text=f"Question: {question_context}\nAnswer: {answer_content}",
+                cache_inputs=[question_context, answer_content],
+                user=user,
+                community=community
+            )
+        except APIException:
+            raise
+        except Exception as e:
+            print(f"AI answer feedback stream failed: {e}")
+            yield 'error', 'Failed to get AI feedback'
+    
+    @staticmethod
+    def _confidence_analysis_prompt(confidence_summary):
+        """Prompt for confidence trend analysis"""
+        return f"""
         Analyze this user's confidence trends in their answers and provide insights for their learning journey.
         
-        User's Answer History:
-        {json.dumps(confidence_data, indent=2)}
+        Summary of the user's answer history (confidence is 0-100; slope is the change per answer;
+        acceptance_by_confidence is the share of answers accepted in each confidence band):
+        {json.dumps(confidence_summary, indent=2)}
         
         Please provide a JSON response with:
         1. Overall confidence trend analysis
@@ -304,52 +711,33 @@ class AIServiceManager:
             "growth_score": 7
         }}
         """
+    
+    def analyze_confidence_trend(self, confidence_summary, user=None, community=None):
+        """Explain a user's confidence trend from its numeric summary (see qa.confidence.describe_summary)"""
+        if not self.backend:
+            return None, None
+        
+        prompt = self._confidence_analysis_prompt(confidence_summary)
         
         try:
-            response = self.model.generate_content(prompt)
-            result = response.text
-            processing_time = time.time() - start_time
-            
-            # Clean the response to extract JSON
-            json_match = re.search(r'\{.*\}', result, re.DOTALL)
-            if json_match:
-                result = json_match.group()
-            
-            # Save AI service record
-            ai_service = AIService.objects.create(
-                service_type='confidence_analysis',
-                input_text=f"User answers: {len(user_answers)} answers analyzed",
-                output_text=result,
-                processing_time=processing_time,
-                tokens_used=len(result.split())  # Approximate token count
+            return self._generate(
+                'confidence_analysis', prompt,
+                input_text=f"User answers: {confidence_summary.get('answers', 0)} answers analyzed",
+                cache_inputs=[confidence_summary],
+                user=user,
+                community=community
             )
-            
-            return result, ai_service
-            
+        except APIException:
+            # Budget and circuit breaker errors reach the client as a 429 or 503
+            raise
         except Exception as e:
             print(f"AI confidence analysis failed: {e}")
             return None, None
     
-    def suggest_learning_path(self, user_profile, community_questions):
-        """Suggest personalized learning path based on user activity"""
-        if not self.model:
-            return None, None
-            
-        start_time = time.time()
-        
-        # Create user profile summary
-        user_summary = {
-            'questions_asked': user_profile.questions_asked,
-            'answers_given': user_profile.answers_given,
-            'confidence_avg': user_profile.average_confidence,
-            'mentor_status': user_profile.is_mentor,
-            'communities_joined': user_profile.communities_joined
-        }
-        
-        # Sample of community questions
-        question_topics = [q.title for q in community_questions[:20]]
-        
-        prompt = f"""
+    @staticmethod
+    def _learning_path_prompt(user_summary, question_topics):
+        """Prompt for a learning path"""
+        return f"""
         Suggest a personalized learning path for this user based on their activity and community questions.
         
         User Profile:
@@ -374,32 +762,274 @@ class AIServiceManager:
             "mentor_advice": "Personalized mentor guidance"
         }}
         """
+    
+    def suggest_learning_path(self, user_summary, question_topics, user=None, community=None):
+        """Suggest personalized learning path from an activity summary (see qa.learning_paths.learning_path_inputs)"""
+        if not self.backend:
+            return None, None
+        
+        prompt = self._learning_path_prompt(user_summary, question_topics)
         
         try:
-            response = self.model.generate_content(prompt)
-            result = response.text
-            processing_time = time.time() - start_time
-            
-            # Clean the response to extract JSON
-            json_match = re.search(r'\{.*\}', result, re.DOTALL)
-            if json_match:
-                result = json_match.group()
-            
-            # Save AI service record
-            ai_service = AIService.objects.create(
-                service_type='learning_path',
-                input_text=f"User profile analysis",
-                output_text=result,
-                processing_time=processing_time,
-                tokens_used=len(result.split())  # Approximate token count
+            return self._generate(
+                'learning_path', prompt,
+                input_text="User profile analysis",
+                cache_inputs=[user_summary, question_topics],
+                user=user,
+                community=community
             )
-            
-            return result, ai_service
-            
+        except APIException:
+            # Budget and circuit breaker errors reach the client as a 429 or 503
+            raise
         except Exception as e:
             print(f"AI learning path suggestion failed: {e}")
             return None, None
+    
+    async def aimprove_question(self, title, content, user=None, community=None, hedge=False):
+        """improve_question() for async views; always asks the model, as the user requested it"""
+        if not self.backend:
+            return None, None
+        
+        try:
+            return await self._agenerate(
+                'question_improvement', self._question_improvement_prompt(title, content),
+                input_text=f"Title: {title}\nContent: {content}",
+                cache_inputs=[title, content],
+                user=user,
+                community=community,
+                hedge=hedge
+            )
+        except APIException:
+            # Budget and circuit breaker errors reach the client as a 429 or 503
+            raise
+        except Exception as e:
+            print(f"AI question improvement failed: {e}")
+            return None, None
+    
+    async def aprovide_answer_feedback(self, answer_content, question_context="", user=None, community=None,
+                                       allow_local=False):
+        """provide_answer_feedback() for async views"""
+        if allow_local:
+            route = self.router.route_answer_feedback(answer_content, question_context)
+            if route.result is not None:
+                return json.dumps(route.result), None
+        
+        if not self.backend:
+            return None, None
+        
+        try:
+            return await self._agenerate(
+                'answer_feedback', self._answer_feedback_prompt(answer_content, question_context),
+                input_text=f"Question: {question_context}\nAnswer: {answer_content}",
+                cache_inputs=[question_context, answer_content],
+                user=user,
+                community=community
+            )
+        except APIException:
+            # Budget and circuit breaker errors reach the client as a 429 or 503
+            raise
+        except Exception as e:
+            print(f"AI answer feedback failed: {e}")
+            return None, None
+    
+    async def aimprove_answer(self, answer_content, question_context, user=None, community=None):
+        """improve_answer() for async views"""
+        if not self.backend:
+            return None, None
+        
+        try:
+            return await self._agenerate(
+                'answer_improvement', self._answer_improvement_prompt(answer_content, question_context),
+                input_text=f"Question: {question_context}\nAnswer: {answer_content}",
+                cache_inputs=[question_context, answer_content],
+                user=user,
+                community=community
+            )
+        except APIException:
+            # Budget and circuit breaker errors reach the client as a 429 or 503
+            raise
+        except Exception as e:
+            print(f"AI answer improvement failed: {e}")
+            return None, None
+    
+    async def aanalyze_confidence_trend(self, confidence_summary, user=None, community=None):
+        """analyze_confidence_trend() for async views"""
+        if not self.backend:
+            return None, None
+        
+        try:
+            return await self._agenerate(
+                'confidence_analysis', self._confidence_analysis_prompt(confidence_summary),
+                input_text=f"User answers: {confidence_summary.get('answers', 0)} answers analyzed",
+                cache_inputs=[confidence_summary],
+                user=user,
+                community=community
+            )
+        except APIException:
+            # Budget and circuit breaker errors reach the client as a 429 or 503
+            raise
+        except Exception as e:
+            print(f"AI confidence analysis failed: {e}")
+            return None, None
+    
+    async def asuggest_learning_path(self, user_summary, question_topics, user=None, community=None):
+        """suggest_learning_path() for async views"""
+        if not self.backend:
+            return None, None
+        
+        try:
+            return await self._agenerate(
+                'learning_path', self._learning_path_prompt(user_summary, question_topics),
+                input_text="User profile analysis",
+                cache_inputs=[user_summary, question_topics],
+                user=user,
+                community=community
+            )
+        except APIException:
+            # Budget and circuit breaker errors reach the client as a 429 or 503
+            raise
+        except Exception as e:
+            print(f"AI learning path suggestion failed: {e}")
+            return None, None
+    
+    def _get_executor(self):
+        """Bounded thread pool shared by all fan-out operations"""
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=settings.AI_ENRICH_MAX_WORKERS,
+                    thread_name_prefix='ai-enrich'
+                )
+            return self._executor
+    
+    def enrich_question(self, question, allow_local=False, index_wait=None):
+        """Run improvement, tag suggestion and similar-question lookup concurrently
+
+        The question's ai_status becomes 'completed' when every task completed
+        and 'partial' when only some did; it is left alone when none did. With
+        index_wait, the similar-question lookup waits up to that many seconds
+        for the community's first index build and is 'not_ready' after that.
+        """
+        # Tags come from the offline tag model and similar questions from the
+        # local index, so both still run without a model backend
+        tasks = {'tags': self.suggest_tags}
+        if self.backend:
+            tasks['improvement'] = functools.partial(self.improve_question, allow_local=allow_local)
+        
+        executor = self._get_executor()
+        start = time.monotonic()
+        futures = {
+            name: executor.submit(
+                _call_in_worker, fn, question.title, question.content,
+                user=question.author_id, community=question.community_id
+            )
+            for name, fn in tasks.items()
+        }
+        
+        # Tasks that miss their timeout are left to finish in the background;
+        # whatever completed in time is written to the question in one save
+        outcomes = {} if self.backend else {'improvement': 'unavailable'}
+        results = {}
+        deferred_error = None
+        
+        # Similar questions come from the local vector index while the model calls run
+        try:
+            similar = similarity_index.similar_to(
+                question, k=settings.SIMILARITY_TOP_K, wait=index_wait, require_ready=index_wait is not None
+            )
+            question.ai_similar_questions = [question_id for question_id, score in similar]
+            outcomes['similar'] = 'completed'
+        except IndexNotReady:
+            outcomes['similar'] = 'not_ready'
+        except Exception as e:
+            print(f"Similar question lookup failed: {e}")
+            outcomes['similar'] = 'failed'
+        
+        # Collect in timeout order; the tasks run concurrently so the total wait is the slowest one
+        for name in sorted(futures, key=lambda n: settings.AI_ENRICH_TIMEOUTS[n]):
+            remaining = start + settings.AI_ENRICH_TIMEOUTS[name] - time.monotonic()
+            try:
+                ai_result, ai_service = futures[name].result(timeout=max(remaining, 0))
+                results[name] = json.loads(ai_result) if ai_result else None
+                if results[name] is not None:
+                    outcomes[name] = 'completed'
+                else:
+                    outcomes[name] = 'failed' if self.backend else 'unavailable'
+            except FutureTimeoutError:
+                outcomes[name] = 'timeout'
+            except (AIBudgetExceeded, AIServiceUnavailable) as e:
+                outcomes[name] = 'throttled' if isinstance(e, AIBudgetExceeded) else 'unavailable'
+                deferred_error = deferred_error or e
+            except Exception as e:
+                print(f"AI question enrichment task {name} failed: {e}")
+                outcomes[name] = 'failed'
+        
+        update_fields = []
+        
+        improvement = results.get('improvement')
+        if isinstance(improvement, dict):
+            question.ai_improved_title = str(improvement.get('improved_title', ''))[:200]
+            question.ai_improved_content = improvement.get('improved_content', '')
+            question.ai_suggested_tags = improvement.get('suggested_tags', [])
+            update_fields += ['ai_improved_title', 'ai_improved_content', 'ai_suggested_tags']
+        
+        tags = results.get('tags')
+        if isinstance(tags, list):
+            # The dedicated tag suggestion wins over tags returned with the improvement
+            question.ai_suggested_tags = tags
+            if 'ai_suggested_tags' not in update_fields:
+                update_fields.append('ai_suggested_tags')
+        
+        if outcomes['similar'] == 'completed':
+            update_fields.append('ai_similar_questions')
+        
+        if update_fields:
+            completed = list(outcomes.values()).count('completed')
+            question.ai_status = 'completed' if completed == len(outcomes) else 'partial'
+            question.save(update_fields=update_fields + ['ai_status', 'updated_at'])
+        
+        # Partial results are kept, but the caller has to know the budget ran out or AI is down
+        if deferred_error is not None:
+            raise deferred_error
+        
+        return outcomes
+
+
+def _call_in_worker(fn, *args, **kwargs):
+    """Run fn on a pool thread and release that thread's database connection"""
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        connection.close()
+
+
+_manager_lock = threading.Lock()
+
+
+class LazyAIServiceManager(LazyObject):
+    """Creates the AIServiceManager on first use, so importing this module loads no model SDK"""
+    
+    def _setup(self):
+        # Double-checked so concurrent first requests build a single manager
+        with _manager_lock:
+            if self._wrapped is empty:
+                self._wrapped = AIServiceManager()
+
+
+def warm_up(background=True):
+    """Create the manager and pre-connect its backend, e.g. from a post-fork server hook"""
+    def _warm_up():
+        try:
+            if ai_manager.backend is not None:
+                ai_manager.backend.warm_up()
+        except Exception as e:
+            print(f"Warning: AI backend warm-up failed - {e}")
+    
+    if background:
+        threading.Thread(target=_warm_up, name='ai-warm-up', daemon=True).start()
+    else:
+        _warm_up()
 
 
-# Global AI service manager instance
-ai_manager = AIServiceManager() 
\ No newline at end of file
+# Global AI service manager instance, created on first use
+ai_manager = LazyAIServiceManager() 
\ No newline at end of file
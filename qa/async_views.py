@@ -0,0 +1,191 @@
+import json
+import math
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+from django.shortcuts import aget_object_or_404
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+from rest_framework.authentication import CSRFCheck
+from rest_framework.exceptions import APIException
+
+from .models import Question, Answer
+from .ai_services import ai_manager
+from .confidence import get_summary, describe_summary
+from .learning_paths import aget_learning_path
+from .draft_cache import draft_cache
+from . import ai_responses
+from .ai_responses import ai_user, draft_scope, decode_ai_result
+
+
+def _csrf_failure(request):
+    """Reason the request fails the CSRF check, or None; like DRF, only session-authenticated requests are checked"""
+    check = CSRFCheck(lambda request: None)
+    check.process_request(request)
+    return check.process_view(request, None, (), {})
+
+
+def _request_data(request):
+    """Body fields of a form or JSON object body; raises ValueError for other JSON"""
+    if request.content_type == 'application/json':
+        data = json.loads(request.body or b'{}')
+        if not isinstance(data, dict):
+            raise ValueError('JSON body is not an object')
+        return data
+    return request.POST
+
+
+# DRF viewsets are synchronous, so under ASGI they hold a thread for the whole
+# model call. These async views await the backend's async client instead and
+# keep the request and response bodies of the matching viewset actions.
+def async_ai_view(view):
+    """POST-only async view called as view(request, user, data, **kwargs)
+
+    Authenticates from the session, enforces CSRF like DRF's
+    SessionAuthentication and renders APIExceptions (budget 429s, circuit
+    breaker 503s) with their status and Retry-After header.
+    """
+    @csrf_exempt
+    @require_POST
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        user = await request.auser()
+        if user.is_authenticated:
+            reason = _csrf_failure(request)
+            if reason:
+                return JsonResponse({'detail': f"CSRF Failed: {reason}"}, status=403)
+        
+        try:
+            data = _request_data(request)
+        except ValueError:
+            return JsonResponse({'error': 'Request body must be a JSON object'}, status=400)
+        
+        try:
+            return await view(request, user, data, *args, **kwargs)
+        except APIException as e:
+            response = JsonResponse({'detail': e.detail}, status=e.status_code)
+            if getattr(e, 'wait', None):
+                response['Retry-After'] = str(math.ceil(e.wait))
+            return response
+    
+    return wrapper
+
+
+@async_ai_view
+async def improve_question(request, user, data, pk):
+    """Improve question using AI"""
+    question = await aget_object_or_404(Question, pk=pk)
+    
+    ai_result, ai_service = await ai_manager.aimprove_question(
+        question.title, question.content,
+        user=ai_user(user), community=question.community_id
+    )
+    
+    ai_data, error = decode_ai_result(ai_result, 'Failed to improve question with AI')
+    if error:
+        return JsonResponse(error, status=400)
+    
+    ai_responses.apply_question_improvement(question, ai_data)
+    await question.asave(update_fields=ai_responses.QUESTION_IMPROVEMENT_FIELDS)
+    return JsonResponse(ai_responses.question_improvement(question, ai_data))
+
+
+@async_ai_view
+async def improve_draft(request, user, data):
+    """Improve question draft using AI before creating"""
+    title = data.get('title', '')
+    content = data.get('content', '')
+    
+    if not title or not content:
+        return JsonResponse({
+            'error': 'Title and content are required'
+        }, status=400)
+    
+    # The cache backend may be a network service, so it is reached through a thread
+    scope = draft_scope(request, user)
+    near_duplicate = await sync_to_async(draft_cache.lookup)(scope, title, content)
+    if near_duplicate is not None:
+        improvement, served_from = near_duplicate
+        return JsonResponse(ai_responses.draft_response(improvement, served_from))
+    
+    ai_result, ai_service = await ai_manager.aimprove_question(
+        title, content,
+        user=ai_user(user), community=data.get('community') or None,
+        hedge=True  # The author is waiting on this one, so tail latency matters
+    )
+    
+    ai_data, error = decode_ai_result(ai_result, 'Failed to improve question draft with AI')
+    if error:
+        return JsonResponse(error, status=400)
+    
+    improvement = ai_responses.draft_improvement(ai_data)
+    await sync_to_async(draft_cache.store)(scope, title, content, improvement)
+    return JsonResponse(ai_responses.draft_response(improvement, 'model'))
+
+
+@async_ai_view
+async def answer_feedback(request, user, data, pk):
+    """Get AI feedback on an answer"""
+    answer = await aget_object_or_404(Answer.objects.select_related('question'), pk=pk)
+    
+    ai_result, ai_service = await ai_manager.aprovide_answer_feedback(
+        answer.content, answer.question.title,
+        user=ai_user(user), community=answer.question.community_id
+    )
+    
+    ai_data, error = decode_ai_result(ai_result, 'Failed to get AI feedback')
+    if error:
+        return JsonResponse(error, status=400)
+    
+    return JsonResponse(ai_responses.answer_feedback(ai_data))
+
+
+@async_ai_view
+async def improve_answer(request, user, data, pk):
+    """Improve answer using AI"""
+    answer = await aget_object_or_404(Answer.objects.select_related('question'), pk=pk)
+    
+    ai_result, ai_service = await ai_manager.aimprove_answer(
+        answer.content, answer.question.title,
+        user=ai_user(user), community=answer.question.community_id
+    )
+    
+    if ai_result:
+        # Votes cast during the AI call must not be overwritten by this instance's stale counters
+        answer.ai_improved_content = ai_result
+        await answer.asave(update_fields=['ai_improved_content', 'updated_at'])
+        
+        return JsonResponse(ai_responses.answer_improvement(ai_result))
+    
+    return JsonResponse({
+        'error': 'Failed to improve answer with AI'
+    }, status=400)
+
+
+@async_ai_view
+async def analyze_confidence_trend(request, user, data):
+    """Analyze user's confidence trends using AI"""
+    # Numbers come from the stored summary; the AI only writes the narrative
+    trend = await sync_to_async(lambda: describe_summary(get_summary(user)))()
+    
+    ai_result, ai_service = await ai_manager.aanalyze_confidence_trend(trend, user=ai_user(user))
+    
+    ai_data, error = decode_ai_result(ai_result, 'Failed to analyze confidence trends')
+    if error:
+        return JsonResponse(error, status=400)
+    
+    return JsonResponse(ai_responses.confidence_trend(ai_data, trend))
+
+
+@async_ai_view
+async def suggest_learning_path(request, user, data):
+    """Get AI-suggested learning path (cached; stale paths are refreshed in the background)"""
+    entry, stale = await aget_learning_path(user)
+    
+    if entry is not None:
+        return JsonResponse(ai_responses.learning_path(entry, stale))
+    
+    return JsonResponse({
+        'error': 'Failed to generate learning path'
+    }, status=400)
@@ -0,0 +1,172 @@
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+
+from .models import Answer, ConfidenceSummary
+
+
+# Upper bounds (exclusive, except the last) of the confidence bands used for calibration
+CONFIDENCE_BANDS = [25, 50, 75, 101]
+
+
+def confidence_band(confidence):
+    for i, bound in enumerate(CONFIDENCE_BANDS):
+        if confidence < bound:
+            return i
+    return len(CONFIDENCE_BANDS) - 1
+
+
+def _empty_bands():
+    return [[0, 0] for _ in CONFIDENCE_BANDS]
+
+
+def _locked_summary(user_id):
+    summary, _ = ConfidenceSummary.objects.get_or_create(user_id=user_id)
+    return ConfidenceSummary.objects.select_for_update().get(pk=summary.pk)
+
+
+def record_answer(answer):
+    """Fold a new answer into its author's summary in O(1)"""
+    confidence = answer.confidence_level
+    alpha = settings.CONFIDENCE_EWMA_ALPHA
+    
+    with transaction.atomic():
+        summary = _locked_summary(answer.author_id)
+        index = summary.answer_count
+        summary.answer_count += 1
+        summary.confidence_sum += confidence
+        summary.confidence_sq_sum += confidence ** 2
+        summary.indexed_confidence_sum += index * confidence
+        summary.ewma = confidence if summary.ewma is None else alpha * confidence + (1 - alpha) * summary.ewma
+        summary.recent_confidences = (summary.recent_confidences + [confidence])[-settings.CONFIDENCE_RECENT_WINDOW:]
+        
+        bands = summary.calibration_bands or _empty_bands()
+        bands[confidence_band(confidence)][0] += 1
+        # Every answer starts unaccepted: its Brier term is (p - 0)^2
+        summary.brier_sum += (confidence / 100) ** 2
+        if answer.is_accepted:
+            _accept(summary, bands, confidence)
+        summary.calibration_bands = bands
+        
+        summary.first_answer_at = summary.first_answer_at or answer.created_at
+        summary.last_answer_at = answer.created_at
+        summary.save()
+
+
+def _accept(summary, bands, confidence):
+    summary.accepted_count += 1
+    summary.accepted_confidence_sum += confidence
+    bands[confidence_band(confidence)][1] += 1
+    # The Brier term changes from (p - 0)^2 to (p - 1)^2
+    summary.brier_sum += 1 - 2 * confidence / 100
+
+
+def record_acceptance(answer):
+    """Count an existing answer as accepted in its author's summary"""
+    with transaction.atomic():
+        summary = _locked_summary(answer.author_id)
+        bands = summary.calibration_bands or _empty_bands()
+        _accept(summary, bands, answer.confidence_level)
+        summary.calibration_bands = bands
+        summary.save()
+
+
+def rebuild_summary(user_id):
+    """Recompute a user's summary from all their answers with one query (after edits or deletes)"""
+    answers = Answer.objects.filter(author_id=user_id)
+    if not answers.exists():
+        ConfidenceSummary.objects.filter(user_id=user_id).delete()
+        return None
+    
+    with transaction.atomic():
+        # Read under the summary lock so an answer recorded concurrently is not lost
+        summary = _locked_summary(user_id)
+        rows = list(answers.order_by('created_at', 'id').values_list('confidence_level', 'is_accepted', 'created_at'))
+        if not rows:
+            summary.delete()
+            return None
+        
+        confidence_levels, accepted_flags, created = zip(*rows)
+        confidences = np.asarray(confidence_levels, dtype=np.float64)
+        accepted = np.asarray(accepted_flags, dtype=bool)
+        n = len(confidences)
+        alpha = settings.CONFIDENCE_EWMA_ALPHA
+        
+        # The EWMA seeded with the first value, as a weighted sum
+        weights = alpha * (1 - alpha) ** np.arange(n - 1, -1, -1, dtype=np.float64)
+        weights[0] = (1 - alpha) ** (n - 1)
+        
+        bands = np.clip(np.searchsorted(CONFIDENCE_BANDS, confidences, side='right'), 0, len(CONFIDENCE_BANDS) - 1)
+        band_answers = np.bincount(bands, minlength=len(CONFIDENCE_BANDS))
+        band_accepted = np.bincount(bands, weights=accepted, minlength=len(CONFIDENCE_BANDS))
+        
+        summary.answer_count = n
+        summary.confidence_sum = float(confidences.sum())
+        summary.confidence_sq_sum = float(np.dot(confidences, confidences))
+        summary.indexed_confidence_sum = float(np.dot(np.arange(n), confidences))
+        summary.ewma = float(np.dot(weights, confidences))
+        summary.recent_confidences = [int(c) for c in confidences[-settings.CONFIDENCE_RECENT_WINDOW:]]
+        summary.accepted_count = int(accepted.sum())
+        summary.accepted_confidence_sum = float(confidences[accepted].sum())
+        summary.brier_sum = float(((confidences / 100 - accepted) ** 2).sum())
+        summary.calibration_bands = [[int(a), int(b)] for a, b in zip(band_answers, band_accepted)]
+        summary.first_answer_at = created[0]
+        summary.last_answer_at = created[-1]
+        summary.save()
+    return summary
+
+
+def get_summary(user):
+    """The user's stored summary, built from their answers the first time it is needed"""
+    summary = ConfidenceSummary.objects.filter(user=user).first()
+    return summary if summary is not None else rebuild_summary(user.pk)
+
+
+def describe_summary(summary):
+    """Compact, rounded trend figures; this is all the AI sees of a user's answer history"""
+    if summary is None or not summary.answer_count:
+        return {'answers': 0}
+    
+    n = summary.answer_count
+    mean = summary.confidence_sum / n
+    variance = max(summary.confidence_sq_sum / n - mean ** 2, 0)
+    
+    # Least-squares slope of confidence over answer index, with x = 0..n-1 in closed form
+    sum_x = n * (n - 1) / 2
+    sum_xx = (n - 1) * n * (2 * n - 1) / 6
+    denominator = n * sum_xx - sum_x ** 2
+    slope = (n * summary.indexed_confidence_sum - sum_x * summary.confidence_sum) / denominator if denominator else 0
+    
+    recent = summary.recent_confidences
+    short_window = recent[-5:]
+    unaccepted = n - summary.accepted_count
+    bands = summary.calibration_bands or _empty_bands()
+    lower = 0
+    
+    description = {
+        'answers': n,
+        'mean_confidence': round(mean, 1),
+        'std_confidence': round(variance ** 0.5, 1),
+        'slope_per_answer': round(slope, 2),
+        'ewma': round(summary.ewma, 1),
+        'moving_average_5': round(sum(short_window) / len(short_window), 1),
+        'moving_average_recent': round(sum(recent) / len(recent), 1),  # last CONFIDENCE_RECENT_WINDOW answers
+        'accepted_answers': summary.accepted_count,
+        'mean_confidence_accepted': (
+            round(summary.accepted_confidence_sum / summary.accepted_count, 1) if summary.accepted_count else None
+        ),
+        'mean_confidence_not_accepted': (
+            round((summary.confidence_sum - summary.accepted_confidence_sum) / unaccepted, 1) if unaccepted else None
+        ),
+        'brier_score': round(summary.brier_sum / n, 3),
+        'acceptance_by_confidence': {},
+        'first_answer': summary.first_answer_at.strftime('%Y-%m-%d') if summary.first_answer_at else None,
+        'last_answer': summary.last_answer_at.strftime('%Y-%m-%d') if summary.last_answer_at else None,
+    }
+    for bound, (answers, accepted) in zip(CONFIDENCE_BANDS, bands):
+        upper = min(bound, 100)
+        description['acceptance_by_confidence'][f'{lower}-{upper}'] = (
+            round(accepted / answers, 2) if answers else None
+        )
+        lower = bound
+    return description
@@ -0,0 +1,143 @@
+import difflib
+import hashlib
+import re
+import threading
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+
+
+_WORD_RE = re.compile(r'\w+')
+_BITS = np.arange(64, dtype=np.uint64)
+# Tokens (words and the whitespace between them) on each side of an edit used to locate it
+_CONTEXT_TOKENS = 4
+
+
+def normalize_draft(text):
+    """Lowercased words only, so whitespace, case and punctuation edits do not count"""
+    return _WORD_RE.findall(text.lower())
+
+
+def simhash(words):
+    """64-bit SimHash of a draft's words and word pairs; similar drafts differ in few bits"""
+    features = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+    if not features:
+        return 0
+    
+    digests = b''.join(hashlib.blake2b(feature.encode('utf-8'), digest_size=8).digest() for feature in features)
+    hashes = np.frombuffer(digests, dtype='>u8').astype(np.uint64)
+    bits = (hashes[:, None] >> _BITS) & np.uint64(1)
+    # Each feature votes +1 or -1 on every bit; the sign of the total is the fingerprint bit
+    votes = 2 * bits.sum(axis=0, dtype=np.int64) - len(features)
+    return int(((votes > 0).astype(np.uint64) << _BITS).sum())
+
+
+def hamming_distance(a, b):
+    return bin(a ^ b).count('1')
+
+
+def _tokens(text):
+    return re.split(r'(\s+)', text)
+
+
+def merge_edits(base, edited, improved):
+    """Apply the edits between two drafts to the improved version of the first one
+
+    Each changed span is located in the improved text by the unchanged words
+    around it; returns None when any edit cannot be placed unambiguously.
+    """
+    base_tokens, edited_tokens = _tokens(base), _tokens(edited)
+    merged = improved
+    matcher = difflib.SequenceMatcher(None, base_tokens, edited_tokens, autojunk=False)
+    
+    # Changes closer together than their context are merged so no anchor overlaps another change
+    regions = []
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == 'equal':
+            continue
+        if regions and i1 - regions[-1][1] < 2 * _CONTEXT_TOKENS:
+            regions[-1] = (regions[-1][0], i2, regions[-1][2], j2)
+        else:
+            regions.append((i1, i2, j1, j2))
+    
+    # Right to left, so earlier anchors are not disturbed by later replacements
+    for i1, i2, j1, j2 in reversed(regions):
+        before = ''.join(base_tokens[max(0, i1 - _CONTEXT_TOKENS):i1])
+        after = ''.join(base_tokens[i2:i2 + _CONTEXT_TOKENS])
+        anchor = before + ''.join(base_tokens[i1:i2]) + after
+        if not anchor.strip() or merged.count(anchor) != 1:
+            return None
+        merged = merged.replace(anchor, before + ''.join(edited_tokens[j1:j2]) + after)
+    
+    return merged
+
+
+class DraftCache:
+    """Recently improved drafts per session, matched by SimHash to skip model calls for small edits"""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {'hits': 0, 'merged': 0, 'misses': 0}
+    
+    @staticmethod
+    def _key(scope):
+        return f"qa:improved_drafts:{scope}"
+    
+    def _count(self, counter):
+        with self._lock:
+            self._counters[counter] += 1
+    
+    def lookup(self, scope, title, content):
+        """(improvement, served_from) for a near-duplicate of a recent draft, or None"""
+        if scope is None:
+            return None
+        
+        fingerprint = simhash(normalize_draft(f"{title}\n{content}"))
+        title_words = normalize_draft(title)
+        best = None
+        for entry in cache.get(self._key(scope), []):
+            # Only content edits are merged; an improved title is never reused for a different title
+            if normalize_draft(entry['title']) != title_words:
+                continue
+            distance = hamming_distance(fingerprint, entry['simhash'])
+            if distance <= settings.AI_DRAFT_SIMHASH_DISTANCE and (best is None or distance < best[0]):
+                best = (distance, entry)
+        
+        if best is None:
+            self._count('misses')
+            return None
+        
+        entry = best[1]
+        improvement = dict(entry['improvement'])
+        if content != entry['content']:
+            merged = merge_edits(entry['content'], content, improvement.get('improved_content', ''))
+            if merged is not None:
+                improvement['improved_content'] = merged
+                self._count('merged')
+                return improvement, 'near_duplicate_merged'
+        
+        self._count('hits')
+        return improvement, 'near_duplicate'
+    
+    def store(self, scope, title, content, improvement):
+        """Remember an improved draft for this session"""
+        if scope is None:
+            return
+        
+        entry = {
+            'simhash': simhash(normalize_draft(f"{title}\n{content}")),
+            'title': title,
+            'content': content,
+            'improvement': improvement,
+        }
+        entries = [entry] + cache.get(self._key(scope), [])
+        cache.set(self._key(scope), entries[:settings.AI_DRAFT_CACHE_ENTRIES], settings.AI_DRAFT_CACHE_TTL)
+    
+    def stats(self):
+        with self._lock:
+            return dict(self._counters)
+
+
+# Global draft cache instance
+draft_cache = DraftCache()
@@ -0,0 +1,224 @@
+import asyncio
+import itertools
+import json
+import math
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from .ai_budget import estimate_tokens
+
+
+_decoder = json.JSONDecoder()
+
+
+class FakeLLMError(Exception):
+    """Injected upstream failure; `code` makes it look like a transient HTTP 503"""
+    
+    code = 503
+
+
+def response_template(prompt):
+    """Last top-level JSON value in a prompt, i.e. the output format the prompt asks for"""
+    template = None
+    pos = 0
+    while pos < len(prompt):
+        if prompt[pos] in '{[':
+            try:
+                value, end = _decoder.raw_decode(prompt, pos)
+            except ValueError:
+                pos += 1
+                continue
+            template = value
+            pos = end
+        else:
+            pos += 1
+    return template
+
+
+class FakeLLM:
+    """Deterministic stand-in for a model: echoes the prompt's JSON format after a sampled delay"""
+    
+    def __init__(self, latency=None, error_rate=0.0, seed=0):
+        self.latency = latency or {'distribution': 'fixed', 'seconds': 0}
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.requests = 0
+    
+    def sample_latency(self, rng):
+        latency = self.latency
+        distribution = latency['distribution']
+        if distribution == 'fixed':
+            return latency['seconds']
+        if distribution == 'uniform':
+            return rng.uniform(latency['low'], latency['high'])
+        if distribution == 'lognormal':
+            # Parameterized by the median so settings read in seconds
+            return rng.lognormvariate(math.log(latency['median']), latency['sigma'])
+        raise ValueError(f"Unknown latency distribution: {distribution}")
+    
+    def plan(self):
+        """Latency and failure decision for the next request, drawn from the seeded generator"""
+        with self._lock:
+            self.requests += 1
+            return self.sample_latency(self._random), self._random.random() < self.error_rate
+    
+    @staticmethod
+    def render(prompt):
+        template = response_template(prompt)
+        if template is None:
+            # Free-text prompts (such as answer improvement) get a fixed reply
+            return "This is a placeholder response from the fake LLM backend."
+        return json.dumps(template)
+    
+    def complete(self, prompt, timeout=None):
+        """Return (text, prompt_tokens, completion_tokens), sleeping and failing as configured"""
+        delay, fail = self.plan()
+        if timeout is not None and delay > timeout:
+            time.sleep(timeout)
+            raise TimeoutError('Fake LLM request timed out')
+        time.sleep(delay)
+        if fail:
+            raise FakeLLMError('Injected fake LLM failure')
+        
+        text = self.render(prompt)
+        return text, estimate_tokens(prompt), estimate_tokens(text)
+    
+    async def acomplete(self, prompt, timeout=None):
+        """complete() for async callers; waiting does not block the event loop"""
+        delay, fail = self.plan()
+        if timeout is not None and delay > timeout:
+            await asyncio.sleep(timeout)
+            raise TimeoutError('Fake LLM request timed out')
+        await asyncio.sleep(delay)
+        if fail:
+            raise FakeLLMError('Injected fake LLM failure')
+        
+        text = self.render(prompt)
+        return text, estimate_tokens(prompt), estimate_tokens(text)
+    
+    def stream(self, prompt, timeout=None, chunks=20):
+        """Yield (text, prompt_tokens, completion_tokens) deltas; the sampled delay is spread over the chunks
+
+        A fifth of the delay passes before the first chunk, like a model's time to first token.
+        Token counts come with the last, empty delta.
+        """
+        delay, fail = self.plan()
+        if timeout is not None and delay > timeout:
+            time.sleep(timeout)
+            raise TimeoutError('Fake LLM request timed out')
+        time.sleep(delay * 0.2)
+        if fail:
+            raise FakeLLMError('Injected fake LLM failure')
+        
+        text = self.render(prompt)
+        size = max(1, math.ceil(len(text) / chunks))
+        for start in range(0, len(text), size):
+            if start:
+                time.sleep(delay * 0.8 / chunks)
+            yield text[start:start + size], None, None
+        yield '', estimate_tokens(prompt), estimate_tokens(text)
+
+
+class FakeLLMRequestHandler(BaseHTTPRequestHandler):
+    """Minimal OpenAI-compatible /v1/chat/completions endpoint backed by a FakeLLM"""
+    
+    fake = None
+    protocol_version = 'HTTP/1.1'
+    
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def do_POST(self):
+        if self.path.rstrip('/') != '/v1/chat/completions':
+            self._send_json(404, {'error': {'message': 'Not found', 'type': 'invalid_request_error'}})
+            return
+        
+        length = int(self.headers.get('Content-Length') or 0)
+        try:
+            request = json.loads(self.rfile.read(length) or b'{}')
+            prompt = '\n'.join(str(message.get('content', '')) for message in request.get('messages', []))
+        except (ValueError, AttributeError):
+            self._send_json(400, {'error': {'message': 'Invalid JSON body', 'type': 'invalid_request_error'}})
+            return
+        
+        if request.get('stream'):
+            self._stream(request, prompt)
+            return
+        
+        try:
+            text, prompt_tokens, completion_tokens = self.fake.complete(prompt)
+        except FakeLLMError as e:
+            self._send_json(503, {'error': {'message': str(e), 'type': 'server_error'}})
+            return
+        
+        self._send_json(200, {
+            'id': f"chatcmpl-{uuid.uuid4().hex}",
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': request.get('model', 'fake-llm'),
+            'choices': [{
+                'index': 0,
+                'message': {'role': 'assistant', 'content': text},
+                'finish_reason': 'stop',
+            }],
+            'usage': {
+                'prompt_tokens': prompt_tokens,
+                'completion_tokens': completion_tokens,
+                'total_tokens': prompt_tokens + completion_tokens,
+            },
+        })
+    
+    def _stream(self, request, prompt):
+        """Answer with chat.completion.chunk Server-Sent Events, as the OpenAI API does for stream=true"""
+        deltas = self.fake.stream(prompt)
+        try:
+            first = next(deltas)
+        except FakeLLMError as e:
+            self._send_json(503, {'error': {'message': str(e), 'type': 'server_error'}})
+            return
+        
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        self.close_connection = True
+        
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        for text, prompt_tokens, completion_tokens in itertools.chain([first], deltas):
+            chunk = {
+                'id': completion_id,
+                'object': 'chat.completion.chunk',
+                'created': int(time.time()),
+                'model': request.get('model', 'fake-llm'),
+                'choices': [{'index': 0, 'delta': {'content': text}, 'finish_reason': None}] if text else [],
+            }
+            if prompt_tokens is not None:
+                chunk['usage'] = {
+                    'prompt_tokens': prompt_tokens,
+                    'completion_tokens': completion_tokens,
+                    'total_tokens': prompt_tokens + completion_tokens,
+                }
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode('utf-8'))
+            self.wfile.flush()
+        self.wfile.write(b'data: [DONE]\n\n')
+    
+    def log_message(self, format, *args):
+        # One line per request would drown out load test output
+        pass
+
+
+def make_fake_llm_server(host, port, fake):
+    """Threaded HTTP server answering chat completions with the given FakeLLM"""
+    handler = type('BoundFakeLLMRequestHandler', (FakeLLMRequestHandler,), {'fake': fake})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
@@ -0,0 +1,129 @@
+import hashlib
+import json
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils import timezone
+
+from .models import Question, ConfidenceSummary, LearningPathCache
+
+
+def _community_questions(user):
+    return Question.objects.filter(community__members=user).order_by('-created_at')
+
+
+def learning_path_fingerprint(user):
+    """Hash of everything a learning path depends on that is cheap to read"""
+    latest_question_id = _community_questions(user).values_list('id', flat=True).first()
+    confidence = ConfidenceSummary.objects.filter(user=user).values_list('answer_count', 'accepted_count').first()
+    parts = [
+        user.questions_asked, user.answers_given, user.total_points, user.is_mentor,
+        user.communities.count(), confidence, str(latest_question_id),
+    ]
+    return hashlib.sha256(json.dumps(parts, default=str).encode('utf-8')).hexdigest()
+
+
+def learning_path_inputs(user):
+    """Activity summary and community question titles sent to the AI"""
+    summary = ConfidenceSummary.objects.filter(user=user).first()
+    user_summary = {
+        'questions_asked': user.questions_asked,
+        'answers_given': user.answers_given,
+        'confidence_avg': round(summary.confidence_sum / summary.answer_count, 1) if summary and summary.answer_count else None,
+        'mentor_status': user.is_mentor,
+        'communities_joined': user.communities.count(),
+    }
+    question_topics = list(_community_questions(user).values_list('title', flat=True)[:20])
+    return user_summary, question_topics
+
+
+def _store_learning_path(user, fingerprint, ai_result):
+    entry, _ = LearningPathCache.objects.update_or_create(
+        user=user,
+        defaults={
+            'fingerprint': fingerprint,
+            'content': json.loads(ai_result),
+            'is_stale': False,
+            'generated_at': timezone.now(),
+        }
+    )
+    return entry
+
+
+def refresh_learning_path(user):
+    """Generate a learning path with the AI and store it; returns the cache entry or None"""
+    from .ai_services import ai_manager
+    
+    # Taken before the call, so activity during generation still marks the result outdated
+    fingerprint = learning_path_fingerprint(user)
+    user_summary, question_topics = learning_path_inputs(user)
+    
+    ai_result, ai_service = ai_manager.suggest_learning_path(user_summary, question_topics, user=user)
+    if not ai_result:
+        return None
+    
+    return _store_learning_path(user, fingerprint, ai_result)
+
+
+async def arefresh_learning_path(user):
+    """refresh_learning_path() for async views; only the database work runs on a thread"""
+    from .ai_services import ai_manager
+    
+    fingerprint, (user_summary, question_topics) = await sync_to_async(
+        lambda: (learning_path_fingerprint(user), learning_path_inputs(user))
+    )()
+    
+    ai_result, ai_service = await ai_manager.asuggest_learning_path(user_summary, question_topics, user=user)
+    if not ai_result:
+        return None
+    
+    return await sync_to_async(_store_learning_path)(user, fingerprint, ai_result)
+
+
+def _is_current(entry, user):
+    if entry.is_stale or entry.generated_at < timezone.now() - timedelta(seconds=settings.LEARNING_PATH_MAX_AGE):
+        return False
+    return entry.fingerprint == learning_path_fingerprint(user)
+
+
+def _cached_learning_path(user):
+    """Stored path and whether it is stale (queueing a refresh if so); the path is None on a miss"""
+    from .ai_jobs import enqueue_job
+    
+    entry = LearningPathCache.objects.filter(user=user).first()
+    if entry is None or _is_current(entry, user):
+        return entry, False
+    
+    enqueue_job('learning_path', user=user)
+    return entry, True
+
+
+def get_learning_path(user):
+    """Cached learning path for a user and whether it is stale
+
+    A stale path is returned immediately and a background refresh is queued;
+    only a user without any stored path waits for the AI.
+    """
+    entry, stale = _cached_learning_path(user)
+    if entry is None:
+        return refresh_learning_path(user), False
+    return entry, stale
+
+
+async def aget_learning_path(user):
+    """get_learning_path() for async views"""
+    entry, stale = await sync_to_async(_cached_learning_path)(user)
+    if entry is None:
+        return await arefresh_learning_path(user), False
+    return entry, stale
+
+
+def invalidate_learning_paths(user_ids=None, community_id=None):
+    """Mark learning paths stale for some users or for every member of a community"""
+    entries = LearningPathCache.objects.filter(is_stale=False)
+    if user_ids is not None:
+        entries = entries.filter(user_id__in=user_ids)
+    if community_id is not None:
+        entries = entries.filter(user__communities=community_id)
+    return entries.update(is_stale=True)
@@ -0,0 +1,39 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from qa.ai_archive import archive_ai_history, archive_extension
+
+
+class Command(BaseCommand):
+    help = 'Move old AIService records into compressed monthly NDJSON archives'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=settings.AI_ARCHIVE_RETENTION_DAYS,
+            help='Archive records older than this many days'
+        )
+        parser.add_argument(
+            '--dedupe', action='store_true',
+            help='Store identical outputs once, referenced by content hash'
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=settings.AI_ARCHIVE_CHUNK_SIZE,
+            help='Records written and deleted per batch'
+        )
+        parser.add_argument('--output', default=None, help='Archive directory (default: AI_ARCHIVE_DIR)')
+    
+    def handle(self, *args, **options):
+        archive_dir = options['output'] or settings.AI_ARCHIVE_DIR
+        self.stdout.write(
+            f"Archiving AI records older than {options['days']} days to {archive_dir} "
+            f"(*.ndjson{archive_extension()})"
+        )
+        
+        archived = archive_ai_history(
+            days=options['days'],
+            dedupe=options['dedupe'],
+            chunk_size=options['chunk_size'],
+            archive_dir=archive_dir
+        )
+        
+        self.stdout.write(self.style.SUCCESS(f"Archived {archived} AI record(s)"))
@@ -0,0 +1,24 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from qa.ai_rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = 'Rebuild hourly and daily AI usage rollups from AIService records'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=0,
+            help='Only rebuild the last N days (default: all history)'
+        )
+    
+    def handle(self, *args, **options):
+        since = timezone.now() - timedelta(days=options['days']) if options['days'] else None
+        self.stdout.write(f"Rebuilding AI usage rollups {'since ' + since.date().isoformat() if since else 'for all history'}")
+        
+        buckets = rebuild_rollups(since=since)
+        
+        self.stdout.write(self.style.SUCCESS(f"Wrote {buckets} rollup bucket(s)"))
@@ -0,0 +1,89 @@
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+from qa.ai_backends import BACKENDS, get_backend
+from qa.ai_services import AIServiceManager, _call_in_worker
+
+
+OPERATIONS = {
+    'improve_question': lambda manager, key, text: manager.improve_question(f"Question {key}", text),
+    'answer_feedback': lambda manager, key, text: manager.provide_answer_feedback(text, f"Question {key}"),
+    'improve_answer': lambda manager, key, text: manager.improve_answer(text, f"Question {key}"),
+    'suggest_tags': lambda manager, key, text: manager.suggest_tags(f"Question {key}", text),
+}
+
+# Long enough that qa.ai_routing sends it to the model rather than answering locally
+BENCHMARK_TEXT = (
+    "Benchmark input {key} about lists, loops and dictionaries. I build a dictionary from a list inside a "
+    "loop, but some keys end up missing and others are overwritten, and I cannot tell which iteration "
+    "causes it or how to debug it step by step"
+)
+
+
+class Command(BaseCommand):
+    help = 'Measure latency and throughput of concurrent AI calls against a backend'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--backend', choices=sorted(BACKENDS), default='fake')
+        parser.add_argument('--operation', choices=sorted(OPERATIONS), default='improve_question')
+        parser.add_argument('--requests', type=int, default=200)
+        parser.add_argument('--concurrency', type=int, default=16)
+        parser.add_argument(
+            '--duplicates', action='store_true',
+            help='Send identical inputs to exercise the cache and single-flight layers'
+        )
+    
+    def _timed_call(self, manager, operation, key, text):
+        start = time.perf_counter()
+        try:
+            result, _ = operation(manager, key, text)
+            outcome = 'ok' if result else 'empty'
+        except Exception as e:
+            outcome = type(e).__name__
+        return time.perf_counter() - start, outcome
+    
+    def handle(self, *args, **options):
+        try:
+            manager = AIServiceManager(backend=get_backend(options['backend']))
+        except Exception as e:
+            raise CommandError(f"Backend '{options['backend']}' could not be created: {e}")
+        
+        operation = OPERATIONS[options['operation']]
+        # A unique run id keeps earlier runs from answering from the cache
+        run_id = time.time_ns()
+        
+        def key_for(i):
+            return f"{run_id}-{0 if options['duplicates'] else i}"
+        
+        self.stdout.write(
+            f"{options['requests']} x {options['operation']} on '{options['backend']}' "
+            f"({manager.model_name}) with concurrency {options['concurrency']}"
+        )
+        
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as executor:
+            futures = [
+                executor.submit(
+                    _call_in_worker, self._timed_call, manager, operation, key_for(i),
+                    BENCHMARK_TEXT.format(key=key_for(i))
+                )
+                for i in range(options['requests'])
+            ]
+            results = [future.result() for future in futures]
+        elapsed = time.perf_counter() - started
+        
+        latencies = np.array([latency for latency, _ in results]) * 1000
+        outcomes = Counter(outcome for _, outcome in results)
+        p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+        
+        self.stdout.write(f"Wall time:   {elapsed:.2f}s ({len(results) / elapsed:.1f} req/s)")
+        self.stdout.write(
+            f"Latency ms:  p50 {p50:.0f}  p95 {p95:.0f}  p99 {p99:.0f}  max {latencies.max():.0f}"
+        )
+        self.stdout.write(f"Outcomes:    {dict(outcomes)}")
+        self.stdout.write(f"Upstream:    {manager.single_flight.stats()}")
+        self.stdout.write(f"Resilience:  {manager.resilience.stats()}")
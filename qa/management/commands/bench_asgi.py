@@ -0,0 +1,113 @@
+import asyncio
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from django.core.management.base import BaseCommand
+from django.test import AsyncClient, Client
+
+from qa.ai_backends import FakeBackend
+from qa.ai_services import AIServiceManager, ai_manager, _call_in_worker
+from qa.fake_llm import FakeLLM
+from .bench_ai import BENCHMARK_TEXT
+
+
+ENDPOINTS = {
+    'wsgi': '/api/questions/improve_draft_with_ai/',
+    'asgi': '/api/async/questions/improve_draft_with_ai/',
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare how many concurrent AI requests one ASGI worker (async views) sustains '
+        'against one threaded WSGI worker (DRF views), using the fake backend'
+    )
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=400)
+        parser.add_argument('--concurrency', type=int, default=100, help='Clients sending requests at once')
+        parser.add_argument('--threads', type=int, default=8, help='Request threads of the WSGI worker')
+        parser.add_argument('--latency', type=float, default=0.5, help='Seconds the fake model takes per call')
+        parser.add_argument('--server', choices=['wsgi', 'asgi', 'both'], default='both')
+    
+    def _payload(self, run_id, i):
+        # Unique drafts, so every request reaches the model rather than a cache
+        key = f"{run_id}-{i}"
+        return {'title': f"Question {key}", 'content': BENCHMARK_TEXT.format(key=key)}
+    
+    def _run_wsgi(self, options, run_id):
+        """Closed-loop clients against the WSGI handler; a semaphore stands in for the worker's thread pool"""
+        worker_threads = threading.BoundedSemaphore(options['threads'])
+        client = Client()
+        
+        def send(i):
+            start = time.perf_counter()
+            with worker_threads:
+                response = client.post(ENDPOINTS['wsgi'], self._payload(run_id, i), content_type='application/json')
+            return time.perf_counter() - start, response.status_code
+        
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as executor:
+            futures = [executor.submit(_call_in_worker, send, i) for i in range(options['requests'])]
+            return [future.result() for future in futures]
+    
+    def _run_asgi(self, options, run_id):
+        """The same clients as coroutines against the ASGI handler on a single event loop"""
+        client = AsyncClient()
+        
+        async def run():
+            slots = asyncio.Semaphore(options['concurrency'])
+            
+            async def send(i):
+                async with slots:
+                    start = time.perf_counter()
+                    response = await client.post(
+                        ENDPOINTS['asgi'], self._payload(run_id, i), content_type='application/json'
+                    )
+                    return time.perf_counter() - start, response.status_code
+            
+            return await asyncio.gather(*(send(i) for i in range(options['requests'])))
+        
+        return asyncio.run(run())
+    
+    def _report(self, label, results, elapsed, latency):
+        latencies = np.array([seconds for seconds, _ in results]) * 1000
+        statuses = Counter(status for _, status in results)
+        throughput = len(results) / elapsed
+        p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+        
+        self.stdout.write(label)
+        self.stdout.write(f"  Wall time:    {elapsed:.2f}s ({throughput:.1f} req/s)")
+        self.stdout.write(f"  Latency ms:   p50 {p50:.0f}  p95 {p95:.0f}  p99 {p99:.0f}  max {latencies.max():.0f}")
+        self.stdout.write(f"  Statuses:     {dict(statuses)}")
+        # Little's law: requests in flight = throughput x time each spends at the model
+        self.stdout.write(f"  Sustained:    ~{throughput * latency:.0f} concurrent model calls")
+    
+    def handle(self, *args, **options):
+        # Both servers share the global manager the views use, backed by a fixed-latency fake model
+        ai_manager._wrapped = AIServiceManager(backend=FakeBackend(
+            fake=FakeLLM(latency={'distribution': 'fixed', 'seconds': options['latency']})
+        ))
+        run_id = time.time_ns()
+        
+        self.stdout.write(
+            f"{options['requests']} draft improvements from {options['concurrency']} concurrent clients, "
+            f"{options['latency']}s per model call"
+        )
+        
+        if options['server'] in ('wsgi', 'both'):
+            started = time.perf_counter()
+            results = self._run_wsgi(options, f"{run_id}-wsgi")
+            self._report(
+                f"WSGI worker, {options['threads']} threads:", results, time.perf_counter() - started,
+                options['latency']
+            )
+        
+        if options['server'] in ('asgi', 'both'):
+            started = time.perf_counter()
+            results = self._run_asgi(options, f"{run_id}-asgi")
+            self._report("ASGI worker, one event loop:", results, time.perf_counter() - started, options['latency'])
+        
+        self.stdout.write(f"Resilience:   {ai_manager.resilience.stats()}")
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from qa.votes import drifted_answers, reconcile_vote_counts
+
+
+class Command(BaseCommand):
+    help = 'Repair answer vote counters that drifted from the Vote rows'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Only report drifted answers')
+        parser.add_argument('--batch-size', type=int, default=500)
+    
+    def handle(self, *args, **options):
+        if options['dry_run']:
+            drifted = drifted_answers().values_list('pk', 'upvote_count', 'downvote_count', 'actual_upvotes',
+                                                    'actual_downvotes')
+            for pk, upvotes, downvotes, actual_upvotes, actual_downvotes in drifted:
+                self.stdout.write(f"{pk}: stored +{upvotes}/-{downvotes}, actual +{actual_upvotes}/-{actual_downvotes}")
+            self.stdout.write(f"{len(drifted)} answer(s) drifted")
+            return
+        
+        repaired = reconcile_vote_counts(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Repaired vote counts of {repaired} answer(s)"))
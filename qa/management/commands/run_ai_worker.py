@@ -0,0 +1,33 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from qa.ai_jobs import run_worker_pool
+
+
+class Command(BaseCommand):
+    help = 'Process queued AI jobs with a pool of worker threads'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=settings.AI_JOB_WORKERS,
+            help='Number of worker threads in this process'
+        )
+        parser.add_argument(
+            '--poll-interval', type=float, default=settings.AI_JOB_POLL_INTERVAL,
+            help='Seconds an idle worker waits before polling the queue again'
+        )
+        parser.add_argument(
+            '--drain', action='store_true',
+            help='Exit once the queue is empty instead of waiting for new jobs'
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"Starting {options['workers']} AI worker(s)")
+
+        processed = run_worker_pool(
+            workers=options['workers'],
+            poll_interval=options['poll_interval'],
+            drain=options['drain']
+        )
+
+        self.stdout.write(self.style.SUCCESS(f"Processed {processed} AI job(s)"))
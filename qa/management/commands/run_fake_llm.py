@@ -0,0 +1,52 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from qa.fake_llm import FakeLLM, make_fake_llm_server
+
+
+class Command(BaseCommand):
+    help = 'Serve a deterministic OpenAI-compatible fake LLM for offline load testing'
+    
+    def add_arguments(self, parser):
+        latency = settings.FAKE_LLM['latency']
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument(
+            '--latency-median', type=float, default=latency.get('median', 0.8),
+            help='Median response time in seconds (log-normal distribution)'
+        )
+        parser.add_argument(
+            '--latency-sigma', type=float, default=latency.get('sigma', 0.5),
+            help='Spread of the log-normal latency distribution; 0 gives a fixed latency'
+        )
+        parser.add_argument(
+            '--error-rate', type=float, default=settings.FAKE_LLM['error_rate'],
+            help='Fraction of requests answered with HTTP 503'
+        )
+        parser.add_argument('--seed', type=int, default=settings.FAKE_LLM['seed'])
+    
+    def handle(self, *args, **options):
+        if options['latency_sigma'] > 0:
+            latency = {
+                'distribution': 'lognormal',
+                'median': options['latency_median'],
+                'sigma': options['latency_sigma'],
+            }
+        else:
+            latency = {'distribution': 'fixed', 'seconds': options['latency_median']}
+        
+        fake = FakeLLM(latency=latency, error_rate=options['error_rate'], seed=options['seed'])
+        server = make_fake_llm_server(options['host'], options['port'], fake)
+        
+        self.stdout.write(
+            f"Fake LLM listening on http://{options['host']}:{options['port']}/v1 "
+            f"(set AI_BACKEND=openai and OPENAI_BASE_URL to this address)"
+        )
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+        
+        self.stdout.write(self.style.SUCCESS(f"Served {fake.requests} request(s)"))
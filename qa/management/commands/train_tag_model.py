@@ -0,0 +1,44 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from qa.tag_model import train_tag_model
+
+
+class Command(BaseCommand):
+    help = 'Train the offline tag suggester from existing question tags'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--output', default=str(settings.TAG_MODEL_DIR),
+            help='Directory the model files are written to'
+        )
+        parser.add_argument(
+            '--min-count', type=int, default=settings.TAG_MODEL_MIN_COUNT,
+            help='Minimum number of questions a tag needs to be learned'
+        )
+        parser.add_argument(
+            '--max-tags', type=int, default=settings.TAG_MODEL_MAX_TAGS,
+            help='Maximum number of tags in the model, most frequent first'
+        )
+    
+    def handle(self, *args, **options):
+        start_time = time.time()
+        
+        result = train_tag_model(
+            output_dir=options['output'],
+            min_count=options['min_count'],
+            max_tags=options['max_tags']
+        )
+        
+        if not result['tags']:
+            self.stdout.write(self.style.WARNING(
+                f"No tag reached --min-count across {result['documents']} tagged question(s); nothing written"
+            ))
+            return
+        
+        self.stdout.write(self.style.SUCCESS(
+            f"Trained {result['tags']} tag(s) from {result['documents']} question(s) "
+            f"in {time.time() - start_time:.1f}s"
+        ))
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.4 on 2026-10-18 16:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('qa', '0003_ai_job_queue'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='aiservice',
+            name='cache_key',
+            field=models.CharField(blank=True, db_index=True, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='aiservice',
+            name='expires_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='aiservice',
+            name='service_type',
+            field=models.CharField(choices=[('question_improvement', 'Question Improvement'), ('answer_feedback', 'Answer Feedback'), ('tag_suggestion', 'Tag Suggestion'), ('similar_questions', 'Similar Questions'), ('answer_improvement', 'Answer Improvement'), ('confidence_analysis', 'Confidence Analysis'), ('learning_path', 'Learning Path')], max_length=50),
+        ),
+    ]
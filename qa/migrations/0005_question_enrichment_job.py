@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-18 16:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('qa', '0004_ai_response_cache'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='aijob',
+            name='job_type',
+            field=models.CharField(choices=[('question_improvement', 'Question Improvement'), ('question_enrichment', 'Question Enrichment'), ('answer_feedback', 'Answer Feedback')], max_length=50),
+        ),
+    ]
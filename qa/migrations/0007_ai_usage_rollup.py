@@ -0,0 +1,33 @@
+# Generated by Django 5.2.4 on 2026-10-18 16:52
+
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('qa', '0006_ai_token_accounting'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AIUsageRollup',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('period', models.CharField(choices=[('hour', 'Hour'), ('day', 'Day')], max_length=10)),
+                ('bucket_start', models.DateTimeField()),
+                ('service_type', models.CharField(max_length=50)),
+                ('calls', models.IntegerField(default=0)),
+                ('prompt_tokens', models.BigIntegerField(default=0)),
+                ('completion_tokens', models.BigIntegerField(default=0)),
+                ('total_processing_time', models.FloatField(default=0.0)),
+                ('latency_histogram', models.JSONField(default=list)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['-bucket_start'],
+                'unique_together': {('period', 'bucket_start', 'service_type')},
+            },
+        ),
+    ]
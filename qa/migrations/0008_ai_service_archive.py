@@ -0,0 +1,30 @@
+# Generated by Django 5.2.4 on 2026-10-18 16:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('qa', '0007_ai_usage_rollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AIServiceArchive',
+            fields=[
+                ('id', models.UUIDField(editable=False, primary_key=True, serialize=False)),
+                ('service_type', models.CharField(max_length=50)),
+                ('created_at', models.DateTimeField(db_index=True)),
+                ('archive_file', models.CharField(max_length=255)),
+                ('offset', models.BigIntegerField()),
+                ('length', models.IntegerField()),
+                ('output_hash', models.CharField(db_index=True, max_length=64)),
+                ('output_stored', models.BooleanField(default=True)),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
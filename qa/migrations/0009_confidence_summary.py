@@ -0,0 +1,37 @@
+# Generated by Django 5.2.4 on 2026-10-18 16:57
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('qa', '0008_ai_service_archive'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ConfidenceSummary',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('answer_count', models.IntegerField(default=0)),
+                ('confidence_sum', models.FloatField(default=0.0)),
+                ('confidence_sq_sum', models.FloatField(default=0.0)),
+                ('indexed_confidence_sum', models.FloatField(default=0.0)),
+                ('ewma', models.FloatField(blank=True, null=True)),
+                ('recent_confidences', models.JSONField(default=list)),
+                ('accepted_count', models.IntegerField(default=0)),
+                ('accepted_confidence_sum', models.FloatField(default=0.0)),
+                ('brier_sum', models.FloatField(default=0.0)),
+                ('calibration_bands', models.JSONField(default=list)),
+                ('first_answer_at', models.DateTimeField(blank=True, null=True)),
+                ('last_answer_at', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='confidence_summary', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.4 on 2026-10-18 16:58
+
+import django.db.models.deletion
+import django.utils.timezone
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('qa', '0009_confidence_summary'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='aijob',
+            name='user',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='ai_jobs', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='aijob',
+            name='job_type',
+            field=models.CharField(choices=[('question_improvement', 'Question Improvement'), ('question_enrichment', 'Question Enrichment'), ('answer_feedback', 'Answer Feedback'), ('learning_path', 'Learning Path')], max_length=50),
+        ),
+        migrations.CreateModel(
+            name='LearningPathCache',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('fingerprint', models.CharField(max_length=64)),
+                ('content', models.JSONField(default=dict)),
+                ('is_stale', models.BooleanField(default=False)),
+                ('generated_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='learning_path_cache', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.4 on 2026-10-18 17:12
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_votes(apps, schema_editor):
+    Answer = apps.get_model('qa', 'Answer')
+    
+    def vote_count(votes):
+        counts = votes.filter(answer_id=OuterRef('pk')).order_by().values('answer_id').annotate(count=Count('*'))
+        return Coalesce(Subquery(counts.values('count')), 0)
+    
+    upvotes = Answer.upvotes.through.objects.all()
+    downvotes = Answer.downvotes.through.objects.all()
+    Answer.objects.update(
+        upvote_count=vote_count(upvotes),
+        downvote_count=vote_count(downvotes),
+        score=vote_count(upvotes) - vote_count(downvotes),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('qa', '0010_learning_path_cache'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='answer',
+            name='downvote_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='answer',
+            name='score',
+            field=models.IntegerField(db_index=True, default=0),
+        ),
+        migrations.AddField(
+            model_name='answer',
+            name='upvote_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(count_votes, migrations.RunPython.noop),
+    ]
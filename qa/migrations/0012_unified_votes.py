@@ -0,0 +1,82 @@
+# Generated by Django 5.2.4 on 2026-10-18 17:17
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def move_votes(apps, schema_editor):
+    Answer = apps.get_model('qa', 'Answer')
+    Vote = apps.get_model('qa', 'Vote')
+    
+    upvotes = set(Answer.upvotes.through.objects.values_list('answer_id', 'user_id'))
+    downvotes = set(Answer.downvotes.through.objects.values_list('answer_id', 'user_id'))
+    # A user in both sets added nothing to the score, so they keep no vote
+    both = upvotes & downvotes
+    Vote.objects.bulk_create(
+        [Vote(answer_id=answer_id, user_id=user_id, value=1) for answer_id, user_id in upvotes - both]
+        + [Vote(answer_id=answer_id, user_id=user_id, value=-1) for answer_id, user_id in downvotes - both],
+        batch_size=1000
+    )
+    
+    def vote_count(value):
+        counts = Vote.objects.filter(answer_id=OuterRef('pk'), value=value).order_by().values('answer_id').annotate(
+            count=Count('*')
+        )
+        return Coalesce(Subquery(counts.values('count')), 0)
+    
+    Answer.objects.update(
+        upvote_count=vote_count(1),
+        downvote_count=vote_count(-1),
+        score=vote_count(1) - vote_count(-1),
+    )
+
+
+def restore_votes(apps, schema_editor):
+    Answer = apps.get_model('qa', 'Answer')
+    Vote = apps.get_model('qa', 'Vote')
+    
+    for field, value in (('upvotes', 1), ('downvotes', -1)):
+        through = getattr(Answer, field).through
+        through.objects.bulk_create(
+            [through(answer_id=answer_id, user_id=user_id)
+             for answer_id, user_id in Vote.objects.filter(value=value).values_list('answer_id', 'user_id')],
+            batch_size=1000
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('qa', '0011_answer_vote_counts'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Vote',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('value', models.SmallIntegerField(choices=[(1, 'Upvote'), (-1, 'Downvote')])),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('answer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='votes', to='qa.answer')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='answer_votes', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('answer', 'user'), name='unique_vote_per_answer_user')],
+            },
+        ),
+        migrations.RunPython(move_votes, restore_votes),
+        migrations.RemoveField(
+            model_name='answer',
+            name='downvotes',
+        ),
+        migrations.RemoveField(
+            model_name='answer',
+            name='upvotes',
+        ),
+    ]
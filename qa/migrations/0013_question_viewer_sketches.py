@@ -0,0 +1,32 @@
+# Generated by Django 5.2.4 on 2026-10-18 17:20
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('qa', '0012_unified_votes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='question',
+            name='viewer_sketch',
+            field=models.BinaryField(default=b''),
+        ),
+        migrations.CreateModel(
+            name='DailyViewerSketch',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('day', models.DateField()),
+                ('sketch', models.BinaryField(default=b'')),
+                ('question', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_viewer_sketches', to='qa.question')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('question', 'day'), name='unique_viewer_sketch_per_question_day')],
+            },
+        ),
+    ]
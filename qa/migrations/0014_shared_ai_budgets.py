@@ -0,0 +1,29 @@
+# Generated by Django 5.2.4 on 2026-10-18 17:32
+
+import django.utils.timezone
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('qa', '0013_question_viewer_sketches'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AIBudgetBucket',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('scope', models.CharField(max_length=20)),
+                ('key', models.CharField(max_length=64)),
+                ('tokens', models.FloatField()),
+                ('refilled_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('version', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'unique_together': {('scope', 'key')},
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.4 on 2026-10-18 17:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('qa', '0014_shared_ai_budgets'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='answer',
+            name='ai_status',
+            field=models.CharField(choices=[('none', 'Not Requested'), ('pending', 'Pending'), ('completed', 'Completed'), ('partial', 'Partially Completed'), ('failed', 'Failed')], default='none', max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='question',
+            name='ai_status',
+            field=models.CharField(choices=[('none', 'Not Requested'), ('pending', 'Pending'), ('completed', 'Completed'), ('partial', 'Partially Completed'), ('failed', 'Failed')], default='none', max_length=20),
+        ),
+    ]
@@ -4,6 +4,15 @@ from django.utils import timezone
 import uuid
 
 
+AI_STATUS_CHOICES = [
+    ('none', 'Not Requested'),
+    ('pending', 'Pending'),
+    ('completed', 'Completed'),
+    ('partial', 'Partially Completed'),
+    ('failed', 'Failed'),
+]
+
+
 class Question(models.Model):
     """Question model with AI assistance and learning features"""
     
@@ -18,11 +27,14 @@ class Question(models.Model):
     ai_improved_content = models.TextField(blank=True)
     ai_suggested_tags = models.JSONField(default=list, blank=True)
     ai_similar_questions = models.JSONField(default=list, blank=True)
+    ai_status = models.CharField(max_length=20, choices=AI_STATUS_CHOICES, default='none')
     
     # Learning features
     tags = models.JSONField(default=list)
     is_featured = models.BooleanField(default=False)
     view_count = models.IntegerField(default=0)
+    # HyperLogLog sketch of everyone who viewed the question (see qa/unique_viewers.py)
+    viewer_sketch = models.BinaryField(default=b'')
     
     # Status
     is_resolved = models.BooleanField(default=False)
@@ -35,10 +47,10 @@ class Question(models.Model):
     def __str__(self):
         return self.title
     
-    def increment_view_count(self):
-        """Increment view count"""
-        self.view_count += 1
-        self.save()
+    def increment_view_count(self, viewer=None):
+        """Count a view (and its viewer hash, for unique viewers); written in batches by qa.view_counter"""
+        from .view_counter import view_counter
+        view_counter.record(self.pk, viewer=viewer)
     
     def get_answers_count(self):
         """Get number of answers"""
@@ -60,11 +72,14 @@ class Answer(models.Model):
     ai_feedback = models.TextField(blank=True)
     ai_improved_content = models.TextField(blank=True)
     ai_suggestions = models.JSONField(default=list, blank=True)
+    ai_status = models.CharField(max_length=20, choices=AI_STATUS_CHOICES, default='none')
     
     # Learning features
     is_accepted = models.BooleanField(default=False)
-    upvotes = models.ManyToManyField(settings.AUTH_USER_MODEL, related_name='upvoted_answers', blank=True)
-    downvotes = models.ManyToManyField(settings.AUTH_USER_MODEL, related_name='downvoted_answers', blank=True)
+    # Denormalized from Vote rows by qa.votes.toggle_vote; repaired by reconcile_vote_counts
+    upvote_count = models.PositiveIntegerField(default=0)
+    downvote_count = models.PositiveIntegerField(default=0)
+    score = models.IntegerField(default=0, db_index=True)
     
     # Mentor features
     mentor_verified = models.BooleanField(default=False)
@@ -78,22 +93,64 @@ class Answer(models.Model):
         return f"Answer to: {self.question.title[:50]}"
     
     def get_vote_score(self):
-        """Calculate vote score"""
-        return self.upvotes.count() - self.downvotes.count()
+        """Vote score (upvotes minus downvotes)"""
+        return self.score
     
     def accept_answer(self):
         """Mark answer as accepted"""
         self.is_accepted = True
         self.question.is_resolved = True
         self.question.resolved_answer = self
-        self.question.save()
-        self.save()
+        # Only the changed fields, so counters updated elsewhere (votes, views) are not written back
+        self.question.save(update_fields=['is_resolved', 'resolved_answer', 'updated_at'])
+        self.save(update_fields=['is_accepted', 'updated_at'])
         
         # Award points to author
         self.author.add_points(50)
         self.author.increment_answers_given()
 
 
+class Vote(models.Model):
+    """A user's vote on an answer; one row per user and answer, so a vote is up or down but never both"""
+    
+    VALUE_CHOICES = [
+        (1, 'Upvote'),
+        (-1, 'Downvote'),
+    ]
+    
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    answer = models.ForeignKey(Answer, on_delete=models.CASCADE, related_name='votes')
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='answer_votes')
+    value = models.SmallIntegerField(choices=VALUE_CHOICES)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['answer', 'user'], name='unique_vote_per_answer_user'),
+        ]
+    
+    def __str__(self):
+        return f"{self.user} {self.get_value_display().lower()}d {self.answer_id}"
+
+
+class DailyViewerSketch(models.Model):
+    """HyperLogLog sketch of one day's viewers of a question; merged for weekly and monthly uniques"""
+    
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    question = models.ForeignKey(Question, on_delete=models.CASCADE, related_name='daily_viewer_sketches')
+    day = models.DateField()
+    sketch = models.BinaryField(default=b'')
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['question', 'day'], name='unique_viewer_sketch_per_question_day'),
+        ]
+    
+    def __str__(self):
+        return f"Viewers of {self.question_id} on {self.day}"
+
+
 class LearningJournal(models.Model):
     """Learning journal to track user's growth"""
     
@@ -131,6 +188,52 @@ class LearningJournal(models.Model):
         ordering = ['-created_at']
 
 
+class ConfidenceSummary(models.Model):
+    """Running statistics of a user's answer confidence, updated as answers are written (see qa/confidence.py)"""
+    
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='confidence_summary')
+    
+    # Sums over answers in creation order (index 0, 1, ...)
+    answer_count = models.IntegerField(default=0)
+    confidence_sum = models.FloatField(default=0.0)
+    confidence_sq_sum = models.FloatField(default=0.0)
+    indexed_confidence_sum = models.FloatField(default=0.0)  # sum of index * confidence, for the slope
+    ewma = models.FloatField(null=True, blank=True)
+    recent_confidences = models.JSONField(default=list)
+    
+    # Calibration against accepted answers
+    accepted_count = models.IntegerField(default=0)
+    accepted_confidence_sum = models.FloatField(default=0.0)
+    brier_sum = models.FloatField(default=0.0)
+    calibration_bands = models.JSONField(default=list)  # [answers, accepted] per confidence band
+    
+    first_answer_at = models.DateTimeField(null=True, blank=True)
+    last_answer_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"Confidence summary for {self.user.username}"
+
+
+class LearningPathCache(models.Model):
+    """Last AI learning path generated for a user, served until their activity changes (see qa/learning_paths.py)"""
+    
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='learning_path_cache')
+    
+    # Hash of the activity counters and latest community question the path was generated from
+    fingerprint = models.CharField(max_length=64)
+    content = models.JSONField(default=dict)
+    is_stale = models.BooleanField(default=False)
+    
+    generated_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"Learning path for {self.user.username}"
+
+
 class AIService(models.Model):
     """AI service for question improvement and feedback"""
     
@@ -142,6 +245,9 @@ class AIService(models.Model):
         ('answer_feedback', 'Answer Feedback'),
         ('tag_suggestion', 'Tag Suggestion'),
         ('similar_questions', 'Similar Questions'),
+        ('answer_improvement', 'Answer Improvement'),
+        ('confidence_analysis', 'Confidence Analysis'),
+        ('learning_path', 'Learning Path'),
     ])
     
     # Request/Response
@@ -149,9 +255,19 @@ class AIService(models.Model):
     output_text = models.TextField()
     metadata = models.JSONField(default=dict)
     
+    # Response cache (persistent tier of qa.ai_cache.AIResponseCache)
+    cache_key = models.CharField(max_length=64, blank=True, db_index=True)
+    expires_at = models.DateTimeField(null=True, blank=True)
+    
+    # Who the call was made for (used for token budgets)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name='ai_services')
+    community = models.ForeignKey('communities.Community', on_delete=models.SET_NULL, null=True, blank=True, related_name='ai_services')
+    
     # Performance
     processing_time = models.FloatField(default=0.0)
-    tokens_used = models.IntegerField(default=0)
+    prompt_tokens = models.IntegerField(default=0)
+    completion_tokens = models.IntegerField(default=0)
+    tokens_used = models.IntegerField(default=0)  # prompt_tokens + completion_tokens
     
     # Timestamps
     created_at = models.DateTimeField(auto_now_add=True)
@@ -163,6 +279,133 @@ class AIService(models.Model):
         ordering = ['-created_at']
 
 
+class AIJob(models.Model):
+    """Queued AI work processed outside the request cycle by the AI workers"""
+    
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    ]
+    
+    JOB_TYPE_CHOICES = [
+        ('question_improvement', 'Question Improvement'),
+        ('question_enrichment', 'Question Enrichment'),
+        ('answer_feedback', 'Answer Feedback'),
+        ('learning_path', 'Learning Path'),
+    ]
+    
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    job_type = models.CharField(max_length=50, choices=JOB_TYPE_CHOICES)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    
+    # Target of the job
+    question = models.ForeignKey(Question, on_delete=models.CASCADE, null=True, blank=True, related_name='ai_jobs')
+    answer = models.ForeignKey(Answer, on_delete=models.CASCADE, null=True, blank=True, related_name='ai_jobs')
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, null=True, blank=True, related_name='ai_jobs')
+    
+    # Execution
+    attempts = models.IntegerField(default=0)
+    run_after = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    result = models.JSONField(default=dict, blank=True)
+    
+    # Timestamps
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    
+    def __str__(self):
+        return f"{self.job_type} ({self.status})"
+    
+    class Meta:
+        ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['status', 'run_after']),
+        ]
+
+
+class AIBudgetBucket(models.Model):
+    """Token bucket of a community or user budget, shared by every process (see qa/ai_budget.py)"""
+    
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    scope = models.CharField(max_length=20)
+    key = models.CharField(max_length=64)
+    
+    # Balance at refilled_at; it may go negative when a call used more than was reserved
+    tokens = models.FloatField()
+    refilled_at = models.DateTimeField(default=timezone.now)
+    # Bumped on every write, so a reservation only applies to the balance it was computed from
+    version = models.PositiveIntegerField(default=0)
+    
+    def __str__(self):
+        return f"{self.scope} {self.key}: {self.tokens:.0f} tokens"
+    
+    class Meta:
+        unique_together = ['scope', 'key']
+
+
+class AIUsageRollup(models.Model):
+    """Hourly or daily AI usage totals per service type, maintained as audit records are written"""
+    
+    PERIOD_CHOICES = [
+        ('hour', 'Hour'),
+        ('day', 'Day'),
+    ]
+    
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    period = models.CharField(max_length=10, choices=PERIOD_CHOICES)
+    bucket_start = models.DateTimeField()
+    service_type = models.CharField(max_length=50)
+    
+    # Totals
+    calls = models.IntegerField(default=0)
+    prompt_tokens = models.BigIntegerField(default=0)
+    completion_tokens = models.BigIntegerField(default=0)
+    total_processing_time = models.FloatField(default=0.0)
+    
+    # Call counts per latency bucket (see qa.ai_rollups.LATENCY_BUCKETS_MS)
+    latency_histogram = models.JSONField(default=list)
+    
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.service_type} {self.period} {self.bucket_start:%Y-%m-%d %H:%M}"
+    
+    class Meta:
+        ordering = ['-bucket_start']
+        unique_together = ['period', 'bucket_start', 'service_type']
+
+
+class AIServiceArchive(models.Model):
+    """Index entry for an AIService record moved to compressed cold storage"""
+    
+    # Same id as the archived AIService record
+    id = models.UUIDField(primary_key=True, editable=False)
+    service_type = models.CharField(max_length=50)
+    created_at = models.DateTimeField(db_index=True)
+    
+    # Location of the compressed NDJSON member holding the record (see qa.ai_archive); the file
+    # name is relative to AI_ARCHIVE_DIR unless the archive was written to another directory
+    archive_file = models.CharField(max_length=255)
+    offset = models.BigIntegerField()
+    length = models.IntegerField()
+    
+    # Identical outputs are stored once when archiving with deduplication
+    output_hash = models.CharField(max_length=64, db_index=True)
+    output_stored = models.BooleanField(default=True)
+    
+    archived_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"{self.service_type} - {self.created_at.strftime('%Y-%m-%d %H:%M')} (archived)"
+    
+    class Meta:
+        ordering = ['-created_at']
+
+
 class UserPreference(models.Model):
     """User preferences for the platform"""
     
@@ -1,8 +1,7 @@
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
-from .models import Question, Answer, LearningJournal, AIService, UserPreference
+from .models import Question, Answer, LearningJournal, AIService, AIJob, UserPreference
 from communities.models import Community, CommunityInvite
-import json
 
 User = get_user_model()
 
@@ -39,9 +38,14 @@ class CommunitySerializer(serializers.ModelSerializer):
                            'total_answers', 'created_at']
     
     def get_members_count(self, obj):
+        # Querysets that serialize many communities annotate the counts (see qa.views)
+        if hasattr(obj, 'members_count'):
+            return obj.members_count
         return obj.members.count()
     
     def get_mentors_count(self, obj):
+        if hasattr(obj, 'mentors_count'):
+            return obj.mentors_count
         return obj.mentors.count()
 
 
@@ -57,36 +61,47 @@ class AnswerSerializer(serializers.ModelSerializer):
     class Meta:
         model = Answer
         fields = ['id', 'question', 'author', 'content', 'confidence_level',
-                 'ai_feedback', 'ai_improved_content', 'ai_suggestions',
+                 'ai_feedback', 'ai_improved_content', 'ai_suggestions', 'ai_status',
                  'is_accepted', 'mentor_verified', 'verified_by',
                  'vote_score', 'upvotes_count', 'downvotes_count',
                  'is_upvoted_by_user', 'is_downvoted_by_user',
                  'created_at', 'updated_at']
         read_only_fields = ['id', 'author', 'ai_feedback', 'ai_improved_content',
-                           'ai_suggestions', 'mentor_verified', 'verified_by',
+                           'ai_suggestions', 'ai_status', 'mentor_verified', 'verified_by',
                            'vote_score', 'upvotes_count', 'downvotes_count',
                            'created_at', 'updated_at']
     
     def get_vote_score(self, obj):
-        return obj.get_vote_score()
+        return obj.score
     
     def get_upvotes_count(self, obj):
-        return obj.upvotes.count()
+        return obj.upvote_count
     
     def get_downvotes_count(self, obj):
-        return obj.downvotes.count()
+        return obj.downvote_count
     
-    def get_is_upvoted_by_user(self, obj):
+    def _my_vote(self, obj):
+        # Answer querysets in qa.views annotate the current user's vote; the query
+        # below only runs for answers loaded some other way
+        if hasattr(obj, 'my_vote'):
+            return obj.my_vote
         request = self.context.get('request')
         if request and request.user.is_authenticated:
-            return request.user in obj.upvotes.all()
-        return False
+            return obj.votes.filter(user=request.user).values_list('value', flat=True).first()
+        return None
+    
+    def get_is_upvoted_by_user(self, obj):
+        return self._my_vote(obj) == 1
     
     def get_is_downvoted_by_user(self, obj):
-        request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            return request.user in obj.downvotes.all()
-        return False
+        return self._my_vote(obj) == -1
+    
+    def update(self, instance, validated_data):
+        # Vote counters move with F() updates in qa.votes; only the submitted fields are written
+        for attr, value in validated_data.items():
+            setattr(instance, attr, value)
+        instance.save(update_fields=[*validated_data, 'updated_at'])
+        return instance
 
 
 class QuestionSerializer(serializers.ModelSerializer):
@@ -102,16 +117,18 @@ class QuestionSerializer(serializers.ModelSerializer):
         model = Question
         fields = ['id', 'title', 'content', 'author', 'community',
                  'ai_improved_title', 'ai_improved_content', 
-                 'ai_suggested_tags', 'ai_similar_questions',
+                 'ai_suggested_tags', 'ai_similar_questions', 'ai_status',
                  'tags', 'is_featured', 'view_count', 'is_resolved',
                  'resolved_answer', 'answers', 'answers_count',
                  'created_at', 'updated_at']
         read_only_fields = ['id', 'author', 'ai_improved_title', 
                            'ai_improved_content', 'ai_suggested_tags',
-                           'ai_similar_questions', 'is_resolved',
+                           'ai_similar_questions', 'ai_status', 'is_resolved',
                            'resolved_answer', 'view_count', 'created_at', 'updated_at']
     
     def get_answers_count(self, obj):
+        if hasattr(obj, 'answers_count'):
+            return obj.answers_count
         return obj.get_answers_count()
 
 
@@ -121,7 +138,8 @@ class QuestionCreateSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = Question
-        fields = ['title', 'content', 'community', 'tags', 'use_ai_assistance']
+        fields = ['id', 'title', 'content', 'community', 'tags', 'ai_status', 'use_ai_assistance']
+        read_only_fields = ['id', 'ai_status']
     
     def create(self, validated_data):
         use_ai = validated_data.pop('use_ai_assistance', True)
@@ -130,30 +148,17 @@ class QuestionCreateSerializer(serializers.ModelSerializer):
         # Create the question
         question = Question.objects.create(
             author=user,
+            ai_status='pending' if use_ai else 'none',
             **validated_data
         )
         
         # Increment user's questions asked
         user.increment_questions_asked()
         
-        # Use AI assistance if requested
+        # Queue AI assistance so the request never waits on the model
         if use_ai:
-            from .ai_services import ai_manager
-            ai_result, ai_service = ai_manager.improve_question(
-                question.title, question.content
-            )
-            
-            if ai_result:
-                try:
-                    # Parse AI result (assuming it returns JSON)
-                    ai_data = json.loads(ai_result)
-                    question.ai_improved_title = ai_data.get('improved_title', '')
-                    question.ai_improved_content = ai_data.get('improved_content', '')
-                    question.ai_suggested_tags = ai_data.get('suggested_tags', [])
-                    question.ai_similar_questions = ai_data.get('similar_questions', [])
-                    question.save()
-                except json.JSONDecodeError:
-                    pass  # If AI result is not valid JSON, keep original
+            from .ai_jobs import enqueue_job
+            enqueue_job('question_enrichment', question=question)
         
         # Increment community questions count
         question.community.increment_questions()
@@ -177,7 +182,8 @@ class AnswerCreateSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = Answer
-        fields = ['question', 'content', 'confidence_level', 'use_ai_feedback']
+        fields = ['id', 'question', 'content', 'confidence_level', 'ai_status', 'use_ai_feedback']
+        read_only_fields = ['id', 'ai_status']
     
     def create(self, validated_data):
         use_ai = validated_data.pop('use_ai_feedback', True)
@@ -186,29 +192,17 @@ class AnswerCreateSerializer(serializers.ModelSerializer):
         # Create the answer
         answer = Answer.objects.create(
             author=user,
+            ai_status='pending' if use_ai else 'none',
             **validated_data
         )
         
         # Increment user's answers given
         user.increment_answers_given()
         
-        # Use AI feedback if requested
+        # Queue AI feedback so the request never waits on the model
         if use_ai:
-            from .ai_services import ai_manager
-            ai_result, ai_service = ai_manager.provide_answer_feedback(
-                answer.content
-            )
-            
-            if ai_result:
-                try:
-                    # Parse AI result
-                    ai_data = json.loads(ai_result)
-                    answer.ai_feedback = ai_data.get('feedback', '')
-                    answer.ai_improved_content = ai_data.get('improved_answer', '')
-                    answer.ai_suggestions = ai_data.get('suggestions', [])
-                    answer.save()
-                except json.JSONDecodeError:
-                    pass
+            from .ai_jobs import enqueue_job
+            enqueue_job('answer_feedback', answer=answer)
         
         # Increment community answers count
         answer.question.community.increment_answers()
@@ -262,10 +256,29 @@ class AIServiceSerializer(serializers.ModelSerializer):
     class Meta:
         model = AIService
         fields = ['id', 'service_type', 'input_text', 'output_text',
-                 'metadata', 'processing_time', 'tokens_used', 'created_at']
+                 'metadata', 'user', 'community', 'processing_time',
+                 'prompt_tokens', 'completion_tokens', 'tokens_used', 'created_at']
         read_only_fields = ['id', 'created_at']
 
 
+class AIJobSerializer(serializers.ModelSerializer):
+    """Serializer for queued AI jobs"""
+    
+    class Meta:
+        model = AIJob
+        fields = ['id', 'job_type', 'status', 'question', 'answer', 'attempts',
+                 'last_error', 'result', 'run_after', 'created_at', 'finished_at']
+        read_only_fields = fields
+
+
+class AIJobFilterSerializer(serializers.Serializer):
+    """Validates the query parameters of the AI job list"""
+    
+    question = serializers.UUIDField(required=False)
+    answer = serializers.UUIDField(required=False)
+    status = serializers.ChoiceField(choices=AIJob.STATUS_CHOICES, required=False)
+
+
 class CommunityInviteSerializer(serializers.ModelSerializer):
     """Serializer for Community Invites"""
     community = CommunitySerializer(read_only=True)
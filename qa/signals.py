@@ -0,0 +1,75 @@
+from django.db.models.signals import post_init, post_save, post_delete
+from django.dispatch import receiver
+from .models import Question, Answer, LearningJournal
+from .similarity import similarity_index
+from .confidence import record_answer, record_acceptance, rebuild_summary
+from .learning_paths import invalidate_learning_paths
+
+
+@receiver(post_save, sender=Question)
+def index_question(sender, instance, update_fields=None, **kwargs):
+    """Keep the similarity index current as questions are written"""
+    if update_fields is not None and not {'title', 'content'} & set(update_fields):
+        return
+    similarity_index.update_question(instance)
+
+
+@receiver(post_delete, sender=Question)
+def unindex_question(sender, instance, **kwargs):
+    """Drop deleted questions from the similarity index"""
+    similarity_index.remove_question(instance)
+
+
+@receiver(post_init, sender=Answer)
+def remember_confidence(sender, instance, **kwargs):
+    """Remember the values the confidence summary was built from, to detect changes on save"""
+    # Reading a deferred field would load it, creating another instance and recursing
+    if {'confidence_level', 'is_accepted'} & instance.get_deferred_fields():
+        instance._summarized = None
+        return
+    instance._summarized = (instance.confidence_level, instance.is_accepted)
+
+
+@receiver(post_save, sender=Answer)
+def summarize_confidence(sender, instance, created=False, **kwargs):
+    """Keep the author's confidence summary current as answers are written"""
+    summarized = instance._summarized
+    # Confidence summaries are derived data; a failure here must not fail the write
+    try:
+        if created:
+            record_answer(instance)
+        elif summarized is None:
+            # Loaded without the summarized fields, so what changed is unknown
+            rebuild_summary(instance.author_id)
+        elif instance.confidence_level != summarized[0] or (summarized[1] and not instance.is_accepted):
+            # Edits change values the incremental sums already include
+            rebuild_summary(instance.author_id)
+        elif instance.is_accepted and not summarized[1]:
+            record_acceptance(instance)
+    except Exception as e:
+        print(f"Warning: confidence summary update failed - {e}")
+    if summarized is not None:
+        instance._summarized = (instance.confidence_level, instance.is_accepted)
+
+
+@receiver(post_delete, sender=Answer)
+def unsummarize_confidence(sender, instance, **kwargs):
+    """Rebuild the author's confidence summary without the deleted answer"""
+    try:
+        rebuild_summary(instance.author_id)
+    except Exception as e:
+        print(f"Warning: confidence summary update failed - {e}")
+
+
+@receiver(post_save, sender=LearningJournal)
+def journal_invalidates_learning_path(sender, instance, created=False, **kwargs):
+    """New learning activity makes the user's cached learning path outdated"""
+    if created:
+        invalidate_learning_paths(user_ids=[instance.user_id])
+
+
+@receiver(post_save, sender=Question)
+def question_invalidates_learning_paths(sender, instance, created=False, **kwargs):
+    """A new question changes the community topics learning paths were generated from"""
+    if created:
+        invalidate_learning_paths(community_id=instance.community_id)
@@ -0,0 +1,319 @@
+import math
+import re
+import threading
+import time
+import zlib
+from collections import Counter
+
+import numpy as np
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+
+from .models import Question
+
+
+TOKEN_RE = re.compile(r"[a-z0-9][a-z0-9+#._-]*")
+
+STOPWORDS = frozenset("""
+a an and are as at be but by can do does for from how i if in into is it its me my
+not of on or so than that the their them then there these this to was we what when
+where which who why will with you your
+""".split())
+
+# Only the start of long posts is indexed; it carries most of the topic signal
+MAX_CONTENT_CHARS = 5000
+TITLE_WEIGHT = 2.0
+
+
+def extract_features(text):
+    """Word unigrams and bigrams of a text, without stopwords"""
+    tokens = [token.strip('._-') for token in TOKEN_RE.findall(text.lower())]
+    tokens = [token for token in tokens if token and token not in STOPWORDS]
+    return tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+
+
+def hash_features_sparse(weights, dim, max_features=None):
+    """Signed-hash weighted features into `dim` dimensions: (sorted indices, values) of a unit vector
+
+    max_features keeps only the strongest dimensions, so stored vectors stay small.
+    """
+    if not weights:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+    
+    # crc32 is stable across processes, unlike hash()
+    hashes = np.fromiter((zlib.crc32(feature.encode('utf-8')) for feature in weights), np.int64, len(weights))
+    values = np.fromiter(weights.values(), np.float64, len(weights))
+    values = np.where(hashes & 0x80000000, values, -values)
+    # Features hashed to the same dimension are summed
+    indices, inverse = np.unique(hashes % dim, return_inverse=True)
+    values = np.bincount(inverse, weights=values)
+    
+    if max_features and len(indices) > max_features:
+        keep = np.sort(np.argpartition(-np.abs(values), max_features - 1)[:max_features])
+        indices, values = indices[keep], values[keep]
+    
+    norm = np.linalg.norm(values)
+    if norm > 0:
+        values /= norm
+    return indices, values.astype(np.float32)
+
+
+def hash_features(weights, dim):
+    """Project weighted features onto a fixed number of dimensions with signed hashing"""
+    vector = np.zeros(dim, dtype=np.float32)
+    indices, values = hash_features_sparse(weights, dim)
+    vector[indices] = values
+    return vector
+
+
+def feature_weights(title, content):
+    """Log-scaled term frequencies of a question's features, title features weighted higher"""
+    counts = Counter()
+    for feature, tf in Counter(extract_features(title or '')).items():
+        counts[feature] += TITLE_WEIGHT * (1 + math.log(tf))
+    for feature, tf in Counter(extract_features((content or '')[:MAX_CONTENT_CHARS])).items():
+        counts[feature] += 1 + math.log(tf)
+    return counts
+
+
+def vectorize(title, content, dim):
+    """L2-normalized dense hashed n-gram vector for a question"""
+    return hash_features(feature_weights(title, content), dim)
+
+
+def sparse_vectorize(title, content, dim=None, max_features=None):
+    """L2-normalized hashed n-gram vector for a question as (indices, values)"""
+    return hash_features_sparse(feature_weights(title, content), dim or settings.SIMILARITY_INDEX_DIM, max_features)
+
+
+class IndexNotReady(Exception):
+    """Raised by lookups that must not be answered before a community's first index build"""
+
+
+class CommunityVectorIndex:
+    """Inverted index of sparse question vectors for one community
+
+    A build stores, for every hashed feature, the rows of the questions that
+    have it and their weights, so a lookup only reads the postings of the
+    query's features. Questions saved after the build are kept as separate
+    vectors (their built row is masked) until the next rebuild.
+    """
+    
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.ids = []
+        self.rows = {}
+        self.live = np.zeros(0, dtype=bool)
+        self.features = np.zeros(0, dtype=np.int64)
+        self.starts = np.zeros(1, dtype=np.int64)
+        self.posting_rows = np.zeros(0, dtype=np.int32)
+        self.posting_weights = np.zeros(0, dtype=np.float16)
+        self.recent = {}
+        self.built_at = None
+        self.checked_at = None
+        self.synced_until = None
+        self.refreshing = False
+        # Set once the first build has been swapped in
+        self.ready = threading.Event()
+    
+    def __len__(self):
+        with self.lock:
+            return int(self.live.sum()) + len(self.recent)
+    
+    def reset(self, ids, vectors):
+        """Replace the contents with built (indices, values) vectors, one per question id"""
+        lengths = np.array([len(indices) for indices, values in vectors], dtype=np.int64)
+        if vectors:
+            features = np.concatenate([indices for indices, values in vectors])
+            weights = np.concatenate([values for indices, values in vectors])
+        else:
+            features, weights = np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        rows = np.repeat(np.arange(len(vectors), dtype=np.int32), lengths)
+        
+        # Group the postings by feature: features[i]'s postings are starts[i]:starts[i + 1]
+        order = np.argsort(features, kind='stable')
+        unique_features, starts = np.unique(features[order], return_index=True)
+        
+        # Computed without the lock, so lookups keep using the old postings until this swap
+        with self.lock:
+            self.ids = list(ids)
+            self.rows = {question_id: row for row, question_id in enumerate(self.ids)}
+            self.live = np.ones(len(self.ids), dtype=bool)
+            self.features = unique_features
+            self.starts = np.append(starts, len(order))
+            self.posting_rows = rows[order]
+            self.posting_weights = weights[order].astype(np.float16)
+            self.recent = {}
+    
+    def upsert(self, question_id, vector):
+        with self.lock:
+            row = self.rows.get(question_id)
+            if row is not None:
+                self.live[row] = False
+            self.recent[question_id] = vector
+    
+    def remove(self, question_id):
+        with self.lock:
+            row = self.rows.get(question_id)
+            if row is not None:
+                self.live[row] = False
+            self.recent.pop(question_id, None)
+    
+    def search(self, vector, k, exclude=(), min_score=0.0):
+        """Top-k (question_id, cosine score) pairs for a normalized (indices, values) query"""
+        indices, values = vector
+        with self.lock:
+            if k <= 0 or len(indices) == 0:
+                return []
+            
+            scores = np.zeros(len(self.ids), dtype=np.float32)
+            if len(self.features):
+                positions = np.minimum(np.searchsorted(self.features, indices), len(self.features) - 1)
+                matched = self.features[positions] == indices
+                for position, weight in zip(positions[matched], values[matched]):
+                    start, end = self.starts[position], self.starts[position + 1]
+                    scores[self.posting_rows[start:end]] += weight * self.posting_weights[start:end]
+            scores[~self.live] = -np.inf
+            
+            excluded = set(exclude)
+            for question_id in excluded:
+                row = self.rows.get(question_id)
+                if row is not None:
+                    scores[row] = -np.inf
+            
+            candidates = []
+            if len(scores):
+                top = np.argpartition(-scores, min(k, len(scores)) - 1)[:k]
+                candidates = [(self.ids[row], float(scores[row])) for row in top]
+            for question_id, (recent_indices, recent_values) in self.recent.items():
+                if question_id in excluded:
+                    continue
+                _, query_at, recent_at = np.intersect1d(
+                    indices, recent_indices, assume_unique=True, return_indices=True
+                )
+                candidates.append((question_id, float(values[query_at] @ recent_values[recent_at])))
+        
+        candidates.sort(key=lambda candidate: -candidate[1])
+        return [(question_id, score) for question_id, score in candidates[:k] if score > min_score]
+
+
+class SimilarityIndex:
+    """Per-community vector indexes, built lazily and kept current incrementally"""
+    
+    def __init__(self, dim=None, max_features=None):
+        self.dim = dim or settings.SIMILARITY_INDEX_DIM
+        self.max_features = max_features or settings.SIMILARITY_INDEX_MAX_FEATURES
+        self._indexes = {}
+        self._lock = threading.Lock()
+    
+    def _build(self, index, community_id):
+        started = timezone.now()
+        rows = Question.objects.filter(community_id=community_id).values_list('id', 'title', 'content')
+        
+        ids = []
+        vectors = []
+        for question_id, title, content in rows.iterator(chunk_size=2000):
+            ids.append(str(question_id))
+            vectors.append(self._vectorize(title, content))
+        
+        index.reset(ids, vectors)
+        index.built_at = index.checked_at = time.monotonic()
+        index.synced_until = started
+        index.ready.set()
+        # Questions saved while the matrix was built went into the old one
+        self._catch_up(index, community_id)
+    
+    def _catch_up(self, index, community_id):
+        # Picks up questions saved by other processes since the last sync
+        started = timezone.now()
+        rows = Question.objects.filter(
+            community_id=community_id, updated_at__gte=index.synced_until
+        ).values_list('id', 'title', 'content')
+        
+        for question_id, title, content in rows:
+            index.upsert(str(question_id), self._vectorize(title, content))
+        
+        index.checked_at = time.monotonic()
+        index.synced_until = started
+    
+    def _vectorize(self, title, content):
+        return sparse_vectorize(title, content, self.dim, self.max_features)
+    
+    def _refresh(self, index, community_id, rebuild):
+        try:
+            if rebuild:
+                self._build(index, community_id)
+            else:
+                self._catch_up(index, community_id)
+        except Exception as e:
+            print(f"Warning: similarity index refresh for community {community_id} failed - {e}")
+        finally:
+            with self._lock:
+                index.refreshing = False
+            connection.close()
+    
+    def get_index(self, community_id, wait=None):
+        """Index for a community; building and refreshing it happen on a background thread
+
+        Lookups never wait for a rebuild. Only the first lookup of a community
+        waits, at most `wait` seconds (SIMILARITY_INDEX_FIRST_BUILD_WAIT by
+        default), and gets an empty index if the build takes longer.
+        """
+        with self._lock:
+            index = self._indexes.get(community_id)
+            if index is None:
+                index = CommunityVectorIndex()
+                self._indexes[community_id] = index
+            
+            now = time.monotonic()
+            # Periodic full rebuilds drop questions deleted by other processes
+            rebuild = index.built_at is None or now - index.built_at > settings.SIMILARITY_INDEX_REBUILD_INTERVAL
+            due = rebuild or now - index.checked_at > settings.SIMILARITY_INDEX_SYNC_INTERVAL
+            if due and not index.refreshing:
+                index.refreshing = True
+                threading.Thread(
+                    target=self._refresh, args=(index, community_id, rebuild),
+                    name=f"similarity-index-{community_id}", daemon=True
+                ).start()
+        
+        if not index.ready.is_set():
+            index.ready.wait(settings.SIMILARITY_INDEX_FIRST_BUILD_WAIT if wait is None else wait)
+        return index
+    
+    def update_question(self, question):
+        """Add or refresh a saved question in its community index, if that index is loaded"""
+        index = self._indexes.get(question.community_id)
+        if index is not None:
+            index.upsert(str(question.id), self._vectorize(question.title, question.content))
+    
+    def remove_question(self, question):
+        index = self._indexes.get(question.community_id)
+        if index is not None:
+            index.remove(str(question.id))
+    
+    def search(self, community_id, title, content, k=5, exclude_id=None, wait=None, require_ready=False):
+        """Most similar questions in a community as (question_id, score) pairs
+
+        With require_ready, IndexNotReady is raised instead of answering from an
+        index whose first build is still running after `wait` seconds.
+        """
+        index = self.get_index(community_id, wait=wait)
+        if require_ready and not index.ready.is_set():
+            raise IndexNotReady(f"The similarity index of community {community_id} is still being built")
+        exclude = [str(exclude_id)] if exclude_id else []
+        # Queries keep all their features; only stored vectors are trimmed
+        return index.search(
+            sparse_vectorize(title, content, self.dim), k,
+            exclude=exclude, min_score=settings.SIMILARITY_MIN_SCORE
+        )
+    
+    def similar_to(self, question, k=5, wait=None, require_ready=False):
+        return self.search(
+            question.community_id, question.title, question.content, k=k, exclude_id=question.id,
+            wait=wait, require_ready=require_ready
+        )
+
+
+# Global similarity index instance
+similarity_index = SimilarityIndex()
@@ -0,0 +1,53 @@
+import itertools
+import json
+
+from django.http import StreamingHttpResponse
+from rest_framework.renderers import BaseRenderer
+
+
+def sse_event(event, data):
+    """One Server-Sent Event with a JSON payload"""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+class EventStreamRenderer(BaseRenderer):
+    """Lets streaming endpoints accept text/event-stream; errors raised before the stream starts render as an event"""
+    
+    media_type = 'text/event-stream'
+    format = 'sse'
+    charset = 'utf-8'
+    
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return sse_event('error', data).encode('utf-8')
+
+
+def event_stream_response(events, on_done):
+    """Server-Sent Events response for an AIServiceManager stream
+
+    The first event is taken before the response starts, so budget and circuit
+    breaker errors still reach the client as a 429 or 503. on_done(result,
+    ai_service) persists the final result and returns the 'done' payload.
+    """
+    first = next(events, None)
+    events = itertools.chain([first], events) if first is not None else iter([])
+    
+    def body():
+        for event in events:
+            if event[0] == 'delta':
+                yield sse_event('delta', {'text': event[1]})
+            elif event[0] == 'done':
+                try:
+                    payload = on_done(event[1], event[2])
+                except Exception as e:
+                    print(f"Saving streamed AI result failed: {e}")
+                    yield sse_event('error', {'error': 'Failed to save AI result'})
+                    return
+                yield sse_event('done', payload)
+            else:
+                yield sse_event('error', {'error': event[1]})
+    
+    response = StreamingHttpResponse(body(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Stop nginx and similar proxies from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -0,0 +1,221 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from collections import Counter
+
+import numpy as np
+from django.conf import settings
+
+from .models import Question
+from .similarity import vectorize
+
+
+CENTROIDS_FILE = 'centroids.npy'
+IDF_FILE = 'idf.npy'
+TAGS_FILE = 'tags.json'
+# Names the version directory holding the current model files
+CURRENT_FILE = 'CURRENT'
+VERSION_PREFIX = 'model-'
+
+
+def normalize_tag(tag):
+    return ' '.join(str(tag).lower().split())
+
+
+def _tagged_questions():
+    rows = Question.objects.exclude(tags=[]).values_list('title', 'content', 'tags')
+    for title, content, tags in rows.iterator(chunk_size=2000):
+        tags = {normalize_tag(tag) for tag in tags or [] if str(tag).strip()}
+        if tags:
+            yield title, content, tags
+
+
+def _current_version(model_dir):
+    try:
+        with open(os.path.join(model_dir, CURRENT_FILE)) as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+
+def _publish(model_dir, version):
+    """Point readers at a complete version directory; the rename swaps all of its files at once"""
+    tmp_path = os.path.join(model_dir, f"{CURRENT_FILE}.{os.getpid()}.tmp")
+    with open(tmp_path, 'w') as f:
+        f.write(version)
+    os.replace(tmp_path, os.path.join(model_dir, CURRENT_FILE))
+
+
+def _remove_old_versions(model_dir, keep):
+    for name in os.listdir(model_dir):
+        if name.startswith(VERSION_PREFIX) and name not in keep:
+            shutil.rmtree(os.path.join(model_dir, name), ignore_errors=True)
+
+
+def train_tag_model(output_dir=None, min_count=None, max_tags=None, dim=None):
+    """Fit per-tag TF-IDF centroids from human-tagged questions and write them to disk"""
+    output_dir = output_dir or settings.TAG_MODEL_DIR
+    min_count = min_count or settings.TAG_MODEL_MIN_COUNT
+    max_tags = max_tags or settings.TAG_MODEL_MAX_TAGS
+    dim = dim or settings.TAG_MODEL_DIM
+    
+    # First pass: document frequencies and tag vocabulary
+    doc_freq = np.zeros(dim, dtype=np.float64)
+    tag_counts = Counter()
+    documents = 0
+    for title, content, tags in _tagged_questions():
+        doc_freq += vectorize(title, content, dim) != 0
+        tag_counts.update(tags)
+        documents += 1
+    
+    vocabulary = [tag for tag, count in tag_counts.most_common(max_tags) if count >= min_count]
+    if not vocabulary:
+        return {'documents': documents, 'tags': 0}
+    
+    idf = (np.log((documents + 1) / (doc_freq + 1)) + 1).astype(np.float32)
+    tag_index = {tag: i for i, tag in enumerate(vocabulary)}
+    
+    # Second pass: sum the IDF-weighted vectors of every question carrying each tag
+    centroids = np.zeros((len(vocabulary), dim), dtype=np.float32)
+    for title, content, tags in _tagged_questions():
+        vector = vectorize(title, content, dim) * idf
+        norm = np.linalg.norm(vector)
+        if norm == 0:
+            continue
+        vector /= norm
+        for tag in tags:
+            row = tag_index.get(tag)
+            if row is not None:
+                centroids[row] += vector
+    
+    norms = np.linalg.norm(centroids, axis=1, keepdims=True)
+    centroids /= np.where(norms > 0, norms, 1)
+    
+    # Each model gets its own directory, so readers never see files of two different models
+    os.makedirs(output_dir, exist_ok=True)
+    version_dir = tempfile.mkdtemp(prefix=f"{VERSION_PREFIX}{time.strftime('%Y%m%d%H%M%S')}-", dir=output_dir)
+    os.chmod(version_dir, 0o755)
+    version = os.path.basename(version_dir)
+    np.save(os.path.join(version_dir, CENTROIDS_FILE), centroids)
+    np.save(os.path.join(version_dir, IDF_FILE), idf)
+    with open(os.path.join(version_dir, TAGS_FILE), 'w') as f:
+        json.dump({
+            'tags': vocabulary,
+            'counts': [tag_counts[tag] for tag in vocabulary],
+            'documents': documents,
+            'dim': dim,
+            'trained_at': time.time(),
+        }, f)
+    
+    previous = _current_version(output_dir)
+    _publish(output_dir, version)
+    # The previous model stays for processes that are loading it right now
+    _remove_old_versions(output_dir, keep={version, previous})
+    
+    return {'documents': documents, 'tags': len(vocabulary), 'version': version}
+
+
+class TagSuggester:
+    """Serves tag suggestions from the memory-mapped model version CURRENT names, written by train_tag_model"""
+    
+    def __init__(self, model_dir=None):
+        self.model_dir = model_dir or settings.TAG_MODEL_DIR
+        self._lock = threading.Lock()
+        self._model = None
+        self._loaded_version = None
+        self._checked_at = 0
+        self._counters = {'local': 0, 'fallback': 0, 'unavailable': 0}
+    
+    def _load(self):
+        version = _current_version(self.model_dir)
+        if version is None:
+            return None
+        
+        if self._model is not None and version == self._loaded_version:
+            return self._model
+        
+        version_dir = os.path.join(self.model_dir, version)
+        with open(os.path.join(version_dir, TAGS_FILE)) as f:
+            meta = json.load(f)
+        self._model = {
+            'tags': meta['tags'],
+            'dim': meta['dim'],
+            'centroids': np.load(os.path.join(version_dir, CENTROIDS_FILE), mmap_mode='r'),
+            'idf': np.load(os.path.join(version_dir, IDF_FILE)),
+        }
+        self._loaded_version = version
+        return self._model
+    
+    def get_model(self):
+        """Current model, reloading it if a newer one has been trained"""
+        now = time.monotonic()
+        if self._model is not None and now - self._checked_at < settings.TAG_MODEL_RELOAD_INTERVAL:
+            return self._model
+        
+        with self._lock:
+            self._checked_at = now
+            try:
+                return self._load()
+            except Exception as e:
+                print(f"Warning: tag model could not be loaded - {e}")
+                return None
+    
+    def suggest(self, title, content, k=5):
+        """Top-k (tag, score) pairs, or an empty list when no model is trained"""
+        model = self.get_model()
+        if model is None:
+            return []
+        
+        vector = vectorize(title, content, model['dim']) * model['idf']
+        norm = np.linalg.norm(vector)
+        if norm == 0:
+            return []
+        vector /= norm
+        
+        scores = np.asarray(model['centroids'] @ vector)
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        
+        return [
+            (model['tags'][row], float(scores[row]))
+            for row in top
+            if scores[row] >= settings.TAG_MODEL_MIN_TAG_SCORE
+        ]
+    
+    def suggest_if_confident(self, title, content, k=5):
+        """Tags when the local model is confident enough to skip the LLM, otherwise None"""
+        suggestions = self.suggest(title, content, k=k)
+        
+        with self._lock:
+            if self._model is None:
+                self._counters['unavailable'] += 1
+                return None
+            if not suggestions or suggestions[0][1] < settings.TAG_MODEL_CONFIDENCE_THRESHOLD:
+                self._counters['fallback'] += 1
+                return None
+            self._counters['local'] += 1
+        
+        return [tag for tag, score in suggestions]
+    
+    def stats(self):
+        with self._lock:
+            counters = dict(self._counters)
+            loaded = self._model is not None
+            tags = len(self._model['tags']) if loaded else 0
+        
+        requests = sum(counters.values())
+        return {
+            'model_loaded': loaded,
+            'tags': tags,
+            'served_locally': counters['local'],
+            'sent_to_llm': counters['fallback'] + counters['unavailable'],
+            'local_rate': counters['local'] / requests if requests else 0,
+        }
+
+
+# Global tag suggester instance
+tag_suggester = TagSuggester()
@@ -1,3 +1,1611 @@
-from django.test import TestCase
+import asyncio
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib import admin
+from django.core.cache import cache
+from django.db import DatabaseError, connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from communities.models import Community
+from users.models import User
+from .ai_backends import AIBackend, Completion, FakeBackend, OpenAIBackend, get_backend
+from .ai_budget import AIBudgetExceeded, AIBudgetManager, AIRequestTooLarge
+from .ai_jobs import (
+    JOB_HANDLERS, AIJobError, AIJobWorker, claim_next_job, enqueue_job, process_job, requeue_stale_jobs
+)
+from .ai_archive import archive_ai_history, load_archived_record
+from .ai_audit import AIAuditWriter
+from .ai_cache import AIResponseCache
+from .ai_rollups import LATENCY_BUCKETS_MS, percentile, rebuild_rollups, usage_summary
+from .confidence import describe_summary, get_summary, rebuild_summary
+from .learning_paths import get_learning_path
+from .draft_cache import DraftCache, merge_edits
+from .fake_llm import FakeLLM, FakeLLMError, make_fake_llm_server
+from .ai_resilience import AIDeadlineExceeded, AIServiceUnavailable, CircuitBreaker, ResilientCaller
+from .ai_routing import AIRouter
+from .ai_schemas import SCHEMAS, SchemaError, extract_json
+from .ai_services import AIServiceManager, AsyncSingleFlight, LazyAIServiceManager, SingleFlight
+from .tag_model import CURRENT_FILE, TagSuggester, train_tag_model
+from .similarity import CommunityVectorIndex, IndexNotReady, SimilarityIndex, sparse_vectorize
+from .models import (
+    AIBudgetBucket, AIJob, AIService, AIServiceArchive, AIUsageRollup, Answer, ConfidenceSummary, DailyViewerSketch,
+    LearningJournal, LearningPathCache, Question, Vote,
+)
+from .unique_viewers import HyperLogLog, unique_viewers, write_viewers
+from .views import AnswerViewSet
+from .view_counter import ViewCounter
+from .votes import DOWNVOTE, UPVOTE, my_votes, reconcile_vote_counts, toggle_vote
+
+
+class QAFixtures:
+    """An author, a community and a question to hang test data on"""
+    
+    def setUp(self):
+        self.user = User.objects.create_user('alice', 'alice@example.com', 'pw')
+        self.community = Community.objects.create(name='Python', description='d', owner=self.user)
+        self.question = Question.objects.create(
+            title='How do I reverse a list?', content='I tried list.sort()', author=self.user, community=self.community
+        )
+    
+    def make_user(self, username):
+        return User.objects.create_user(username, f"{username}@example.com", 'pw')
+
+
+class ScriptedBackend(AIBackend):
+    """Model backend for tests: answers every prompt with `reply` (or reply(prompt)) and keeps the prompts"""
+    
+    name = 'fake'
+    
+    def __init__(self, reply='{}'):
+        super().__init__()
+        self.reply = reply
+        self.prompts = []
+    
+    def generate(self, prompt, timeout=None, schema=None):
+        self.prompts.append(prompt)
+        text = self.reply(prompt) if callable(self.reply) else self.reply
+        return Completion(text, 10, 20)
+
+
+IMPROVEMENT = '{"improved_title": "How do I reverse a list in Python?", "improved_content": "Details"}'
+
+# Audit rows written right away and no local routing, so every call reaches the backend
+ai_manager_settings = override_settings(
+    AI_AUDIT_BUFFERED=False, AI_ROUTING={**settings.AI_ROUTING, 'enabled': False}
+)
+
+
+@ai_manager_settings
+class AIResponseCacheTests(QAFixtures, TestCase):
+    
+    def cached_row(self, key, expires_in):
+        return AIService.objects.create(
+            service_type='question_improvement', input_text='in', output_text=f"out {key}",
+            cache_key=key, expires_at=timezone.now() + timedelta(seconds=expires_in)
+        )
+    
+    def test_key_is_the_content_address_of_the_request(self):
+        key = AIResponseCache.make_key('question_improvement', 'model', 1, ['A  title', 'Some\ncontent'])
+        self.assertEqual(key, AIResponseCache.make_key('question_improvement', 'model', 1, ['A title', 'Some content']))
+        self.assertNotEqual(key, AIResponseCache.make_key('question_improvement', 'model', 2, ['A title', 'Some content']))
+        self.assertNotEqual(key, AIResponseCache.make_key('question_improvement', 'other', 1, ['A title', 'Some content']))
+    
+    def test_memory_tier_evicts_least_recently_used(self):
+        cache = AIResponseCache(max_entries=2)
+        for key in ('a', 'b'):
+            cache.set(key, key, None, timezone.now() + timedelta(hours=1))
+        cache.get('question_improvement', 'a')
+        cache.set('c', 'c', None, timezone.now() + timedelta(hours=1))
+        
+        self.assertEqual(cache.get('question_improvement', 'a'), ('a', None))
+        self.assertIsNone(cache.get('question_improvement', 'b'))
+        self.assertEqual(cache.stats()['totals']['misses'], 1)
+    
+    def test_database_tier_serves_other_processes(self):
+        row = self.cached_row('k1', expires_in=3600)
+        self.cached_row('k2', expires_in=-1)
+        cache = AIResponseCache()
+        
+        self.assertEqual(cache.get('question_improvement', 'k1'), ('out k1', row))
+        self.assertIsNone(cache.get('question_improvement', 'k2'))
+        # The database hit was copied into memory
+        self.assertEqual(cache.get('question_improvement', 'k1')[0], 'out k1')
+        self.assertEqual(
+            {name: cache.stats()['totals'][name] for name in ('memory_hits', 'db_hits', 'misses')},
+            {'memory_hits': 1, 'db_hits': 1, 'misses': 1}
+        )
+    
+    @override_settings(AI_CACHE_DB_MAX_ENTRIES=2)
+    def test_eviction_keeps_the_audit_rows(self):
+        self.cached_row('expired', expires_in=-1)
+        for key in ('old', 'newer', 'newest'):
+            self.cached_row(key, expires_in=3600)
+        
+        self.assertEqual(AIResponseCache().evict_persistent(), 2)
+        self.assertEqual(AIService.objects.count(), 4)
+        self.assertEqual(set(AIService.objects.exclude(cache_key='').values_list('cache_key', flat=True)),
+                         {'newer', 'newest'})
+    
+    def test_identical_requests_call_the_model_once(self):
+        backend = ScriptedBackend(IMPROVEMENT)
+        manager = AIServiceManager(backend=backend)
+        
+        first, ai_service = manager.improve_question('Reverse a list', 'How?', user=self.user)
+        second, cached = manager.improve_question('Reverse  a list', 'How? ', user=self.user)
+        
+        self.assertEqual(len(backend.prompts), 1)
+        self.assertEqual((second, cached), (first, ai_service))
+        self.assertEqual(AIService.objects.get().cache_key, ai_service.cache_key)
+        # A new manager (another process) finds the response in the database
+        self.assertEqual(AIServiceManager(backend=backend).improve_question('Reverse a list', 'How?')[0], first)
+        self.assertEqual(len(backend.prompts), 1)
+
+
+class SingleFlightTests(SimpleTestCase):
+    
+    def run_concurrently(self, flight, upstream, callers=4):
+        release = threading.Event()
+        
+        def blocked():
+            release.wait(5)
+            return upstream()
+        
+        with ThreadPoolExecutor(callers) as pool:
+            futures = [pool.submit(flight.do, 'key', blocked) for _ in range(callers)]
+            deadline = time.monotonic() + 5
+            while flight.stats()['coalesced_calls'] < callers - 1 and time.monotonic() < deadline:
+                time.sleep(0.01)
+            release.set()
+        return futures
+    
+    def test_concurrent_identical_calls_share_one_upstream_call(self):
+        flight = SingleFlight()
+        upstream = mock.Mock(return_value='result')
+        
+        futures = self.run_concurrently(flight, upstream)
+        
+        self.assertEqual([future.result() for future in futures], ['result'] * 4)
+        self.assertEqual(upstream.call_count, 1)
+        self.assertEqual(flight.stats(), {'upstream_calls': 1, 'coalesced_calls': 3, 'in_flight': 0})
+    
+    def test_followers_share_the_upstream_error(self):
+        flight = SingleFlight()
+        futures = self.run_concurrently(flight, mock.Mock(side_effect=RuntimeError('model down')))
+        
+        for future in futures:
+            with self.assertRaisesMessage(RuntimeError, 'model down'):
+                future.result()
+        # The next call is a new flight
+        self.assertEqual(flight.do('key', lambda: 'again'), 'again')
+
+
+@ai_manager_settings
+@override_settings(AI_BUDGETS={'user': {'capacity': 5000, 'refill_per_hour': 0}})
+class SharedCallBudgetTests(QAFixtures, TestCase):
+    
+    def setUp(self):
+        super().setUp()
+        self.manager = AIServiceManager(backend=ScriptedBackend(IMPROVEMENT))
+        self.bob = self.make_user('bob')
+    
+    def tokens_left(self, user):
+        return AIBudgetBucket.objects.get(scope='user', key=str(user.pk)).tokens
+    
+    def join_flight(self, result=None, error=None):
+        """Make the next call a follower of a flight that ends with result or error"""
+        return mock.patch.multiple(
+            self.manager, single_flight=mock.Mock(do=mock.Mock(return_value=result, side_effect=error)),
+            cache=mock.Mock(get=mock.Mock(return_value=None))
+        )
+    
+    def test_follower_pays_from_its_own_budget(self):
+        result = self.manager.improve_question('Reverse a list', 'How?', user=self.user)
+        
+        with self.join_flight(result):
+            self.assertEqual(self.manager.improve_question('Reverse a list', 'How?', user=self.bob), result)
+        
+        # Both callers are charged the 30 tokens of the one shared call
+        self.assertEqual(self.tokens_left(self.user), 4970)
+        self.assertEqual(self.tokens_left(self.bob), 4970)
+    
+    def test_exhausted_caller_never_joins_the_flight(self):
+        self.manager.improve_question('Warm up', 'the bucket', user=self.bob)
+        AIBudgetBucket.objects.filter(key=str(self.bob.pk)).update(tokens=0)
+        
+        with self.join_flight(('{}', None)):
+            with self.assertRaises(AIBudgetExceeded):
+                self.manager.improve_question('Reverse a list', 'How?', user=self.bob)
+            self.manager.single_flight.do.assert_not_called()
+    
+    def test_failed_flight_gives_the_reservation_back(self):
+        with self.join_flight(error=RuntimeError('model down')):
+            self.assertEqual(self.manager.improve_question('Reverse a list', 'How?', user=self.bob), (None, None))
+        self.assertEqual(self.tokens_left(self.bob), 5000)
+
+
+class QuestionEnrichmentTests(QAFixtures, TestCase):
+    
+    def setUp(self):
+        super().setUp()
+        self.question.ai_status = 'pending'
+        self.question.save()
+        self.manager = AIServiceManager(backend=ScriptedBackend())
+        self.similar_id = str(Question.objects.create(
+            title='Reversing lists', content='c', author=self.user, community=self.community
+        ).pk)
+    
+    def enrich(self, improvement=(IMPROVEMENT, None), tags=('["python", "lists"]', None), similar=None):
+        similar = [(self.similar_id, 0.9)] if similar is None else similar
+        # similar is the lookup's result, or the exception it raises
+        lookup = mock.Mock(side_effect=similar) if isinstance(similar, Exception) else mock.Mock(return_value=similar)
+        with mock.patch.object(self.manager, 'improve_question', return_value=improvement), \
+                mock.patch.object(self.manager, 'suggest_tags', return_value=tags), \
+                mock.patch('qa.ai_services.similarity_index.similar_to', lookup):
+            outcomes = self.manager.enrich_question(self.question)
+        self.question.refresh_from_db()
+        return outcomes
+    
+    def test_every_task_completed(self):
+        outcomes = self.enrich()
+        
+        self.assertEqual(outcomes, {'improvement': 'completed', 'tags': 'completed', 'similar': 'completed'})
+        self.assertEqual(self.question.ai_status, 'completed')
+        self.assertEqual(self.question.ai_improved_title, 'How do I reverse a list in Python?')
+        # The dedicated tag suggestion wins over the improvement's tags
+        self.assertEqual(self.question.ai_suggested_tags, ['python', 'lists'])
+        self.assertEqual(self.question.ai_similar_questions, [self.similar_id])
+    
+    def test_some_tasks_failed(self):
+        outcomes = self.enrich(tags=(None, None))
+        
+        self.assertEqual(outcomes['tags'], 'failed')
+        self.assertEqual(self.question.ai_status, 'partial')
+        self.assertEqual(self.question.ai_improved_content, 'Details')
+    
+    def test_nothing_completed_leaves_the_status(self):
+        outcomes = self.enrich(improvement=(None, None), tags=(None, None), similar=RuntimeError('index down'))
+        
+        self.assertNotIn('completed', outcomes.values())
+        self.assertEqual(self.question.ai_status, 'pending')
+    
+    def test_lookup_waiting_for_the_index_is_not_completed(self):
+        outcomes = self.enrich(similar=IndexNotReady('building'))
+        
+        self.assertEqual(outcomes['similar'], 'not_ready')
+        self.assertEqual(self.question.ai_status, 'partial')
+        self.assertEqual(self.question.ai_similar_questions, [])
+    
+    def test_local_tasks_run_without_a_backend(self):
+        self.manager.backend = None
+        outcomes = self.enrich()
+        
+        self.assertEqual(outcomes, {'improvement': 'unavailable', 'tags': 'completed', 'similar': 'completed'})
+        self.assertEqual(self.question.ai_status, 'partial')
+        self.assertEqual(self.question.ai_suggested_tags, ['python', 'lists'])
+        self.assertEqual(self.question.ai_improved_title, '')
+    
+    def test_model_tasks_run_concurrently(self):
+        def slow(result):
+            def call(*args, **kwargs):
+                time.sleep(0.3)
+                return result
+            return call
+        
+        started = time.monotonic()
+        with mock.patch.object(self.manager, 'improve_question', side_effect=slow((IMPROVEMENT, None))), \
+                mock.patch.object(self.manager, 'suggest_tags', side_effect=slow(('["python"]', None))), \
+                mock.patch('qa.ai_services.similarity_index.similar_to', return_value=[]):
+            outcomes = self.manager.enrich_question(self.question)
+        
+        self.assertLess(time.monotonic() - started, 0.55)
+        self.assertEqual(outcomes['improvement'], 'completed')
+        self.assertEqual(outcomes['tags'], 'completed')
+
+
+class SimilarityIndexTests(QAFixtures, TestCase):
+    
+    def setUp(self):
+        super().setUp()
+        self.index = SimilarityIndex()
+        self.related = self.ask('Reverse a Python list', 'How do I reverse a list in Python without sorting it?')
+        self.ask('Docker compose ports', 'My docker compose service does not expose its network ports')
+        self.ask('React hooks state', 'useState does not update the component state right away')
+    
+    def ask(self, title, content):
+        return Question.objects.create(title=title, content=content, author=self.user, community=self.community)
+    
+    def build(self):
+        # Built in this thread, which can see the test transaction
+        community_index = CommunityVectorIndex()
+        self.index._indexes[self.community.pk] = community_index
+        self.index._build(community_index, self.community.pk)
+        return community_index
+    
+    def similar_ids(self, question, **kwargs):
+        return [question_id for question_id, score in self.index.similar_to(question, **kwargs)]
+    
+    def test_vectors_are_sparse_unit_vectors(self):
+        text = ' '.join(f"word{i}" for i in range(500))
+        indices, values = sparse_vectorize('A long post', text, max_features=128)
+        
+        self.assertEqual(len(indices), 128)
+        self.assertTrue((indices[1:] > indices[:-1]).all())
+        self.assertAlmostEqual(float(values @ values), 1.0, places=5)
+        self.assertEqual(len(sparse_vectorize('', '')[0]), 0)
+    
+    def test_related_question_ranks_first(self):
+        self.build()
+        
+        self.assertEqual(self.similar_ids(self.question)[:1], [str(self.related.pk)])
+        self.assertNotIn(str(self.question.pk), self.similar_ids(self.question))
+        self.assertEqual(len(self.similar_ids(self.question, k=1)), 1)
+    
+    def test_saved_and_deleted_questions_update_a_built_index(self):
+        community_index = self.build()
+        
+        with mock.patch('qa.signals.similarity_index', self.index):
+            newer = self.ask('Reversing a list in Python', 'Is reversed() faster than slicing a list?')
+            self.related.title, self.related.content = 'Kubernetes ingress', 'Ingress returns 404 for every path'
+            self.related.save()
+            
+            self.assertEqual(self.similar_ids(self.question)[:1], [str(newer.pk)])
+            self.assertNotIn(str(self.related.pk), self.similar_ids(self.question))
+            
+            newer.delete()
+        self.assertNotIn(str(newer.pk), self.similar_ids(self.question))
+        self.assertEqual(len(community_index), 4)
+    
+    def test_lookup_can_require_a_built_index(self):
+        with mock.patch.object(self.index, '_refresh'):
+            self.assertEqual(self.index.similar_to(self.question, wait=0), [])
+            with self.assertRaises(IndexNotReady):
+                self.index.similar_to(self.question, wait=0, require_ready=True)
+    
+    @override_settings(AI_JOB_MAX_ATTEMPTS=2)
+    def test_enrichment_job_retries_until_the_index_is_built(self):
+        enqueue_job('question_enrichment', question=self.question)
+        manager = mock.Mock()
+        manager.enrich_question.return_value = {'improvement': 'completed', 'tags': 'completed', 'similar': 'not_ready'}
+        
+        with mock.patch('qa.ai_services.ai_manager', manager):
+            job = claim_next_job('worker-1')
+            self.assertFalse(process_job(job))
+            self.assertEqual(AIJob.objects.get(pk=job.pk).status, 'pending')
+            
+            # The last attempt keeps what it has
+            AIJob.objects.filter(pk=job.pk).update(run_after=timezone.now())
+            self.assertTrue(process_job(claim_next_job('worker-1')))
+        
+        manager.enrich_question.assert_called_with(
+            mock.ANY, allow_local=True, index_wait=settings.SIMILARITY_INDEX_JOB_WAIT
+        )
+
+
+@override_settings(TAG_MODEL_MIN_COUNT=2, TAG_MODEL_RELOAD_INTERVAL=0, TAG_MODEL_CONFIDENCE_THRESHOLD=0.3)
+class TagModelTests(QAFixtures, TestCase):
+    
+    def setUp(self):
+        super().setUp()
+        self.model_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.model_dir, ignore_errors=True)
+        self.ask('Reverse a python list', 'How do I reverse a list in python?', ['python'])
+        self.ask('Python dict comprehension', 'Build a python dict from a list', ['python'])
+        self.ask('Join tables in SQL', 'How do I join two SQL tables with a foreign key?', ['sql'])
+        self.ask('SQL group by count', 'Count rows per group in a SQL table', ['sql'])
+    
+    def ask(self, title, content, tags):
+        return Question.objects.create(
+            title=title, content=content, tags=tags, author=self.user, community=self.community
+        )
+    
+    def test_suggests_tags_from_trained_model(self):
+        result = train_tag_model(self.model_dir)
+        self.assertEqual(result['tags'], 2)
+        
+        suggester = TagSuggester(self.model_dir)
+        self.assertEqual(suggester.suggest('SQL join', 'join two SQL tables', k=1)[0][0], 'sql')
+        self.assertEqual(suggester.suggest_if_confident('python list', 'reverse a python list', k=1), ['python'])
+    
+    def test_without_a_model_the_llm_is_asked(self):
+        suggester = TagSuggester(self.model_dir)
+        self.assertEqual(suggester.suggest('SQL join', 'join two SQL tables'), [])
+        self.assertIsNone(suggester.suggest_if_confident('SQL join', 'join two SQL tables'))
+        self.assertEqual(suggester.stats()['sent_to_llm'], 1)
+    
+    def test_retraining_swaps_the_whole_model_at_once(self):
+        first = train_tag_model(self.model_dir)['version']
+        suggester = TagSuggester(self.model_dir)
+        self.assertEqual(len(suggester.get_model()['tags']), 2)
+        
+        self.ask('Rust borrow checker', 'rust lifetimes and the borrow checker', ['rust'])
+        self.ask('Rust traits', 'implement a rust trait for a struct', ['rust'])
+        second = train_tag_model(self.model_dir)['version']
+        
+        with open(os.path.join(self.model_dir, CURRENT_FILE)) as f:
+            self.assertEqual(f.read(), second)
+        self.assertEqual(len(suggester.get_model()['tags']), 3)
+        
+        # Only the current model and the one before it are kept
+        third = train_tag_model(self.model_dir)['version']
+        self.assertEqual(sorted(n for n in os.listdir(self.model_dir) if n != CURRENT_FILE), sorted([second, third]))
+        self.assertNotIn(first, os.listdir(self.model_dir))
+
+
+# Opens on the first failure and lets one trial call through 0.1s later
+BREAKER = {
+    'window': 60, 'min_calls': 1, 'failure_rate': 0.5, 'slow_call_rate': 1.0,
+    'slow_call_seconds': 10, 'reset_timeout': 0.1, 'half_open_calls': 1,
+}
+
+
+class TransientError(Exception):
+    status_code = 503
+
+
+@override_settings(
+    AI_CIRCUIT_BREAKER=BREAKER, AI_RETRY={'attempts': 3, 'base_delay': 0, 'max_delay': 0}, AI_HEDGE_DELAY=0.05
+)
+class ResilienceTests(SimpleTestCase):
+    
+    def half_open(self, breaker):
+        breaker.before_call()
+        breaker.record(0, failed=True)
+        time.sleep(BREAKER['reset_timeout'])
+    
+    def test_breaker_opens_and_closes_after_trial(self):
+        breaker = CircuitBreaker('test')
+        breaker.before_call()
+        breaker.record(0, failed=True)
+        with self.assertRaises(AIServiceUnavailable) as raised:
+            breaker.before_call()
+        self.assertEqual(raised.exception.wait, 1)
+        
+        time.sleep(BREAKER['reset_timeout'])
+        breaker.before_call()
+        self.assertEqual(breaker.state, CircuitBreaker.HALF_OPEN)
+        breaker.record(0, failed=False)
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+    
+    def test_unanswered_trial_reopens_the_breaker(self):
+        breaker = CircuitBreaker('test')
+        self.half_open(breaker)
+        breaker.before_call()
+        
+        # The trial call never reports back
+        time.sleep(BREAKER['reset_timeout'])
+        with self.assertRaises(AIServiceUnavailable):
+            breaker.before_call()
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        
+        time.sleep(BREAKER['reset_timeout'])
+        breaker.before_call()
+        self.assertEqual(breaker.state, CircuitBreaker.HALF_OPEN)
+    
+    def test_transient_errors_are_retried(self):
+        replies = [TransientError('busy'), 'ok']
+        
+        def fn(timeout):
+            reply = replies.pop(0)
+            if isinstance(reply, Exception):
+                raise reply
+            return reply
+        
+        # min_calls of 1 would open the breaker on the first failure
+        with override_settings(AI_CIRCUIT_BREAKER={**BREAKER, 'min_calls': 10}):
+            caller = ResilientCaller('test')
+            self.assertEqual(caller.call(fn, deadline=5), 'ok')
+        self.assertEqual(caller.stats()['retries'], 1)
+    
+    def test_bad_requests_are_not_retried(self):
+        caller = ResilientCaller('test')
+        error = ValueError('bad prompt')
+        error.status_code = 400
+        fn = mock.Mock(side_effect=error)
+        
+        with self.assertRaises(ValueError):
+            caller.call(fn, deadline=5)
+        self.assertEqual(fn.call_count, 1)
+        self.assertEqual(caller.breaker.state, CircuitBreaker.CLOSED)
+    
+    def test_deadline(self):
+        caller = ResilientCaller('test')
+        release = threading.Event()
+        self.addCleanup(release.set)
+        with self.assertRaises(AIDeadlineExceeded):
+            caller.call(lambda timeout: release.wait(), deadline=0.1)
+        self.assertEqual(caller.stats()['timeouts'], 1)
+    
+    def test_losing_hedge_gives_back_its_trial_slot(self):
+        release = threading.Event()
+        self.addCleanup(release.set)
+        replies = iter([lambda: release.wait() and 'slow', lambda: 'fast'])
+        
+        with override_settings(AI_CIRCUIT_BREAKER={**BREAKER, 'half_open_calls': 2}):
+            caller = ResilientCaller('test')
+            self.half_open(caller.breaker)
+            self.assertEqual(caller.call(lambda timeout: next(replies)(), deadline=5, hedge=True), 'fast')
+            self.assertEqual(caller.stats()['hedge_wins'], 1)
+            
+            # The second trial slot is free again, so one more success closes the breaker
+            self.assertEqual(caller.call(lambda timeout: 'ok', deadline=5), 'ok')
+        self.assertEqual(caller.breaker.state, CircuitBreaker.CLOSED)
+    
+    def test_cancelled_async_call_gives_back_its_trial_slot(self):
+        caller = ResilientCaller('test')
+        self.half_open(caller.breaker)
+        
+        async def hang(timeout):
+            await asyncio.sleep(60)
+        
+        async def ok(timeout):
+            return 'ok'
+        
+        async def scenario():
+            task = asyncio.ensure_future(caller.acall(hang, deadline=5))
+            await asyncio.sleep(0.01)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+            return await caller.acall(ok, deadline=5)
+        
+        self.assertEqual(asyncio.run(scenario()), 'ok')
+        self.assertEqual(caller.breaker.state, CircuitBreaker.CLOSED)
+    
+    def test_closed_stream_gives_back_its_trial_slot(self):
+        caller = ResilientCaller('test')
+        self.half_open(caller.breaker)
+        
+        chunks = caller.stream(lambda timeout: iter(['a', 'b', 'c']), deadline=5)
+        self.assertEqual(next(chunks), 'a')
+        # The client disconnected
+        chunks.close()
+        
+        self.assertEqual(list(caller.stream(lambda timeout: iter(['a', 'b']), deadline=5)), ['a', 'b'])
+        self.assertEqual(caller.breaker.state, CircuitBreaker.CLOSED)
+
+
+class AIBackendTests(SimpleTestCase):
+    
+    prompt = 'Improve this question. Respond in JSON format: {"improved_title": "...", "improved_content": "..."}'
+    
+    def test_fake_llm_echoes_the_requested_format(self):
+        text, prompt_tokens, completion_tokens = FakeLLM().complete(self.prompt)
+        self.assertEqual(json.loads(text), {'improved_title': '...', 'improved_content': '...'})
+        self.assertGreater(prompt_tokens, 0)
+        self.assertGreater(completion_tokens, 0)
+    
+    def test_fake_llm_failures_are_seeded(self):
+        def outcomes():
+            fake = FakeLLM(error_rate=0.5, seed=7)
+            results = []
+            for _ in range(20):
+                try:
+                    fake.complete(self.prompt)
+                    results.append(True)
+                except FakeLLMError:
+                    results.append(False)
+            return results
+        
+        first = outcomes()
+        self.assertEqual(first, outcomes())
+        self.assertIn(True, first)
+        self.assertIn(False, first)
+    
+    def test_fake_llm_times_out(self):
+        fake = FakeLLM(latency={'distribution': 'fixed', 'seconds': 5})
+        with self.assertRaises(TimeoutError):
+            fake.complete(self.prompt, timeout=0.01)
+    
+    def test_streamed_completion_collects_text_and_tokens(self):
+        completion = FakeBackend(fake=FakeLLM()).stream(self.prompt)
+        chunks = list(completion)
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual(''.join(chunks), FakeLLM.render(self.prompt))
+        self.assertEqual(completion.text, FakeLLM.render(self.prompt))
+        self.assertIsNotNone(completion.completion_tokens)
+    
+    def test_get_backend(self):
+        self.assertIsInstance(get_backend('fake'), FakeBackend)
+        with self.assertRaises(ValueError):
+            get_backend('nope')
+    
+    def test_openai_backend_against_fake_server(self):
+        server = make_fake_llm_server('127.0.0.1', 0, FakeLLM())
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        
+        with override_settings(OPENAI_BASE_URL=f"http://127.0.0.1:{server.server_address[1]}/v1"):
+            backend = OpenAIBackend('fake-llm')
+            completion = backend.generate(self.prompt, timeout=5)
+            streamed = backend.stream(self.prompt, timeout=5)
+            ''.join(streamed)
+        
+        self.assertEqual(completion.text, FakeLLM.render(self.prompt))
+        self.assertEqual(completion.prompt_tokens, streamed.prompt_tokens)
+        self.assertEqual(streamed.text, completion.text)
+
+
+class LazyAIManagerTests(SimpleTestCase):
+    
+    def test_import_loads_no_model_sdk(self):
+        code = (
+            "import sys, django; django.setup(); import stackit_backend.urls, qa.ai_services; "
+            "print(any(m in sys.modules for m in ('google.generativeai', 'openai')))"
+        )
+        output = subprocess.run(
+            [sys.executable, '-c', code], capture_output=True, text=True, check=True,
+            env={**os.environ, 'PYTHONPATH': os.pathsep.join(sys.path)}
+        ).stdout
+        self.assertEqual(output.strip().splitlines()[-1], 'False')
+    
+    def test_concurrent_first_use_builds_one_manager(self):
+        lazy = LazyAIServiceManager()
+        started = threading.Barrier(8)
+        
+        def first_use():
+            started.wait()
+            return lazy.model_name
+        
+        with mock.patch('qa.ai_services.AIServiceManager', side_effect=lambda: time.sleep(0.01) or mock.Mock()) as cls:
+            with ThreadPoolExecutor(max_workers=8) as executor:
+                list(executor.map(lambda _: first_use(), range(8)))
+        self.assertEqual(cls.call_count, 1)
+
+
+def audit(writer, processing_time=0.15, **fields):
+    return writer.record(
+        service_type='tag_suggestion', input_text='in', output_text='out', processing_time=processing_time,
+        prompt_tokens=10, completion_tokens=5, tokens_used=15, **fields
+    )
+
+
+@override_settings(AI_AUDIT_BUFFERED=True, AI_AUDIT_BATCH_SIZE=2, AI_AUDIT_MAX_BUFFER=2)
+class AIAuditWriterTests(TestCase):
+    
+    def setUp(self):
+        self.writer = AIAuditWriter()
+        # Flushed by the tests themselves instead of the background thread
+        patcher = mock.patch.object(self.writer, '_ensure_thread')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+    
+    def test_records_are_written_in_one_batch(self):
+        first = audit(self.writer)
+        self.assertIsNotNone(first.id)
+        self.assertIsNotNone(first.created_at)
+        self.assertFalse(AIService.objects.exists())
+        
+        audit(self.writer)
+        # A full batch wakes the writer thread up early
+        self.assertTrue(self.writer._wakeup.is_set())
+        
+        with self.assertNumQueries(1):
+            with mock.patch.object(AIAuditWriter, '_roll_up'):
+                self.assertEqual(self.writer.flush(), 2)
+        self.assertTrue(AIService.objects.filter(id=first.id).exists())
+        self.assertEqual(self.writer.stats()['written'], 2)
+    
+    def test_flush_rolls_up_usage(self):
+        audit(self.writer)
+        self.writer.flush()
+        rollup = AIUsageRollup.objects.get(period='hour')
+        self.assertEqual((rollup.calls, rollup.prompt_tokens, rollup.completion_tokens), (1, 10, 5))
+    
+    def test_failed_flush_keeps_a_bounded_buffer(self):
+        for _ in range(3):
+            audit(self.writer)
+        
+        with mock.patch.object(AIService.objects, 'bulk_create', side_effect=DatabaseError('down')):
+            self.assertEqual(self.writer.flush(), 0)
+        stats = self.writer.stats()
+        self.assertEqual((stats['buffered'], stats['dropped'], stats['failed_batches']), (2, 1, 1))
+        
+        self.assertEqual(self.writer.flush(), 2)
+        self.assertEqual(AIService.objects.count(), 2)
+    
+    def test_closed_writer_writes_right_away(self):
+        self.writer.close()
+        ai_service = audit(self.writer)
+        self.assertTrue(AIService.objects.filter(id=ai_service.id).exists())
+
+
+@override_settings(AI_AUDIT_BUFFERED=False)
+class AIUsageRollupTests(TestCase):
+    
+    def setUp(self):
+        writer = AIAuditWriter()
+        # 90 fast calls and 10 slow ones
+        for i in range(100):
+            audit(writer, processing_time=0.15 if i < 90 else 4.0)
+    
+    def test_percentiles_interpolate_within_a_bucket(self):
+        histogram = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        histogram[2] = 100  # 100-200ms
+        self.assertEqual(percentile(histogram, 50), 150)
+        self.assertIsNone(percentile([0] * len(histogram), 50))
+    
+    def test_summary_is_read_from_rollups(self):
+        with self.assertNumQueries(1):
+            usage = usage_summary(timezone.now() - timedelta(hours=1))
+        
+        self.assertEqual(usage['period'], 'hour')
+        totals = usage['totals']
+        self.assertEqual((totals['count'], totals['prompt_tokens']), (100, 1000))
+        self.assertTrue(100 <= totals['latency_ms']['p50'] <= 200)
+        self.assertTrue(3000 <= totals['latency_ms']['p95'] <= 5000)
+        self.assertEqual(usage_summary(timezone.now() - timedelta(days=7))['period'], 'day')
+    
+    def test_rebuild_matches_incremental_rollups(self):
+        def rollups():
+            return sorted(AIUsageRollup.objects.values_list('period', 'calls', 'prompt_tokens', 'latency_histogram'))
+        
+        incremental = rollups()
+        rebuild_rollups()
+        self.assertEqual(rollups(), incremental)
+    
+    def test_stats_endpoint(self):
+        response = self.client.get('/api/ai-services/stats/', {'hours': 1})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['total_services'], 100)
+        self.assertEqual(self.client.get('/api/ai-services/stats/', {'period': 'week'}).status_code, 400)
+
+
+@override_settings(AI_AUDIT_BUFFERED=False)
+class AIArchiveTests(TestCase):
+    
+    def setUp(self):
+        self.archive_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.archive_dir, ignore_errors=True)
+        writer = AIAuditWriter()
+        self.old = [audit(writer) for _ in range(3)]
+        self.recent = audit(writer)
+        AIService.objects.exclude(id=self.recent.id).update(created_at=timezone.now() - timedelta(days=100))
+    
+    def test_old_records_move_to_cold_storage(self):
+        self.assertEqual(archive_ai_history(days=90, chunk_size=2, archive_dir=self.archive_dir), 3)
+        self.assertEqual(list(AIService.objects.values_list('id', flat=True)), [self.recent.id])
+        
+        record = load_archived_record(AIServiceArchive.objects.get(id=self.old[0].id))
+        self.assertEqual((record['id'], record['output_text']), (str(self.old[0].id), 'out'))
+    
+    def test_deduplicated_outputs_are_loaded_from_their_first_record(self):
+        archive_ai_history(days=90, dedupe=True, archive_dir=self.archive_dir)
+        self.assertEqual(AIServiceArchive.objects.filter(output_stored=True).count(), 1)
+        
+        for entry in AIServiceArchive.objects.all():
+            self.assertEqual(load_archived_record(entry)['output_text'], 'out')
+    
+    def test_archives_in_the_default_directory_store_the_file_name(self):
+        with override_settings(AI_ARCHIVE_DIR=self.archive_dir):
+            archive_ai_history(days=90)
+            entry = AIServiceArchive.objects.first()
+            self.assertFalse(os.path.isabs(entry.archive_file))
+            self.assertEqual(load_archived_record(entry)['output_text'], 'out')
+    
+    def test_live_cache_entries_are_kept(self):
+        AIService.objects.filter(id=self.old[0].id).update(expires_at=timezone.now() + timedelta(hours=1))
+        self.assertEqual(archive_ai_history(days=90, archive_dir=self.archive_dir), 2)
+        self.assertTrue(AIService.objects.filter(id=self.old[0].id).exists())
+
+
+@ai_manager_settings
+class StructuredOutputTests(QAFixtures, TestCase):
+    
+    def test_extract_json_from_model_prose(self):
+        self.assertEqual(extract_json('```json\n{"a": 1}\n```'), {'a': 1})
+        self.assertEqual(extract_json('Sure! Here it is: {"a": [1, 2,],} Hope it helps {x}'), {'a': [1, 2]})
+        self.assertEqual(extract_json('Tags: ["python", "lists"]', opening='['), ['python', 'lists'])
+        with self.assertRaises(SchemaError):
+            extract_json('No JSON here')
+    
+    def test_fields_are_coerced_and_defaulted(self):
+        parsed = SCHEMAS['question_improvement'].parse(
+            '{"improved_title": " Title ", "improved_content": "Body", "confidence_score": "12", '
+            '"suggested_tags": "python, lists"}'
+        )
+        self.assertEqual(parsed['improved_title'], 'Title')
+        self.assertEqual(parsed['confidence_score'], 10)
+        self.assertEqual(parsed['suggested_tags'], ['python', 'lists'])
+        self.assertEqual(parsed['similar_questions'], [])
+        
+        with self.assertRaises(SchemaError):
+            SCHEMAS['question_improvement'].parse('{"improved_title": "Title"}')
+        self.assertEqual(SCHEMAS['tag_suggestion'].parse('{"tags": ["python"]}'), ['python'])
+    
+    def test_unparseable_response_gets_one_repair_call(self):
+        backend = ScriptedBackend(lambda prompt: IMPROVEMENT if 'could not be parsed' in prompt else 'Sorry, no JSON')
+        manager = AIServiceManager(backend=backend)
+        
+        result, ai_service = manager.improve_question('Reverse a list', 'How?', user=self.user)
+        
+        self.assertEqual(len(backend.prompts), 2)
+        self.assertEqual(json.loads(result)['improved_title'], 'How do I reverse a list in Python?')
+        self.assertEqual(ai_service.metadata['parse'], 'repaired')
+        # Both calls are charged
+        self.assertEqual(ai_service.tokens_used, 60)
+        stats = manager.parse_stats.stats()
+        self.assertEqual(sum(v['repaired'] for k, v in stats.items() if k.startswith('question_improvement@')), 1)
+    
+    def test_failed_repair_is_not_cached(self):
+        backend = ScriptedBackend('Sorry, no JSON')
+        manager = AIServiceManager(backend=backend)
+        
+        self.assertEqual(manager.improve_question('Reverse a list', 'How?', user=self.user), (None, None))
+        manager.improve_question('Reverse a list', 'How?', user=self.user)
+        self.assertEqual(len(backend.prompts), 4)
+
+
+class ConfidenceSummaryTests(QAFixtures, TestCase):
+    
+    SUMMARY_FIELDS = [
+        'answer_count', 'confidence_sum', 'confidence_sq_sum', 'indexed_confidence_sum', 'ewma',
+        'recent_confidences', 'accepted_count', 'accepted_confidence_sum', 'brier_sum', 'calibration_bands',
+    ]
+    
+    def setUp(self):
+        super().setUp()
+        self.answers = [
+            Answer.objects.create(question=self.question, author=self.user, content='a', confidence_level=level)
+            for level in (20, 40, 60, 80, 90)
+        ]
+        self.answers[-1].accept_answer()
+    
+    def assertMatchesRebuild(self):
+        incremental = ConfidenceSummary.objects.get(user=self.user)
+        rebuilt = rebuild_summary(self.user.pk)
+        for field in self.SUMMARY_FIELDS:
+            expected, actual = getattr(rebuilt, field), getattr(incremental, field)
+            if isinstance(expected, float):
+                self.assertAlmostEqual(actual, expected, msg=field)
+            else:
+                self.assertEqual(actual, expected, msg=field)
+    
+    def test_incremental_summary_matches_rebuild(self):
+        self.assertMatchesRebuild()
+    
+    def test_edits_and_deletes_rebuild_the_summary(self):
+        self.answers[0].confidence_level = 70
+        self.answers[0].save()
+        self.answers[1].delete()
+        
+        summary = ConfidenceSummary.objects.get(user=self.user)
+        self.assertEqual((summary.answer_count, summary.confidence_sum), (4, 300))
+        self.assertMatchesRebuild()
+    
+    def test_description_of_a_rising_trend(self):
+        trend = describe_summary(get_summary(self.user))
+        self.assertEqual((trend['answers'], trend['mean_confidence'], trend['accepted_answers']), (5, 58.0, 1))
+        self.assertEqual(trend['slope_per_answer'], 18.0)
+        self.assertEqual(trend['acceptance_by_confidence']['75-100'], 0.5)
+        self.assertEqual(describe_summary(None), {'answers': 0})
+    
+    def test_only_the_summary_is_sent_to_the_model(self):
+        self.client.force_login(self.user)
+        with mock.patch('qa.views.ai_manager') as manager:
+            manager.analyze_confidence_trend.return_value = ('{"trend_analysis": "Rising"}', None)
+            response = self.client.post('/api/learning-journal/analyze_confidence_trend/')
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['trend']['answers'], 5)
+        sent = manager.analyze_confidence_trend.call_args[0][0]
+        self.assertEqual(sent, describe_summary(get_summary(self.user)))
+
+
+class LearningPathTests(QAFixtures, TestCase):
+    
+    def setUp(self):
+        super().setUp()
+        self.community.members.add(self.user)
+        patcher = mock.patch('qa.ai_services.ai_manager')
+        self.manager = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.manager.suggest_learning_path.return_value = ('{"skill_level": "beginner"}', None)
+    
+    def assertServedFromCache(self, stale):
+        entry, is_stale = get_learning_path(self.user)
+        self.assertEqual((entry.content['skill_level'], is_stale), ('beginner', stale))
+        self.assertEqual(self.manager.suggest_learning_path.call_count, 1)
+    
+    def test_path_is_generated_once(self):
+        entry, stale = get_learning_path(self.user)
+        self.assertFalse(stale)
+        self.assertServedFromCache(stale=False)
+    
+    def test_journal_activity_marks_the_path_stale(self):
+        get_learning_path(self.user)
+        LearningJournal.objects.create(user=self.user, activity_type='answer_given', title='t', description='d')
+        
+        self.assertTrue(LearningPathCache.objects.get(user=self.user).is_stale)
+        # The stale path is served while a refresh is queued
+        self.assertServedFromCache(stale=True)
+        self.assertTrue(AIJob.objects.filter(job_type='learning_path', user=self.user).exists())
+    
+    def test_new_community_question_marks_member_paths_stale(self):
+        get_learning_path(self.user)
+        Question.objects.create(title='New', content='c', author=self.make_user('bob'), community=self.community)
+        self.assertServedFromCache(stale=True)
+    
+    def test_activity_counters_change_the_fingerprint(self):
+        get_learning_path(self.user)
+        User.objects.filter(pk=self.user.pk).update(total_points=100)
+        self.user.refresh_from_db()
+        self.assertServedFromCache(stale=True)
+
+
+class DraftCacheTests(QAFixtures, TestCase):
+    
+    content = (
+        'I have a long list of numbers and I want to reverse it in place without making a copy, because the '
+        'list is very large and memory is tight. I tried list.sort() with reverse=True but that sorts the items.'
+    )
+    improvement = {
+        'improved_title': 'How do I reverse a Python list in place?',
+        'improved_content': f"{content}\n\nI am using Python 3.12.",
+    }
+    
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.drafts = DraftCache()
+        self.drafts.store('s1', 'Reverse a list', self.content, self.improvement)
+    
+    def test_same_draft_reuses_the_improvement(self):
+        self.assertEqual(self.drafts.lookup('s1', 'Reverse a list.', self.content), (self.improvement, 'near_duplicate'))
+        self.assertIsNone(self.drafts.lookup('s2', 'Reverse a list', self.content))
+    
+    def test_small_content_edit_is_merged_into_the_improvement(self):
+        edited = self.content.replace('very large', 'really large')
+        improvement, served_from = self.drafts.lookup('s1', 'Reverse a list', edited)
+        self.assertEqual(served_from, 'near_duplicate_merged')
+        self.assertEqual(improvement['improved_content'], f"{edited}\n\nI am using Python 3.12.")
+        self.assertEqual(improvement['improved_title'], self.improvement['improved_title'])
+    
+    def test_changed_title_is_sent_to_the_model(self):
+        self.assertIsNone(self.drafts.lookup('s1', 'Reverse a tuple', self.content))
+        self.assertEqual(self.drafts.stats()['misses'], 1)
+    
+    def test_unplaceable_edit_is_not_merged(self):
+        self.assertIsNone(merge_edits('a b c', 'a x c', 'completely different text'))
+    
+    @ai_manager_settings
+    def test_draft_endpoint_calls_the_model_once_per_title(self):
+        backend = ScriptedBackend(IMPROVEMENT)
+        self.client.force_login(self.user)
+        with mock.patch('qa.views.ai_manager', AIServiceManager(backend=backend)):
+            for title in ('Reverse a list', 'Reverse a list!', 'Reverse a tuple'):
+                response = self.client.post(
+                    '/api/questions/improve_draft_with_ai/', {'title': title, 'content': self.content}
+                )
+                self.assertEqual(response.status_code, 200)
+        
+        self.assertEqual(response.json()['served_from'], 'model')
+        self.assertEqual(len(backend.prompts), 2)
+
+
+FEEDBACK = '{"assessment_score": 6, "feedback": "Explain why reversed() works"}'
+
+
+@override_settings(AI_AUDIT_BUFFERED=False)
+class AIRoutingTests(QAFixtures, TestCase):
+    
+    def setUp(self):
+        super().setUp()
+        self.backend = ScriptedBackend(FEEDBACK)
+        self.manager = AIServiceManager(backend=self.backend)
+        self.answer = Answer.objects.create(question=self.question, author=self.user, content='Use reversed().')
+    
+    def test_questions_are_classified(self):
+        router = AIRouter()
+        self.assertEqual(router.route_question('Sort a list', 'How do I sort a list?').reason, 'trivial')
+        french = router.route_question('Comment trier une liste ?', "Je voudrais trier une liste d'entiers. Merci")
+        self.assertEqual(french.tier, 'model')
+        long_content = ' '.join(['Here is what I tried with the list and what happened instead.'] * 40)
+        self.assertEqual(router.route_question('Reverse a list', long_content).reason, 'complex')
+    
+    def test_user_requested_feedback_always_reaches_the_model(self):
+        result, ai_service = self.manager.provide_answer_feedback('Use reversed().', 'Reverse a list')
+        self.assertEqual(json.loads(result)['feedback'], 'Explain why reversed() works')
+        self.assertEqual(len(self.backend.prompts), 1)
+        
+        self.client.force_login(self.user)
+        with mock.patch('qa.views.ai_manager', AIServiceManager(backend=self.backend)):
+            response = self.client.post(f"/api/answers/{self.answer.id}/get_ai_feedback/")
+        self.assertEqual(response.json()['feedback'], 'Explain why reversed() works')
+        self.assertEqual(len(self.backend.prompts), 2)
+    
+    def test_background_feedback_on_short_answers_is_local(self):
+        result, ai_service = self.manager.provide_answer_feedback('Use reversed().', 'Reverse a list', allow_local=True)
+        self.assertIsNone(ai_service)
+        self.assertIn('very short', json.loads(result)['feedback'])
+        self.assertEqual(self.backend.prompts, [])
+        
+        long_answer = 'Call reversed() on the list, or slice it with a step of -1, which works on tuples and strings too.'
+        self.manager.provide_answer_feedback(long_answer, 'Reverse a list', allow_local=True)
+        self.assertEqual(len(self.backend.prompts), 1)
+    
+    def test_answer_feedback_job_routes_locally(self):
+        with mock.patch('qa.ai_services.ai_manager', self.manager):
+            enqueue_job('answer_feedback', answer=self.answer)
+            self.assertTrue(process_job(claim_next_job('worker-1')))
+        self.answer.refresh_from_db()
+        self.assertIn('very short', self.answer.ai_feedback)
+        self.assertEqual(self.backend.prompts, [])
+
+
+@ai_manager_settings
+class AIStreamingTests(QAFixtures, TestCase):
+    
+    def setUp(self):
+        super().setUp()
+        self.answer = Answer.objects.create(question=self.question, author=self.user, content='Use reversed().')
+        self.client.force_login(self.user)
+    
+    def stream(self, backend, action):
+        with mock.patch('qa.views.ai_manager', AIServiceManager(backend=backend)):
+            response = self.client.post(
+                f"/api/answers/{self.answer.id}/{action}/stream/", HTTP_ACCEPT='text/event-stream'
+            )
+            body = b''.join(response.streaming_content).decode('utf-8')
+        events = []
+        for block in body.strip().split('\n\n'):
+            event, data = block.split('\n')
+            events.append((event[len('event: '):], json.loads(data[len('data: '):])))
+        return response, events
+    
+    def test_improvement_is_streamed_in_chunks_and_saved(self):
+        response, events = self.stream(FakeBackend(fake=FakeLLM()), 'improve_with_ai')
+        
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        deltas = [data['text'] for event, data in events if event == 'delta']
+        self.assertGreater(len(deltas), 1)
+        self.assertEqual(events[-1], ('done', {
+            'message': 'Answer improved with AI', 'improved_content': ''.join(deltas)
+        }))
+        self.answer.refresh_from_db()
+        self.assertEqual(self.answer.ai_improved_content, ''.join(deltas))
+    
+    def test_feedback_is_validated_and_saved_when_complete(self):
+        response, events = self.stream(ScriptedBackend(FEEDBACK), 'get_ai_feedback')
+        
+        self.assertEqual(events[-1][0], 'done')
+        self.assertEqual(events[-1][1]['feedback'], 'Explain why reversed() works')
+        self.answer.refresh_from_db()
+        self.assertEqual((self.answer.ai_feedback, self.answer.ai_status), ('Explain why reversed() works', 'completed'))
+    
+    def test_errors_before_the_first_event_keep_their_status(self):
+        backend = ScriptedBackend(FEEDBACK)
+        with mock.patch.object(AIServiceManager, '_stream', side_effect=AIServiceUnavailable(wait=5)):
+            with mock.patch('qa.views.ai_manager', AIServiceManager(backend=backend)):
+                response = self.client.post(
+                    f"/api/answers/{self.answer.id}/get_ai_feedback/stream/", HTTP_ACCEPT='text/event-stream'
+                )
+        
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '5')
+        self.assertTrue(response.content.startswith(b'event: error\n'))
+
+
+@override_settings(AI_JOB_MAX_ATTEMPTS=2, AI_JOB_RETRY_DELAY=30, AI_JOB_STALE_AFTER=600)
+class AIJobQueueTests(QAFixtures, TestCase):
+    
+    def test_enqueue_reuses_queued_job(self):
+        job = enqueue_job('question_improvement', question=self.question)
+        self.assertEqual(enqueue_job('question_improvement', question=self.question), job)
+        
+        AIJob.objects.filter(pk=job.pk).update(status='completed')
+        self.assertNotEqual(enqueue_job('question_improvement', question=self.question), job)
+    
+    def test_claim_takes_each_runnable_job_once(self):
+        later = enqueue_job('question_improvement', question=self.question)
+        AIJob.objects.filter(pk=later.pk).update(run_after=timezone.now() + timedelta(hours=1))
+        job = enqueue_job('question_enrichment', question=self.question)
+        
+        claimed = claim_next_job('worker-1')
+        self.assertEqual(claimed.pk, job.pk)
+        self.assertEqual((claimed.status, claimed.locked_by, claimed.attempts), ('running', 'worker-1', 1))
+        # The other job is not due yet
+        self.assertIsNone(claim_next_job('worker-2'))
+    
+    def test_failures_back_off_then_fail_the_target(self):
+        enqueue_job('question_improvement', question=self.question)
+        failing = mock.Mock(side_effect=AIJobError('no result'))
+        
+        with mock.patch.dict(JOB_HANDLERS, {'question_improvement': failing}):
+            job = claim_next_job('worker-1')
+            self.assertFalse(process_job(job))
+            job.refresh_from_db()
+            self.assertEqual((job.status, job.last_error, job.locked_by), ('pending', 'no result', ''))
+            self.assertGreater(job.run_after, timezone.now() + timedelta(seconds=25))
+            
+            AIJob.objects.filter(pk=job.pk).update(run_after=timezone.now())
+            job = claim_next_job('worker-1')
+            self.assertFalse(process_job(job))
+        
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('failed', 2))
+        self.question.refresh_from_db()
+        self.assertEqual(self.question.ai_status, 'failed')
+    
+    def test_budget_exhaustion_requeues_without_using_an_attempt(self):
+        enqueue_job('question_improvement', question=self.question)
+        throttled = mock.Mock(side_effect=AIBudgetExceeded('user', 120))
+        
+        with mock.patch.dict(JOB_HANDLERS, {'question_improvement': throttled}):
+            job = claim_next_job('worker-1')
+            process_job(job)
+        
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('pending', 0))
+        self.assertGreater(job.run_after, timezone.now() + timedelta(seconds=100))
+    
+    def test_stale_running_jobs_are_requeued(self):
+        stale = enqueue_job('question_improvement', question=self.question)
+        fresh = enqueue_job('question_enrichment', question=self.question)
+        AIJob.objects.filter(pk=stale.pk).update(status='running', locked_at=timezone.now() - timedelta(hours=1))
+        AIJob.objects.filter(pk=fresh.pk).update(status='running', locked_at=timezone.now())
+        
+        self.assertEqual(requeue_stale_jobs(), 1)
+        self.assertEqual(AIJob.objects.get(pk=stale.pk).status, 'pending')
+        self.assertEqual(AIJob.objects.get(pk=fresh.pk).status, 'running')
+    
+    def test_job_that_keeps_killing_workers_fails(self):
+        job = enqueue_job('question_improvement', question=self.question)
+        abandoned_at = timezone.now() - timedelta(hours=1)
+        for _ in range(2):
+            claim_next_job('worker-1')
+            AIJob.objects.filter(pk=job.pk).update(locked_at=abandoned_at)
+            requeue_stale_jobs()
+        
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('failed', 2))
+        self.question.refresh_from_db()
+        self.assertEqual(self.question.ai_status, 'failed')
+    
+    def test_running_worker_sweeps_for_abandoned_jobs(self):
+        job = enqueue_job('question_improvement', question=self.question)
+        AIJob.objects.filter(pk=job.pk).update(status='running', attempts=1, locked_at=timezone.now() - timedelta(hours=1))
+        handler = mock.Mock(return_value={'done': True})
+        worker = AIJobWorker('worker-1', threading.Event(), drain=True)
+        
+        # Run in this thread so the worker sees the test transaction
+        with mock.patch.dict(JOB_HANDLERS, {'question_improvement': handler}), \
+                mock.patch('qa.ai_jobs.connection.close'):
+            worker.run()
+        
+        self.assertEqual(worker.processed, 1)
+        self.assertEqual(AIJob.objects.get(pk=job.pk).status, 'completed')
+    
+    def test_job_list_rejects_malformed_filters(self):
+        job = enqueue_job('question_improvement', question=self.question)
+        
+        response = self.client.get('/api/ai-jobs/', {'question': str(self.question.pk)})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row['id'] for row in response.json()['results']], [str(job.pk)])
+        
+        self.assertEqual(self.client.get('/api/ai-jobs/', {'question': 'not-a-uuid'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/ai-jobs/', {'status': 'exploded'}).status_code, 400)
+
+
+class VoteTests(QAFixtures, TestCase):
+    
+    def setUp(self):
+        super().setUp()
+        self.answer = Answer.objects.create(question=self.question, author=self.user, content='Use reversed()')
+        self.voter = self.make_user('bob')
+    
+    def assertCounts(self, upvotes, downvotes):
+        self.answer.refresh_from_db()
+        self.assertEqual(
+            (self.answer.upvote_count, self.answer.downvote_count, self.answer.score),
+            (upvotes, downvotes, upvotes - downvotes)
+        )
+    
+    def test_repeating_a_vote_withdraws_it(self):
+        self.assertEqual(toggle_vote(self.answer, self.voter, UPVOTE), 'added')
+        self.assertCounts(1, 0)
+        self.assertEqual(toggle_vote(self.answer, self.voter, UPVOTE), 'removed')
+        self.assertCounts(0, 0)
+        self.assertFalse(Vote.objects.exists())
+    
+    def test_switching_a_vote_moves_both_counters(self):
+        toggle_vote(self.answer, self.voter, UPVOTE)
+        self.assertEqual(toggle_vote(self.answer, self.voter, DOWNVOTE), 'added')
+        self.assertCounts(0, 1)
+        self.assertEqual(Vote.objects.get().value, DOWNVOTE)
+    
+    def test_votes_of_several_users(self):
+        toggle_vote(self.answer, self.voter, UPVOTE)
+        toggle_vote(self.answer, self.make_user('carol'), UPVOTE)
+        toggle_vote(self.answer, self.make_user('dave'), DOWNVOTE)
+        self.assertCounts(2, 1)
+        self.assertEqual(my_votes(self.voter, [self.answer.pk]), {self.answer.pk: UPVOTE})
+    
+    def test_reconcile_repairs_drifted_counts(self):
+        toggle_vote(self.answer, self.voter, DOWNVOTE)
+        Answer.objects.filter(pk=self.answer.pk).update(upvote_count=7, score=7)
+        
+        self.assertEqual(reconcile_vote_counts(), 1)
+        self.assertCounts(0, 1)
+        self.assertEqual(reconcile_vote_counts(), 0)
+    
+    def stale_answer(self):
+        """The answer as loaded before bob's upvote"""
+        stale = Answer.objects.select_related('question').get(pk=self.answer.pk)
+        toggle_vote(self.answer, self.voter, UPVOTE)
+        return stale
+    
+    def post_with_stale_answer(self, action, **kwargs):
+        self.client.force_login(self.voter)
+        with mock.patch.object(AnswerViewSet, 'get_object', return_value=self.stale_answer()):
+            return self.client.post(f"/api/answers/{self.answer.pk}/{action}/", **kwargs)
+    
+    def test_accepting_keeps_votes(self):
+        self.stale_answer().accept_answer()
+        self.assertCounts(1, 0)
+        self.assertTrue(self.answer.is_accepted)
+    
+    def test_mentor_verification_keeps_votes(self):
+        User.objects.filter(pk=self.voter.pk).update(is_mentor=True)
+        self.community.mentors.add(self.voter)
+        self.assertEqual(self.post_with_stale_answer('verify_as_mentor').status_code, 200)
+        self.assertCounts(1, 0)
+        self.assertTrue(self.answer.mentor_verified)
+    
+    def test_ai_improvement_keeps_votes(self):
+        with mock.patch('qa.views.ai_manager') as manager:
+            manager.improve_answer.return_value = ('Use reversed() or slicing', None)
+            self.assertEqual(self.post_with_stale_answer('improve_with_ai').status_code, 200)
+        self.assertCounts(1, 0)
+        self.assertEqual(self.answer.ai_improved_content, 'Use reversed() or slicing')
+    
+    def test_async_ai_improvement_keeps_votes(self):
+        stale = self.stale_answer()
+        self.client.force_login(self.voter)
+        with mock.patch('qa.async_views.aget_object_or_404', mock.AsyncMock(return_value=stale)), \
+                mock.patch('qa.async_views.ai_manager') as manager:
+            manager.aimprove_answer = mock.AsyncMock(return_value=('Use reversed() or slicing', None))
+            response = self.client.post(f"/api/async/answers/{self.answer.pk}/improve_with_ai/")
+        self.assertEqual(response.status_code, 200)
+        self.assertCounts(1, 0)
+    
+    def test_edits_keep_votes(self):
+        self.client.force_login(self.user)
+        with mock.patch.object(AnswerViewSet, 'get_object', return_value=self.stale_answer()):
+            response = self.client.patch(
+                f"/api/answers/{self.answer.pk}/", {'content': 'Use list.reverse()'}, content_type='application/json'
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertCounts(1, 0)
+        self.assertEqual(self.answer.content, 'Use list.reverse()')
+    
+    def test_admin_edits_keep_votes(self):
+        stale = self.stale_answer()
+        stale.content = 'Use list.reverse()'
+        admin.site._registry[Answer].save_model(None, stale, mock.Mock(changed_data=['content']), change=True)
+        self.assertCounts(1, 0)
+        self.assertEqual(self.answer.content, 'Use list.reverse()')
+
+
+class QuestionSerializationQueryTests(QAFixtures, TestCase):
+    
+    def setUp(self):
+        super().setUp()
+        self.community.members.add(self.user)
+        self.add_questions(1)
+    
+    def add_questions(self, count):
+        for i in range(count):
+            author = self.make_user(f"author{Question.objects.count()}")
+            question = Question.objects.create(
+                title=f"Question {i}", content='c', author=author, community=self.community
+            )
+            for j in range(2):
+                answer = Answer.objects.create(question=question, author=author, content=f"Answer {j}")
+                toggle_vote(answer, self.user, UPVOTE)
+            answer.accept_answer()
+    
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries), response
+    
+    def assertConstantQueries(self, url):
+        before, _ = self.count_queries(url)
+        self.add_questions(5)
+        after, response = self.count_queries(url)
+        self.assertEqual(after, before)
+        return response
+    
+    def test_question_list(self):
+        response = self.assertConstantQueries('/api/questions/')
+        self.assertEqual(response.json()['count'], 7)
+    
+    def test_question_list_with_my_votes(self):
+        self.client.force_login(self.user)
+        self.assertConstantQueries('/api/questions/')
+    
+    def test_question_detail(self):
+        self.client.force_login(self.user)
+        before, _ = self.count_queries(f"/api/questions/{self.question.id}/")
+        for i in range(5):
+            Answer.objects.create(question=self.question, author=self.make_user(f"extra{i}"), content='a')
+        after, response = self.count_queries(f"/api/questions/{self.question.id}/")
+        
+        self.assertEqual(after, before)
+        self.assertEqual(len(response.json()['answers']), 5)
+
+
+class UnifiedVotesMigrationTests(TransactionTestCase):
+    """0012_unified_votes moves the upvote and downvote M2M rows into Vote"""
+    
+    before = [('qa', '0011_answer_vote_counts')]
+    after = [('qa', '0012_unified_votes')]
+    
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+    
+    def test_votes_are_moved_and_recounted(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.before)
+        apps = executor.loader.project_state(self.before).apps
+        
+        HistoricalUser = apps.get_model('users', 'User')
+        users = [HistoricalUser.objects.create(username=f"user{i}", email=f"user{i}@example.com") for i in range(4)]
+        community = apps.get_model('communities', 'Community').objects.create(
+            name='Python', description='d', owner=users[0], invite_code='abc'
+        )
+        question = apps.get_model('qa', 'Question').objects.create(
+            title='t', content='c', author=users[0], community=community
+        )
+        answer = apps.get_model('qa', 'Answer').objects.create(question=question, author=users[0], content='a')
+        answer.upvotes.add(users[0], users[1], users[3])
+        answer.downvotes.add(users[2], users[3])
+        
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(self.after)
+        apps = executor.loader.project_state(self.after).apps
+        
+        votes = dict(apps.get_model('qa', 'Vote').objects.values_list('user__username', 'value'))
+        # user3 was in both sets, which added nothing to the score, so they keep no vote
+        self.assertEqual(votes, {'user0': 1, 'user1': 1, 'user2': -1})
+        migrated = apps.get_model('qa', 'Answer').objects.get(pk=answer.pk)
+        self.assertEqual((migrated.upvote_count, migrated.downvote_count, migrated.score), (2, 1, 1))
+
+
+# A long interval keeps the counter's background thread asleep, so the tests flush explicitly
+@override_settings(VIEW_COUNT_BUFFERED=True, VIEW_COUNT_FLUSH_INTERVAL=3600, VIEW_COUNT_BATCH_SIZE=500)
+class ViewCounterTests(QAFixtures, TestCase):
+    
+    def setUp(self):
+        super().setUp()
+        self.counter = ViewCounter()
+    
+    def view_count(self):
+        return Question.objects.get(pk=self.question.pk).view_count
+    
+    def test_views_are_buffered_until_flush(self):
+        updated_at = self.question.updated_at
+        for _ in range(5):
+            self.counter.record(self.question.pk)
+        self.assertEqual(self.view_count(), 0)
+        
+        self.assertEqual(self.counter.flush(), 5)
+        self.assertEqual(self.view_count(), 5)
+        self.assertEqual(Question.objects.get(pk=self.question.pk).updated_at, updated_at)
+    
+    def test_one_update_per_batch_of_questions(self):
+        other = Question.objects.create(title='t', content='c', author=self.user, community=self.community)
+        self.counter.record(self.question.pk, views=3)
+        self.counter.record(other.pk, views=2)
+        
+        with self.assertNumQueries(1):
+            self.counter.flush()
+        self.assertEqual(self.view_count(), 3)
+        self.assertEqual(Question.objects.get(pk=other.pk).view_count, 2)
+    
+    def test_failed_flush_keeps_the_views(self):
+        self.counter.record(self.question.pk, views=4)
+        with mock.patch.object(ViewCounter, '_write', side_effect=RuntimeError('database down')):
+            self.assertEqual(self.counter.flush(), 0)
+        self.assertEqual(self.counter.stats()['pending_views'], 4)
+        
+        self.counter.record(self.question.pk)
+        self.assertEqual(self.counter.flush(), 5)
+        self.assertEqual(self.view_count(), 5)
+    
+    @override_settings(VIEW_COUNT_BUFFERED=False)
+    def test_unbuffered_views_are_written_right_away(self):
+        self.counter.record(self.question.pk)
+        self.assertEqual(self.view_count(), 1)
+    
+    def flush_views_then_improve(self, *args, **kwargs):
+        """AI reply that arrives after a flush has added views to the question"""
+        self.counter.record(self.question.pk, views=3)
+        self.counter.flush()
+        return IMPROVEMENT, 'fake'
+    
+    def test_ai_improvement_keeps_flushed_views(self):
+        self.client.force_login(self.user)
+        with mock.patch('qa.views.ai_manager') as manager:
+            manager.improve_question.side_effect = self.flush_views_then_improve
+            response = self.client.post(f"/api/questions/{self.question.pk}/improve_with_ai/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.view_count(), 3)
+        self.assertEqual(Question.objects.get(pk=self.question.pk).ai_improved_content, 'Details')
+    
+    def test_async_ai_improvement_keeps_flushed_views(self):
+        self.client.force_login(self.user)
+        with mock.patch('qa.async_views.ai_manager') as manager:
+            manager.aimprove_question = mock.AsyncMock(side_effect=sync_to_async(self.flush_views_then_improve))
+            response = self.client.post(f"/api/async/questions/{self.question.pk}/improve_with_ai/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.view_count(), 3)
+
+
+class HyperLogLogTests(SimpleTestCase):
+    
+    def hashes(self, n, seed):
+        rng = random.Random(seed)
+        return [rng.getrandbits(64) for _ in range(n)]
+    
+    def test_estimates_within_error_bounds(self):
+        for n in (100, 5000, 200000):
+            sketch = HyperLogLog(12)
+            hashes = self.hashes(n, seed=n)
+            sketch.add(hashes)
+            sketch.add(hashes[:n // 2])  # Repeat viewers are not counted again
+            self.assertLess(abs(sketch.count() - n), 3 * sketch.standard_error * n, n)
+    
+    def test_merge_is_the_union(self):
+        a_hashes, b_hashes = self.hashes(3000, seed=1), self.hashes(3000, seed=2)
+        a, b, union = HyperLogLog(12), HyperLogLog(12), HyperLogLog(12)
+        a.add(a_hashes + b_hashes[:1000])
+        b.add(b_hashes)
+        union.add(a_hashes + b_hashes)
+        self.assertTrue((HyperLogLog.merge([a, b]).registers == union.registers).all())
+    
+    def test_fold_matches_a_smaller_sketch(self):
+        hashes = self.hashes(20000, seed=3)
+        large, small = HyperLogLog(14), HyperLogLog(12)
+        large.add(hashes)
+        small.add(hashes)
+        self.assertTrue((large.fold(12).registers == small.registers).all())
+        self.assertEqual(HyperLogLog.merge([large, small]).precision, 12)
+    
+    def test_bytes_round_trip(self):
+        sketch = HyperLogLog(12)
+        sketch.add(self.hashes(500, seed=4))
+        restored = HyperLogLog.from_bytes(sketch.to_bytes())
+        self.assertEqual(restored.precision, 12)
+        self.assertTrue((restored.registers == sketch.registers).all())
+        self.assertEqual(HyperLogLog.from_bytes(b'').count(), 0)
+
+
+@override_settings(UNIQUE_VIEWERS_PRECISION=12, UNIQUE_VIEWERS_DAILY=True)
+class UniqueViewersTests(QAFixtures, TestCase):
+    
+    def test_daily_sketches_merge_into_weekly_uniques(self):
+        today = timezone.localdate()
+        rng = random.Random(5)
+        regulars = [rng.getrandbits(64) for _ in range(100)]
+        newcomers = [rng.getrandbits(64) for _ in range(50)]
+        write_viewers({
+            (self.question.pk, today - timedelta(days=2)): regulars,
+            (self.question.pk, today - timedelta(days=1)): regulars + newcomers,
+            (self.question.pk, today): regulars,
+        })
+        
+        self.assertEqual(DailyViewerSketch.objects.filter(question=self.question).count(), 3)
+        weekly = unique_viewers(self.question, days=7)
+        self.assertAlmostEqual(weekly['unique_viewers'], 150, delta=3)
+        for day, expected in zip(weekly['daily'], [100, 150, 100]):
+            self.assertAlmostEqual(day['unique_viewers'], expected, delta=3)
+        self.assertLessEqual(weekly['low'], 150)
+        self.assertGreaterEqual(weekly['high'], 150)
+        self.assertAlmostEqual(unique_viewers(self.question)['unique_viewers'], 150, delta=3)
+    
+    def test_endpoint_counts_a_refreshing_viewer_once(self):
+        self.client.force_login(self.user)
+        with override_settings(VIEW_COUNT_BUFFERED=False):
+            for _ in range(10):
+                self.client.post(f"/api/questions/{self.question.pk}/increment_view/")
+        
+        response = self.client.get(f"/api/questions/{self.question.pk}/unique_viewers/")
+        self.assertEqual(response.json()['unique_viewers'], 1)
+        self.assertEqual(Question.objects.get(pk=self.question.pk).view_count, 10)
+        self.assertEqual(self.client.get(f"/api/questions/{self.question.pk}/unique_viewers/?days=0").status_code, 400)
+    
+    def test_ai_improvement_keeps_the_viewer_sketch(self):
+        rng = random.Random(6)
+        viewers = [rng.getrandbits(64) for _ in range(40)]
+        
+        def view_then_improve(*args, **kwargs):
+            write_viewers({(self.question.pk, timezone.localdate()): viewers})
+            return IMPROVEMENT, 'fake'
+        
+        self.client.force_login(self.user)
+        with mock.patch('qa.views.ai_manager') as manager:
+            manager.improve_question.side_effect = view_then_improve
+            self.client.post(f"/api/questions/{self.question.pk}/improve_with_ai/")
+        self.assertAlmostEqual(unique_viewers(self.question)['unique_viewers'], 40, delta=2)
+
+
+@override_settings(AI_BUDGETS={'user': {'capacity': 1000, 'refill_per_hour': 0}})
+class AIBudgetTests(QAFixtures, TestCase):
+    
+    def test_processes_share_one_budget(self):
+        web, worker = AIBudgetManager(), AIBudgetManager()
+        web.reserve(600, user=self.user)
+        with self.assertRaises(AIBudgetExceeded):
+            worker.reserve(600, user=self.user)
+        
+        # Unused reserved tokens go back to the shared bucket
+        reservation = worker.reserve(400, user=self.user)
+        web.settle(reservation, 100)
+        worker.reserve(300, user=self.user)
+    
+    def test_oversized_request_is_a_413(self):
+        with self.assertRaises(AIRequestTooLarge) as raised:
+            AIBudgetManager().reserve(1001, user=self.user)
+        self.assertEqual(raised.exception.status_code, 413)
+
+
+class AsyncSingleFlightTests(SimpleTestCase):
+    
+    def test_cancelled_leader_does_not_cancel_followers(self):
+        flight = AsyncSingleFlight()
+        calls = []
+        
+        async def upstream():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return 'result'
+        
+        async def scenario():
+            leader = asyncio.create_task(flight.do('key', upstream))
+            await asyncio.sleep(0)
+            follower = asyncio.create_task(flight.do('key', upstream))
+            await asyncio.sleep(0)
+            leader.cancel()
+            return await follower, leader.cancelled()
+        
+        self.assertEqual(asyncio.run(scenario()), ('result', True))
+        self.assertEqual(len(calls), 1)
+    
+    def test_call_is_cancelled_once_nobody_waits(self):
+        flight = AsyncSingleFlight()
+        finished = []
+        
+        async def upstream():
+            await asyncio.sleep(0.05)
+            finished.append(1)
+        
+        async def scenario():
+            caller = asyncio.create_task(flight.do('key', upstream))
+            await asyncio.sleep(0)
+            caller.cancel()
+            await asyncio.sleep(0.1)
+        
+        asyncio.run(scenario())
+        self.assertEqual(finished, [])
+        self.assertEqual(flight.stats()['in_flight'], 0)
@@ -0,0 +1,177 @@
+import hashlib
+import math
+import zlib
+from collections import defaultdict
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Question, DailyViewerSketch
+
+
+class HyperLogLog:
+    """HyperLogLog sketch of 64-bit viewer hashes: 2**precision one-byte registers, mergeable by register max"""
+    
+    def __init__(self, precision=None, registers=None):
+        self.precision = precision or settings.UNIQUE_VIEWERS_PRECISION
+        if registers is None:
+            registers = np.zeros(1 << self.precision, dtype=np.uint8)
+        self.registers = registers
+    
+    @classmethod
+    def from_bytes(cls, data):
+        """Sketch stored by to_bytes(); empty data is an empty sketch"""
+        if not data:
+            return cls()
+        data = zlib.decompress(bytes(data))
+        return cls(data[0], np.frombuffer(data, dtype=np.uint8, offset=1).copy())
+    
+    def to_bytes(self):
+        # A precision byte then the registers; sketches of rarely viewed questions are mostly zeros and compress well
+        return zlib.compress(bytes([self.precision]) + self.registers.tobytes())
+    
+    def add(self, hashes):
+        """Add 64-bit viewer hashes"""
+        remainder_bits = 64 - self.precision
+        mask = (1 << remainder_bits) - 1
+        indexes, ranks = [], []
+        for value in hashes:
+            indexes.append(value >> remainder_bits)
+            # Position of the first 1 bit after the register index (leading zeros + 1)
+            ranks.append(remainder_bits - (value & mask).bit_length() + 1)
+        np.maximum.at(self.registers, np.array(indexes, dtype=np.intp), np.array(ranks, dtype=np.uint8))
+    
+    def fold(self, precision):
+        """The same sketch with fewer registers, so sketches of different precisions can be merged"""
+        if precision >= self.precision:
+            return self
+        
+        shift = self.precision - precision
+        indexes = np.arange(len(self.registers))
+        dropped = indexes & ((1 << shift) - 1)
+        # Index bits dropped from the register number become the leading bits of the remainder
+        ranks = np.where(
+            dropped > 0,
+            shift - np.floor(np.log2(np.maximum(dropped, 1))).astype(np.int64),
+            shift + self.registers.astype(np.int64)
+        )
+        ranks[self.registers == 0] = 0
+        registers = np.zeros(1 << precision, dtype=np.uint8)
+        np.maximum.at(registers, indexes >> shift, ranks.astype(np.uint8))
+        return HyperLogLog(precision, registers)
+    
+    @classmethod
+    def merge(cls, sketches):
+        """Sketch of the union of the viewers counted by each sketch"""
+        sketches = list(sketches)
+        if not sketches:
+            return cls()
+        precision = min(sketch.precision for sketch in sketches)
+        registers = np.maximum.reduce([sketch.fold(precision).registers for sketch in sketches])
+        return cls(precision, registers)
+    
+    @property
+    def standard_error(self):
+        """Relative standard error of count()"""
+        return 1.04 / math.sqrt(len(self.registers))
+    
+    def count(self):
+        """Estimated number of distinct hashes added"""
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / np.ldexp(1.0, -self.registers.astype(np.int64)).sum()
+        # Small cardinalities are counted far more accurately from the share of empty registers
+        zeros = m - np.count_nonzero(self.registers)
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * math.log(m / zeros)
+        return round(estimate)
+
+
+def viewer_hash(request):
+    """Keyed 64-bit hash identifying who viewed: the user, else the session, else address and user agent"""
+    if request.user.is_authenticated:
+        identity = f"user:{request.user.pk}"
+    elif getattr(request, 'session', None) is not None and request.session.session_key:
+        identity = f"session:{request.session.session_key}"
+    else:
+        identity = f"anon:{request.META.get('REMOTE_ADDR', '')}:{request.META.get('HTTP_USER_AGENT', '')}"
+    # Keyed, so the stored registers cannot be matched against guessed identities
+    digest = hashlib.blake2b(
+        identity.encode('utf-8'), digest_size=8, key=settings.SECRET_KEY.encode('utf-8')[:64]
+    ).digest()
+    return int.from_bytes(digest, 'big')
+
+
+def write_viewers(viewers):
+    """Add viewer hashes to the all-time and daily sketches; viewers maps (question_id, day) to hashes"""
+    by_question = defaultdict(dict)
+    for (question_id, day), hashes in viewers.items():
+        by_question[question_id][day] = hashes
+    days = {day for question_days in by_question.values() for day in question_days}
+    
+    with transaction.atomic():
+        # Locking the questions serializes sketch updates from every process, daily rows included
+        questions = list(
+            Question.objects.select_for_update().filter(pk__in=list(by_question)).only('id', 'viewer_sketch')
+        )
+        for question in questions:
+            sketch = HyperLogLog.from_bytes(question.viewer_sketch)
+            for hashes in by_question[question.pk].values():
+                sketch.add(hashes)
+            question.viewer_sketch = sketch.to_bytes()
+        Question.objects.bulk_update(questions, ['viewer_sketch'])
+        
+        if not settings.UNIQUE_VIEWERS_DAILY:
+            return
+        
+        existing = {
+            (row.question_id, row.day): row
+            for row in DailyViewerSketch.objects.filter(question_id__in=[q.pk for q in questions], day__in=days)
+        }
+        created, updated = [], []
+        for question in questions:
+            for day, hashes in by_question[question.pk].items():
+                row = existing.get((question.pk, day))
+                if row is None:
+                    row = DailyViewerSketch(question_id=question.pk, day=day)
+                    created.append(row)
+                else:
+                    updated.append(row)
+                sketch = HyperLogLog.from_bytes(row.sketch)
+                sketch.add(hashes)
+                row.sketch = sketch.to_bytes()
+        DailyViewerSketch.objects.bulk_create(created)
+        DailyViewerSketch.objects.bulk_update(updated, ['sketch'])
+
+
+def _estimate(sketch):
+    count = sketch.count()
+    # About 95% of estimates fall within two standard errors
+    margin = math.ceil(2 * sketch.standard_error * count)
+    return {'unique_viewers': count, 'low': max(count - margin, 0), 'high': count + margin}
+
+
+def unique_viewers(question, days=None):
+    """Approximate distinct viewers of a question, all time or over the last `days` days with a daily breakdown"""
+    if days is None:
+        data = Question.objects.filter(pk=question.pk).values_list('viewer_sketch', flat=True).first()
+        sketch = HyperLogLog.from_bytes(data)
+        return {**_estimate(sketch), 'standard_error': round(sketch.standard_error, 4)}
+    
+    since = timezone.localdate() - timedelta(days=days - 1)
+    daily = [
+        (day, HyperLogLog.from_bytes(data))
+        for day, data in DailyViewerSketch.objects.filter(question=question, day__gte=since)
+        .order_by('day').values_list('day', 'sketch')
+    ]
+    # Weekly and monthly uniques are the union of the daily sketches, not their sum
+    sketch = HyperLogLog.merge(day_sketch for _, day_sketch in daily)
+    return {
+        **_estimate(sketch),
+        'standard_error': round(sketch.standard_error, 4),
+        'days': days,
+        'daily': [{'day': day, **_estimate(day_sketch)} for day, day_sketch in daily],
+    }
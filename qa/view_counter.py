@@ -0,0 +1,130 @@
+import atexit
+import threading
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Case, F, IntegerField, Value, When
+from django.utils import timezone
+
+from .models import Question
+from .unique_viewers import write_viewers
+
+
+class ViewCounter:
+    """Buffers question view increments in memory and adds them to view_count in batched UPDATEs
+
+    Viewer hashes are buffered alongside and merged into the HyperLogLog
+    sketches of qa.unique_viewers on the same flush.
+    """
+    
+    def __init__(self):
+        self._pending = Counter()
+        self._viewers = defaultdict(set)  # (question_id, day) -> viewer hashes
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._closed = False
+        self._counters = {'recorded': 0, 'flushed': 0, 'updates': 0, 'failed_flushes': 0}
+    
+    def record(self, question_id, views=1, viewer=None):
+        """Count views of a question (by a viewer_hash(), if given); they reach the database on the next flush"""
+        viewers = {(question_id, timezone.localdate()): {viewer}} if viewer is not None else {}
+        if not settings.VIEW_COUNT_BUFFERED or self._closed:
+            self._write({question_id: views})
+            if viewers:
+                write_viewers(viewers)
+            return
+        
+        with self._lock:
+            self._pending[question_id] += views
+            self._counters['recorded'] += views
+            for key, hashes in viewers.items():
+                self._viewers[key].update(hashes)
+            full = max(len(self._pending), len(self._viewers)) >= settings.VIEW_COUNT_BATCH_SIZE
+            self._ensure_thread()
+        
+        if full:
+            self._wakeup.set()
+    
+    def _ensure_thread(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='view-counter', daemon=True)
+            self._thread.start()
+            atexit.register(self.close)
+    
+    def _run(self):
+        try:
+            while not self._closed:
+                self._wakeup.wait(settings.VIEW_COUNT_FLUSH_INTERVAL)
+                self._wakeup.clear()
+                self.flush()
+        finally:
+            connection.close()
+    
+    @staticmethod
+    def _write(increments):
+        """One UPDATE ... SET view_count = view_count + CASE id WHEN ... END per batch of questions"""
+        items = list(increments.items())
+        updates = 0
+        for start in range(0, len(items), settings.VIEW_COUNT_BATCH_SIZE):
+            batch = items[start:start + settings.VIEW_COUNT_BATCH_SIZE]
+            # update() skips save(), so updated_at and the post_save signals are left alone
+            Question.objects.filter(pk__in=[question_id for question_id, _ in batch]).update(
+                view_count=F('view_count') + Case(
+                    *[When(pk=question_id, then=Value(views)) for question_id, views in batch],
+                    default=Value(0), output_field=IntegerField()
+                )
+            )
+            updates += 1
+        return updates
+    
+    def flush(self):
+        """Write every pending increment; returns the number of views written"""
+        with self._lock:
+            increments, self._pending = self._pending, Counter()
+            viewers, self._viewers = self._viewers, defaultdict(set)
+        
+        if viewers:
+            try:
+                write_viewers(viewers)
+            except Exception as e:
+                print(f"Warning: viewer sketch flush failed - {e}")
+                with self._lock:
+                    self._counters['failed_flushes'] += 1
+                    for key, hashes in viewers.items():
+                        self._viewers[key].update(hashes)
+        
+        if not increments:
+            return 0
+        
+        try:
+            updates = self._write(increments)
+        except Exception as e:
+            print(f"Warning: view count flush failed - {e}")
+            with self._lock:
+                self._counters['failed_flushes'] += 1
+                # Keep the increments for the next flush; one entry per question keeps this bounded
+                self._pending.update(increments)
+            return 0
+        
+        views = sum(increments.values())
+        with self._lock:
+            self._counters['flushed'] += views
+            self._counters['updates'] += updates
+        return views
+    
+    def close(self):
+        """Stop buffering and write what is left (registered with atexit)"""
+        self._closed = True
+        self._wakeup.set()
+        self.flush()
+    
+    def stats(self):
+        with self._lock:
+            return {'pending_questions': len(self._pending), 'pending_views': sum(self._pending.values()),
+                    'pending_viewers': sum(len(hashes) for hashes in self._viewers.values()), **self._counters}
+
+
+# Global view counter instance
+view_counter = ViewCounter()
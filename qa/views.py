@@ -1,21 +1,81 @@
 from rest_framework import viewsets, status, permissions
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from rest_framework.renderers import JSONRenderer
 from django.shortcuts import get_object_or_404
 from django.contrib.auth import get_user_model
-from django.db.models import Q, Count, Sum, Avg
-from .models import Question, Answer, LearningJournal, AIService, UserPreference
+from django.conf import settings
+from django.db.models import Q, Count, Sum, OuterRef, Subquery, Prefetch
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from datetime import timedelta
+from .models import Question, Answer, LearningJournal, AIService, AIJob, UserPreference
 from .serializers import (
     QuestionSerializer, QuestionCreateSerializer, AnswerSerializer, AnswerCreateSerializer,
-    LearningJournalSerializer, UserPreferenceSerializer, AIServiceSerializer
+    LearningJournalSerializer, UserPreferenceSerializer, AIServiceSerializer, AIJobSerializer,
+    AIJobFilterSerializer
 )
 from communities.models import Community
 from .ai_services import ai_manager
+from .similarity import similarity_index
+from .tag_model import tag_suggester
+from .ai_budget import ai_budget
+from .ai_audit import ai_audit
+from .ai_rollups import usage_summary
+from .confidence import get_summary, describe_summary
+from .learning_paths import get_learning_path
+from .draft_cache import draft_cache
+from . import ai_responses
+from .ai_responses import ai_user, draft_scope, decode_ai_result
+from .streaming import EventStreamRenderer, event_stream_response
+from .votes import toggle_vote, my_vote, my_votes, UPVOTE, DOWNVOTE
+from .unique_viewers import viewer_hash, unique_viewers
 import json
+import uuid
 
 User = get_user_model()
 
 
+def _count_of(queryset, field):
+    """Correlated subquery counting the rows of queryset whose field points at the outer row"""
+    counts = queryset.filter(**{field: OuterRef('pk')}).order_by().values(field).annotate(count=Count('*'))
+    return Coalesce(Subquery(counts.values('count')), 0)
+
+
+def _answers_for_serialization(request):
+    """Answers annotated with everything AnswerSerializer reads, so serializing many costs no extra queries"""
+    answers = Answer.objects.select_related('author')
+    if request.user.is_authenticated:
+        # Vote counts are stored on the answer itself; only the user's own vote is looked up
+        answers = answers.annotate(my_vote=my_vote(request.user))
+    return answers
+
+
+def _questions_for_serialization(request):
+    """Questions with their author, community, answers and counts loaded in a fixed number of queries"""
+    answers = _answers_for_serialization(request)
+    communities = Community.objects.select_related('owner').annotate(
+        members_count=_count_of(Community.members.through.objects.all(), 'community_id'),
+        mentors_count=_count_of(Community.mentors.through.objects.all(), 'community_id'),
+    )
+    return Question.objects.select_related('author').annotate(
+        answers_count=_count_of(Answer.objects.all(), 'question_id'),
+    ).prefetch_related(
+        Prefetch('community', queryset=communities),
+        Prefetch('answers', queryset=answers),
+        Prefetch('resolved_answer', queryset=answers),
+    )
+
+
+def _parse_time(value):
+    """Aware datetime from an ISO 8601 query parameter, or None"""
+    parsed = parse_datetime(value or '')
+    if parsed is not None and timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
 class QuestionViewSet(viewsets.ModelViewSet):
     """ViewSet for Question model with AI assistance"""
     queryset = Question.objects.all()
@@ -26,70 +86,86 @@ class QuestionViewSet(viewsets.ModelViewSet):
             return QuestionCreateSerializer
         return QuestionSerializer
     
+    # Actions that serialize questions; the others only need the question row
+    serializing_actions = {'list', 'retrieve', 'update', 'partial_update', 'search', 'featured'}
+    
     def get_queryset(self):
         """Filter questions based on user's communities"""
         # Temporarily return all questions for testing
-        return Question.objects.all().select_related('author', 'community').prefetch_related('answers', 'tags')
+        if self.action in self.serializing_actions:
+            return _questions_for_serialization(self.request)
+        return Question.objects.all().select_related('author', 'community')
         # user = self.request.user
         # return Question.objects.filter(
         #     community__members=user
         # ).select_related('author', 'community').prefetch_related('answers', 'tags')
     
-    def perform_create(self, serializer):
-        """Create question with AI assistance"""
-        question = serializer.save()
+    @action(detail=True, methods=['post'])
+    def improve_with_ai(self, request, pk=None):
+        """Improve question using AI"""
+        question = self.get_object()
         
-        # Automatically improve question with AI
         ai_result, ai_service = ai_manager.improve_question(
-            question.title, question.content
+            question.title, question.content,
+            user=ai_user(request.user), community=question.community_id
         )
         
-        if ai_result:
-            try:
-                ai_data = json.loads(ai_result)
-                question.ai_improved_title = ai_data.get('improved_title', '')
-                question.ai_improved_content = ai_data.get('improved_content', '')
-                question.ai_suggested_tags = ai_data.get('suggested_tags', [])
-                question.ai_similar_questions = ai_data.get('similar_questions', [])
-                question.save()
-            except json.JSONDecodeError:
-                pass  # Continue without AI improvement if parsing fails
+        ai_data, error = decode_ai_result(ai_result, 'Failed to improve question with AI')
+        if error:
+            return Response(error, status=status.HTTP_400_BAD_REQUEST)
+        
+        ai_responses.apply_question_improvement(question, ai_data)
+        question.save(update_fields=ai_responses.QUESTION_IMPROVEMENT_FIELDS)
+        return Response(ai_responses.question_improvement(question, ai_data))
     
     @action(detail=True, methods=['post'])
-    def improve_with_ai(self, request, pk=None):
-        """Improve question using AI"""
+    def enrich_with_ai(self, request, pk=None):
+        """Run all AI enrichment tasks for a question concurrently"""
         question = self.get_object()
         
-        ai_result, ai_service = ai_manager.improve_question(
-            question.title, question.content
-        )
+        outcomes = ai_manager.enrich_question(question)
         
-        if ai_result:
-            try:
-                ai_data = json.loads(ai_result)
-                question.ai_improved_title = ai_data.get('improved_title', '')
-                question.ai_improved_content = ai_data.get('improved_content', '')
-                question.ai_suggested_tags = ai_data.get('suggested_tags', [])
-                question.ai_similar_questions = ai_data.get('similar_questions', [])
-                question.save()
-                
-                return Response({
-                    'message': 'Question improved with AI',
-                    'improved_title': question.ai_improved_title,
-                    'improved_content': question.ai_improved_content,
-                    'suggested_tags': question.ai_suggested_tags,
-                    'confidence_score': ai_data.get('confidence_score', 0),
-                    'improvement_notes': ai_data.get('improvement_notes', '')
-                })
-            except json.JSONDecodeError:
-                return Response({
-                    'error': 'Failed to parse AI response'
-                }, status=status.HTTP_400_BAD_REQUEST)
+        if 'completed' in outcomes.values():
+            return Response({
+                'message': 'Question enriched with AI',
+                'tasks': outcomes,
+                'improved_title': question.ai_improved_title,
+                'improved_content': question.ai_improved_content,
+                'suggested_tags': question.ai_suggested_tags,
+                'similar_questions': question.ai_similar_questions
+            })
         
         return Response({
-            'error': 'Failed to improve question with AI'
+            'error': 'Failed to enrich question with AI',
+            'tasks': outcomes
         }, status=status.HTTP_400_BAD_REQUEST)
     
+    @action(detail=True, methods=['get'])
+    def similar(self, request, pk=None):
+        """Find similar questions in the same community using the local vector index"""
+        question = self.get_object()
+        
+        try:
+            k = int(request.query_params.get('k', settings.SIMILARITY_TOP_K))
+        except ValueError:
+            k = 0
+        if not 1 <= k <= 50:
+            return Response({
+                'error': 'k must be an integer between 1 and 50'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        # A read only; ai_similar_questions is written by the enrichment job
+        matches = similarity_index.similar_to(question, k=k)
+        ids = [question_id for question_id, score in matches]
+        
+        titles = dict(Question.objects.filter(id__in=ids).values_list('id', 'title'))
+        return Response({
+            'similar_questions': [
+                {'id': question_id, 'title': titles.get(uuid.UUID(question_id), ''), 'score': round(score, 4)}
+                for question_id, score in matches
+            ]
+        })
+    
     @action(detail=False, methods=['post'])
     def improve_draft_with_ai(self, request):
         """Improve question draft using AI before creating"""
@@ -101,35 +177,51 @@ class QuestionViewSet(viewsets.ModelViewSet):
                 'error': 'Title and content are required'
             }, status=status.HTTP_400_BAD_REQUEST)
         
-        ai_result, ai_service = ai_manager.improve_question(title, content)
+        # Small edits to a draft improved earlier in this session reuse that improvement
+        scope = draft_scope(request, request.user)
+        near_duplicate = draft_cache.lookup(scope, title, content)
+        if near_duplicate is not None:
+            improvement, served_from = near_duplicate
+            return Response(ai_responses.draft_response(improvement, served_from))
         
-        if ai_result:
-            try:
-                ai_data = json.loads(ai_result)
-                return Response({
-                    'message': 'Question draft improved with AI',
-                    'improved_title': ai_data.get('improved_title', ''),
-                    'improved_content': ai_data.get('improved_content', ''),
-                    'suggested_tags': ai_data.get('suggested_tags', []),
-                    'confidence_score': ai_data.get('confidence_score', 0),
-                    'improvement_notes': ai_data.get('improvement_notes', '')
-                })
-            except json.JSONDecodeError:
-                return Response({
-                    'error': 'Failed to parse AI response'
-                }, status=status.HTTP_400_BAD_REQUEST)
+        ai_result, ai_service = ai_manager.improve_question(
+            title, content,
+            user=ai_user(request.user), community=request.data.get('community') or None,
+            hedge=True  # The author is waiting on this one, so tail latency matters
+        )
         
-        return Response({
-            'error': 'Failed to improve question draft with AI'
-        }, status=status.HTTP_400_BAD_REQUEST)
+        ai_data, error = decode_ai_result(ai_result, 'Failed to improve question draft with AI')
+        if error:
+            return Response(error, status=status.HTTP_400_BAD_REQUEST)
+        
+        improvement = ai_responses.draft_improvement(ai_data)
+        draft_cache.store(scope, title, content, improvement)
+        return Response(ai_responses.draft_response(improvement, 'model'))
     
     @action(detail=True, methods=['post'])
     def increment_view(self, request, pk=None):
         """Increment question view count"""
         question = self.get_object()
-        question.increment_view_count()
+        question.increment_view_count(viewer=viewer_hash(request))
         return Response({'message': 'View count incremented'})
     
+    @action(detail=True, methods=['get'])
+    def unique_viewers(self, request, pk=None):
+        """Approximate distinct viewers, all time or over ?days= (merged from daily sketches)"""
+        question = self.get_object()
+        days = request.query_params.get('days')
+        if days is not None:
+            try:
+                days = int(days)
+            except ValueError:
+                days = 0
+            if not 1 <= days <= settings.UNIQUE_VIEWERS_MAX_DAYS:
+                return Response({
+                    'error': f"days must be between 1 and {settings.UNIQUE_VIEWERS_MAX_DAYS}"
+                }, status=status.HTTP_400_BAD_REQUEST)
+        
+        return Response(unique_viewers(question, days))
+    
     @action(detail=False, methods=['get'])
     def search(self, request):
         """Search questions by title and content"""
@@ -157,7 +249,8 @@ class QuestionViewSet(viewsets.ModelViewSet):
         question = self.get_object()
         
         ai_result, ai_service = ai_manager.suggest_tags(
-            question.title, question.content
+            question.title, question.content,
+            user=ai_user(request.user), community=question.community_id
         )
         
         if ai_result:
@@ -189,71 +282,54 @@ class AnswerViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         """Filter answers based on user's communities"""
         # Temporarily return all answers for testing
-        return Answer.objects.all().select_related('author', 'question', 'verified_by')
+        return _answers_for_serialization(self.request).select_related('question', 'verified_by')
         # user = self.request.user
         # return Answer.objects.filter(
         #     question__community__members=user
         # ).select_related('author', 'question', 'verified_by')
     
-    def perform_create(self, serializer):
-        """Create answer with AI feedback"""
-        answer = serializer.save()
+    def _vote(self, request, value, messages):
+        answer = self.get_object()
+        if not request.user.is_authenticated:
+            return Response({
+                'error': 'Log in to vote'
+            }, status=status.HTTP_401_UNAUTHORIZED)
         
-        # Automatically get AI feedback on the answer
-        ai_result, ai_service = ai_manager.provide_answer_feedback(
-            answer.content, answer.question.title
-        )
+        outcome = toggle_vote(answer, request.user, value)
         
-        if ai_result:
-            try:
-                ai_data = json.loads(ai_result)
-                answer.ai_feedback = ai_data.get('feedback', '')
-                answer.ai_improved_content = ai_data.get('improved_answer', '')
-                answer.ai_assessment_score = ai_data.get('assessment_score', 0)
-                answer.save()
-            except json.JSONDecodeError:
-                pass  # Continue without AI feedback if parsing fails
+        return Response({
+            'message': messages[outcome],
+            'vote_score': answer.score
+        })
     
     @action(detail=True, methods=['post'])
     def upvote(self, request, pk=None):
         """Upvote an answer"""
-        answer = self.get_object()
-        user = request.user
-        
-        if user in answer.downvotes.all():
-            answer.downvotes.remove(user)
-        
-        if user in answer.upvotes.all():
-            answer.upvotes.remove(user)
-            message = 'Upvote removed'
-        else:
-            answer.upvotes.add(user)
-            message = 'Answer upvoted'
-        
-        return Response({
-            'message': message,
-            'vote_score': answer.get_vote_score()
-        })
+        return self._vote(request, UPVOTE, {'added': 'Answer upvoted', 'removed': 'Upvote removed'})
     
     @action(detail=True, methods=['post'])
     def downvote(self, request, pk=None):
         """Downvote an answer"""
-        answer = self.get_object()
-        user = request.user
-        
-        if user in answer.upvotes.all():
-            answer.upvotes.remove(user)
+        return self._vote(request, DOWNVOTE, {'added': 'Answer downvoted', 'removed': 'Downvote removed'})
+    
+    @action(detail=False, methods=['get'])
+    def my_votes(self, request):
+        """Current user's votes on the answers in ?ids= (comma-separated), as {answer_id: 1 or -1}"""
+        try:
+            ids = [uuid.UUID(answer_id) for answer_id in request.query_params.get('ids', '').split(',') if answer_id]
+        except ValueError:
+            return Response({
+                'error': 'ids must be comma-separated answer ids'
+            }, status=status.HTTP_400_BAD_REQUEST)
         
-        if user in answer.downvotes.all():
-            answer.downvotes.remove(user)
-            message = 'Downvote removed'
-        else:
-            answer.downvotes.add(user)
-            message = 'Answer downvoted'
+        if len(ids) > settings.MY_VOTES_MAX_IDS:
+            return Response({
+                'error': f"At most {settings.MY_VOTES_MAX_IDS} ids per request"
+            }, status=status.HTTP_400_BAD_REQUEST)
         
+        votes = my_votes(request.user, ids)
         return Response({
-            'message': message,
-            'vote_score': answer.get_vote_score()
+            'votes': {str(answer_id): value for answer_id, value in votes.items()}
         })
     
     @action(detail=True, methods=['post'])
@@ -281,7 +357,7 @@ class AnswerViewSet(viewsets.ModelViewSet):
         if user.is_mentor and user in answer.question.community.mentors.all():
             answer.mentor_verified = True
             answer.verified_by = user
-            answer.save()
+            answer.save(update_fields=['mentor_verified', 'verified_by', 'updated_at'])
             
             # Create learning journal entry
             LearningJournal.objects.create(
@@ -304,28 +380,15 @@ class AnswerViewSet(viewsets.ModelViewSet):
         answer = self.get_object()
         
         ai_result, ai_service = ai_manager.provide_answer_feedback(
-            answer.content, answer.question.title
+            answer.content, answer.question.title,
+            user=ai_user(request.user), community=answer.question.community_id
         )
         
-        if ai_result:
-            try:
-                ai_data = json.loads(ai_result)
-                return Response({
-                    'assessment_score': ai_data.get('assessment_score', 0),
-                    'feedback': ai_data.get('feedback', ''),
-                    'suggestions': ai_data.get('suggestions', []),
-                    'improved_answer': ai_data.get('improved_answer', ''),
-                    'learning_points': ai_data.get('learning_points', []),
-                    'confidence_boost': ai_data.get('confidence_boost', '')
-                })
-            except json.JSONDecodeError:
-                return Response({
-                    'error': 'Failed to parse AI response'
-                }, status=status.HTTP_400_BAD_REQUEST)
+        ai_data, error = decode_ai_result(ai_result, 'Failed to get AI feedback')
+        if error:
+            return Response(error, status=status.HTTP_400_BAD_REQUEST)
         
-        return Response({
-            'error': 'Failed to get AI feedback'
-        }, status=status.HTTP_400_BAD_REQUEST)
+        return Response(ai_responses.answer_feedback(ai_data))
     
     @action(detail=True, methods=['post'])
     def improve_with_ai(self, request, pk=None):
@@ -333,21 +396,64 @@ class AnswerViewSet(viewsets.ModelViewSet):
         answer = self.get_object()
         
         ai_result, ai_service = ai_manager.improve_answer(
-            answer.content, answer.question.title
+            answer.content, answer.question.title,
+            user=ai_user(request.user), community=answer.question.community_id
         )
         
         if ai_result:
+            # Votes cast during the AI call must not be overwritten by this instance's stale counters
             answer.ai_improved_content = ai_result
-            answer.save()
+            answer.save(update_fields=['ai_improved_content', 'updated_at'])
             
-            return Response({
-                'message': 'Answer improved with AI',
-                'improved_content': ai_result
-            })
+            return Response(ai_responses.answer_improvement(ai_result))
         
         return Response({
             'error': 'Failed to improve answer with AI'
         }, status=status.HTTP_400_BAD_REQUEST)
+    
+    @action(detail=True, methods=['post'], url_path='get_ai_feedback/stream',
+            renderer_classes=[EventStreamRenderer, JSONRenderer])
+    def stream_ai_feedback(self, request, pk=None):
+        """Stream AI feedback on an answer as Server-Sent Events and save it when complete"""
+        answer = self.get_object()
+        
+        def save(ai_result, ai_service):
+            ai_data = json.loads(ai_result)
+            answer.ai_feedback = ai_data.get('feedback', '')
+            answer.ai_improved_content = ai_data.get('improved_answer', '')
+            answer.ai_suggestions = ai_data.get('suggestions', [])
+            answer.ai_status = 'completed'
+            answer.save(update_fields=[
+                'ai_feedback', 'ai_improved_content', 'ai_suggestions', 'ai_status', 'updated_at'
+            ])
+            return ai_responses.answer_feedback(ai_data)
+        
+        return event_stream_response(
+            ai_manager.stream_answer_feedback(
+                answer.content, answer.question.title,
+                user=ai_user(request.user), community=answer.question.community_id
+            ),
+            save
+        )
+    
+    @action(detail=True, methods=['post'], url_path='improve_with_ai/stream',
+            renderer_classes=[EventStreamRenderer, JSONRenderer])
+    def stream_improve_with_ai(self, request, pk=None):
+        """Stream an AI-improved answer as Server-Sent Events and save it when complete"""
+        answer = self.get_object()
+        
+        def save(ai_result, ai_service):
+            answer.ai_improved_content = ai_result
+            answer.save(update_fields=['ai_improved_content', 'updated_at'])
+            return ai_responses.answer_improvement(ai_result)
+        
+        return event_stream_response(
+            ai_manager.stream_answer_improvement(
+                answer.content, answer.question.title,
+                user=ai_user(request.user), community=answer.question.community_id
+            ),
+            save
+        )
 
 
 class LearningJournalViewSet(viewsets.ReadOnlyModelViewSet):
@@ -385,53 +491,24 @@ class LearningJournalViewSet(viewsets.ReadOnlyModelViewSet):
     def analyze_confidence_trend(self, request):
         """Analyze user's confidence trends using AI"""
         user = request.user
-        user_answers = Answer.objects.filter(author=user).order_by('created_at')
+        # Numbers come from the stored summary; the AI only writes the narrative
+        trend = describe_summary(get_summary(user))
         
-        ai_result, ai_service = ai_manager.analyze_confidence_trend(user_answers)
+        ai_result, ai_service = ai_manager.analyze_confidence_trend(trend, user=ai_user(request.user))
         
-        if ai_result:
-            try:
-                ai_data = json.loads(ai_result)
-                return Response({
-                    'trend_analysis': ai_data.get('trend_analysis', ''),
-                    'learning_insights': ai_data.get('learning_insights', []),
-                    'recommendations': ai_data.get('recommendations', []),
-                    'encouragement': ai_data.get('encouragement', ''),
-                    'growth_score': ai_data.get('growth_score', 0)
-                })
-            except json.JSONDecodeError:
-                return Response({
-                    'error': 'Failed to parse AI response'
-                }, status=status.HTTP_400_BAD_REQUEST)
+        ai_data, error = decode_ai_result(ai_result, 'Failed to analyze confidence trends')
+        if error:
+            return Response(error, status=status.HTTP_400_BAD_REQUEST)
         
-        return Response({
-            'error': 'Failed to analyze confidence trends'
-        }, status=status.HTTP_400_BAD_REQUEST)
+        return Response(ai_responses.confidence_trend(ai_data, trend))
     
     @action(detail=False, methods=['post'])
     def suggest_learning_path(self, request):
-        """Get AI-suggested learning path"""
-        user = request.user
-        community_questions = Question.objects.filter(
-            community__members=user
-        ).order_by('-created_at')[:50]
+        """Get AI-suggested learning path (cached; stale paths are refreshed in the background)"""
+        entry, stale = get_learning_path(request.user)
         
-        ai_result, ai_service = ai_manager.suggest_learning_path(user, community_questions)
-        
-        if ai_result:
-            try:
-                ai_data = json.loads(ai_result)
-                return Response({
-                    'skill_level': ai_data.get('skill_level', 'beginner'),
-                    'next_steps': ai_data.get('next_steps', []),
-                    'focus_topics': ai_data.get('focus_topics', []),
-                    'learning_goals': ai_data.get('learning_goals', []),
-                    'mentor_advice': ai_data.get('mentor_advice', '')
-                })
-            except json.JSONDecodeError:
-                return Response({
-                    'error': 'Failed to parse AI response'
-                }, status=status.HTTP_400_BAD_REQUEST)
+        if entry is not None:
+            return Response(ai_responses.learning_path(entry, stale))
         
         return Response({
             'error': 'Failed to generate learning path'
@@ -473,18 +550,97 @@ class AIServiceViewSet(viewsets.ReadOnlyModelViewSet):
     
     @action(detail=False, methods=['get'])
     def stats(self, request):
-        """Get AI service statistics"""
-        total_services = AIService.objects.count()
-        avg_processing_time = AIService.objects.aggregate(
-            Avg('processing_time')
-        )['processing_time__avg'] or 0
+        """Get AI service statistics for a time range (default: last 24 hours)"""
+        until = _parse_time(request.query_params.get('until')) or timezone.now()
+        since = _parse_time(request.query_params.get('since'))
+        if since is None:
+            try:
+                since = until - timedelta(hours=int(request.query_params.get('hours', 24)))
+            except ValueError:
+                return Response({
+                    'error': 'hours must be an integer'
+                }, status=status.HTTP_400_BAD_REQUEST)
         
-        service_types = AIService.objects.values('service_type').annotate(
-            count=Count('id')
-        ).order_by('-count')
+        period = request.query_params.get('period')
+        if period not in (None, 'hour', 'day'):
+            return Response({
+                'error': 'period must be hour or day'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        # Rollups keep this independent of how much AIService history exists
+        usage = usage_summary(since, until, period)
         
         return Response({
-            'total_services': total_services,
-            'avg_processing_time': avg_processing_time,
-            'service_types': service_types
+            'total_services': usage['totals']['count'],
+            'avg_processing_time': usage['totals']['avg_processing_time'],
+            'latency_ms': usage['totals']['latency_ms'],
+            'service_types': usage['service_types'],
+            'range': {'since': usage['since'], 'until': usage['until'], 'period': usage['period']},
+            'cache': ai_manager.cache.stats(),
+            'single_flight': ai_manager.single_flight.stats(),
+            'async_single_flight': ai_manager.async_single_flight.stats(),
+            'local_tags': tag_suggester.stats(),
+            'audit': ai_audit.stats(),
+            # Since process start, per service type and prompt version
+            'parsing': ai_manager.parse_stats.stats(),
+            'draft_cache': draft_cache.stats(),
+            'routing': ai_manager.router.stats()
         })
+    
+    @action(detail=False, methods=['get'])
+    def health(self, request):
+        """Get circuit breaker state and resilience counters for upstream AI calls"""
+        resilience = ai_manager.resilience.stats()
+        return Response({
+            'available': ai_manager.backend is not None,
+            'backend': ai_manager.backend.name if ai_manager.backend else None,
+            'model': ai_manager.model_name,
+            'degraded': resilience['breaker']['state'] != 'closed',
+            **resilience
+        })
+    
+    @action(detail=False, methods=['get'])
+    def budgets(self, request):
+        """Get AI token budgets and token usage per community and user"""
+        try:
+            hours = int(request.query_params.get('hours', 24))
+        except ValueError:
+            return Response({
+                'error': 'hours must be an integer'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        since = timezone.now() - timedelta(hours=hours)
+        recent = AIService.objects.filter(created_at__gte=since)
+        usage = dict(
+            calls=Count('id'),
+            prompt_tokens=Sum('prompt_tokens'),
+            completion_tokens=Sum('completion_tokens'),
+            total_tokens=Sum('tokens_used')
+        )
+        
+        return Response({
+            'limits': settings.AI_BUDGETS,
+            'buckets': ai_budget.snapshot(),
+            'hours': hours,
+            'by_community': recent.exclude(community=None).values(
+                'community', 'community__name'
+            ).annotate(**usage).order_by('-total_tokens')[:50],
+            'by_user': recent.exclude(user=None).values(
+                'user', 'user__username'
+            ).annotate(**usage).order_by('-total_tokens')[:50]
+        })
+
+
+class AIJobViewSet(viewsets.ReadOnlyModelViewSet):
+    """ViewSet for polling the status of queued AI jobs"""
+    serializer_class = AIJobSerializer
+    permission_classes = [permissions.AllowAny]  # Temporarily allow all access
+    
+    def get_queryset(self):
+        queryset = AIJob.objects.all()
+        
+        # Allow clients to look up the job for a question or answer they just created
+        params = {field: value for field, value in self.request.query_params.items() if value}
+        filters = AIJobFilterSerializer(data=params)
+        filters.is_valid(raise_exception=True)
+        return queryset.filter(**filters.validated_data)
@@ -0,0 +1,91 @@
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import Answer, Vote
+
+
+UPVOTE = 1
+DOWNVOTE = -1
+
+
+def toggle_vote(answer, user, value):
+    """Cast, withdraw or switch a user's vote on an answer; returns 'added' or 'removed'
+
+    Repeating the current vote withdraws it with one DELETE; anything else is
+    one INSERT ... ON CONFLICT UPDATE on the (answer, user) unique constraint.
+    The denormalized counters move by the difference with F() updates in the
+    same transaction.
+    """
+    with transaction.atomic():
+        # Votes on one answer take turns, so the previous vote read below stays current
+        Answer.objects.select_for_update().only('pk').get(pk=answer.pk)
+        previous = Vote.objects.filter(answer_id=answer.pk, user_id=user.pk).values_list('value', flat=True).first()
+        
+        if previous == value:
+            Vote.objects.filter(answer_id=answer.pk, user_id=user.pk).delete()
+            current = None
+        else:
+            Vote.objects.bulk_create(
+                [Vote(answer_id=answer.pk, user_id=user.pk, value=value)],
+                update_conflicts=True, unique_fields=['answer', 'user'], update_fields=['value', 'updated_at']
+            )
+            current = value
+        
+        up_change = (current == UPVOTE) - (previous == UPVOTE)
+        down_change = (current == DOWNVOTE) - (previous == DOWNVOTE)
+        Answer.objects.filter(pk=answer.pk).update(
+            upvote_count=F('upvote_count') + up_change,
+            downvote_count=F('downvote_count') + down_change,
+            score=F('score') + up_change - down_change,
+        )
+    
+    answer.refresh_from_db(fields=['upvote_count', 'downvote_count', 'score'])
+    return 'added' if current is not None else 'removed'
+
+
+def my_votes(user, answer_ids):
+    """{answer_id: 1 or -1} for the user's votes among answer_ids, in one query"""
+    if not user.is_authenticated:
+        return {}
+    return dict(Vote.objects.filter(user=user, answer_id__in=answer_ids).values_list('answer_id', 'value'))
+
+
+def my_vote(user):
+    """Subquery annotation with the user's vote (1, -1 or None) on each answer"""
+    return Subquery(Vote.objects.filter(answer_id=OuterRef('pk'), user_id=user.pk).values('value')[:1])
+
+
+def _vote_count(value):
+    counts = Vote.objects.filter(answer_id=OuterRef('pk'), value=value).order_by().values('answer_id').annotate(
+        count=Count('*')
+    )
+    return Coalesce(Subquery(counts.values('count')), 0)
+
+
+def drifted_answers():
+    """Answers whose stored vote counts differ from their Vote rows, annotated with the true counts"""
+    return Answer.objects.annotate(
+        actual_upvotes=_vote_count(UPVOTE),
+        actual_downvotes=_vote_count(DOWNVOTE),
+    ).filter(
+        ~Q(upvote_count=F('actual_upvotes'))
+        | ~Q(downvote_count=F('actual_downvotes'))
+        | ~Q(score=F('actual_upvotes') - F('actual_downvotes'))
+    )
+
+
+def reconcile_vote_counts(batch_size=500):
+    """Recount the votes of drifted answers; returns how many were repaired"""
+    repaired = 0
+    while True:
+        batch = list(drifted_answers().values_list('pk', flat=True)[:batch_size])
+        # Counted in the UPDATE itself, so votes cast since the drift check are included
+        Answer.objects.filter(pk__in=batch).update(
+            upvote_count=_vote_count(UPVOTE),
+            downvote_count=_vote_count(DOWNVOTE),
+            score=_vote_count(UPVOTE) - _vote_count(DOWNVOTE),
+        )
+        repaired += len(batch)
+        if len(batch) < batch_size:
+            return repaired
@@ -14,3 +14,12 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'stackit_backend.settings')
 
 application = get_asgi_application()
+
+# Pre-connect the AI backend once the application is loaded. Servers that fork
+# after loading (gunicorn --preload) should call qa.ai_services.warm_up from
+# their post_fork hook instead, so each worker opens its own connections.
+from django.conf import settings  # noqa: E402
+
+if settings.AI_WARM_UP:
+    from qa.ai_services import warm_up
+    warm_up()
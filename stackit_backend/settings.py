@@ -160,3 +160,157 @@ GEMINI_API_KEY = "API_KEY
 
 # Custom user model
 AUTH_USER_MODEL = 'users.User'
+
+# Background AI job queue (see qa/ai_jobs.py and the run_ai_worker command)
+AI_JOB_WORKERS = 4
+AI_JOB_POLL_INTERVAL = 1.0  # Seconds an idle worker sleeps before polling again
+AI_JOB_MAX_ATTEMPTS = 3
+AI_JOB_RETRY_DELAY = 30  # Seconds before the first retry, doubled on each attempt
+AI_JOB_STALE_AFTER = 600  # Seconds before a running job is considered abandoned
+AI_JOB_STALE_SWEEP_INTERVAL = 60  # Seconds between each worker's checks for abandoned jobs
+
+# AI response cache (see qa/ai_cache.py); TTLs are in seconds, 0 disables caching
+AI_CACHE_MEMORY_MAX_ENTRIES = 1000
+AI_CACHE_DB_MAX_ENTRIES = 50000
+AI_CACHE_DEFAULT_TTL = 60 * 60 * 24
+AI_CACHE_TTLS = {
+    'question_improvement': 60 * 60 * 24 * 7,
+    'answer_feedback': 60 * 60 * 24 * 7,
+    'answer_improvement': 60 * 60 * 24 * 7,
+    'tag_suggestion': 60 * 60 * 24 * 30,
+    'similar_questions': 60 * 60,  # Community content changes quickly
+    'confidence_analysis': 60 * 60 * 6,
+    'learning_path': 60 * 60 * 6,
+}
+
+# Concurrent question enrichment (AIServiceManager.enrich_question)
+AI_ENRICH_MAX_WORKERS = 8
+AI_ENRICH_TIMEOUTS = {  # Seconds each model task may take before it is skipped
+    'improvement': 30,
+    'tags': 15,
+}
+
+# Local similar-question index (see qa/similarity.py)
+SIMILARITY_INDEX_DIM = 1 << 20  # Hashed n-gram dimensions; vectors are sparse, so a large space costs nothing
+SIMILARITY_INDEX_MAX_FEATURES = 128  # Strongest features stored per question, about 800 bytes of postings
+SIMILARITY_INDEX_SYNC_INTERVAL = 30  # Seconds between catch-up syncs with the database
+SIMILARITY_INDEX_REBUILD_INTERVAL = 60 * 60  # Seconds between full rebuilds
+SIMILARITY_INDEX_FIRST_BUILD_WAIT = 0.5  # Seconds the first lookup of a community waits for its index
+SIMILARITY_INDEX_JOB_WAIT = 60  # Seconds an enrichment job waits for a community's first index build
+SIMILARITY_MIN_SCORE = 0.2
+SIMILARITY_TOP_K = 5
+
+# Offline tag suggester (see qa/tag_model.py and the train_tag_model command)
+TAG_MODEL_DIR = BASE_DIR / 'var' / 'tag_model'
+TAG_MODEL_DIM = 1024
+TAG_MODEL_MIN_COUNT = 5  # Tags used on fewer questions are left to the LLM
+TAG_MODEL_MAX_TAGS = 5000
+TAG_MODEL_MIN_TAG_SCORE = 0.15
+TAG_MODEL_CONFIDENCE_THRESHOLD = 0.35  # Below this top score the LLM is asked instead
+TAG_MODEL_RELOAD_INTERVAL = 60  # Seconds between checks for a retrained model
+
+# AI token budgets (see qa/ai_budget.py), shared by all processes and enforced before each model call
+AI_BUDGETS = {
+    'community': {'capacity': 200000, 'refill_per_hour': 100000},
+    'user': {'capacity': 40000, 'refill_per_hour': 20000},
+}
+AI_BUDGET_RESERVE_ATTEMPTS = 5  # Retries when another process changes a bucket during a reservation
+AI_COMPLETION_TOKEN_ESTIMATES = {  # Expected completion size, reserved before the call
+    'question_improvement': 800,
+    'answer_feedback': 800,
+    'answer_improvement': 1000,
+    'tag_suggestion': 50,
+    'similar_questions': 50,
+    'confidence_analysis': 500,
+    'learning_path': 600,
+}
+
+# Resilience around upstream model calls (see qa/ai_resilience.py)
+AI_CALL_MAX_WORKERS = 16  # Threads running model requests, including abandoned ones
+AI_DEFAULT_DEADLINE = 20
+AI_DEADLINES = {  # Seconds a call may take in total, retries included
+    'question_improvement': 20,
+    'answer_feedback': 20,
+    'answer_improvement': 25,
+    'tag_suggestion': 8,
+    'similar_questions': 10,
+    'confidence_analysis': 20,
+    'learning_path': 25,
+}
+AI_RETRY = {'attempts': 3, 'base_delay': 0.5, 'max_delay': 4}  # Full-jitter exponential backoff
+AI_HEDGE_DELAY = 3  # Seconds before a hedged call sends its duplicate request
+AI_CIRCUIT_BREAKER = {
+    'window': 60,  # Seconds of outcomes the rates are computed over
+    'min_calls': 10,
+    'failure_rate': 0.5,
+    'slow_call_rate': 0.8,
+    'slow_call_seconds': 10,
+    'reset_timeout': 30,  # Seconds the breaker stays open before trial calls
+    'half_open_calls': 2,
+}
+
+# Model backend used by AIServiceManager (see qa/ai_backends.py): 'gemini', 'openai' or 'fake'
+AI_BACKEND = os.environ.get('AI_BACKEND', 'gemini')
+AI_MODEL_NAMES = {
+    'gemini': 'gemini-1.5-flash',
+    'openai': 'gpt-4o-mini',
+    'fake': 'fake-llm',
+}
+OPENAI_API_KEY = os.environ.get('OPENAI_API_KEY', '')
+OPENAI_BASE_URL = os.environ.get('OPENAI_BASE_URL') or None  # e.g. http://127.0.0.1:8765/v1 for run_fake_llm
+FAKE_LLM = {  # Offline fake model used by the 'fake' backend and the run_fake_llm command
+    'latency': {'distribution': 'lognormal', 'median': 0.8, 'sigma': 0.5},
+    'error_rate': 0.0,
+    'seed': 0,
+}
+
+# Load the AI backend when the WSGI/ASGI application starts instead of on the first AI request
+AI_WARM_UP = False
+
+# AIService audit records are buffered and written in batches (see qa/ai_audit.py)
+AI_AUDIT_BUFFERED = True
+AI_AUDIT_BATCH_SIZE = 100  # Flush once this many records are buffered
+AI_AUDIT_FLUSH_INTERVAL = 2.0  # ...or after this many seconds
+AI_AUDIT_MAX_BUFFER = 10000  # Oldest records are dropped beyond this while the database is failing
+
+# Cold storage for old AIService records (see qa/ai_archive.py and the archive_ai_history command)
+AI_ARCHIVE_DIR = BASE_DIR / 'var' / 'ai_archive'
+AI_ARCHIVE_RETENTION_DAYS = 90
+AI_ARCHIVE_CHUNK_SIZE = 1000
+
+# Per-user confidence summaries sent to the AI instead of full answer histories (see qa/confidence.py)
+CONFIDENCE_EWMA_ALPHA = 0.3  # Weight of the newest answer in the exponential moving average
+CONFIDENCE_RECENT_WINDOW = 20  # Answers kept for the recent moving average
+
+# Cached learning paths are regenerated in the background after this many seconds even without new activity
+LEARNING_PATH_MAX_AGE = 7 * 24 * 3600
+
+# Near-duplicate drafts in improve_draft_with_ai reuse an earlier improvement (see qa/draft_cache.py)
+AI_DRAFT_SIMHASH_DISTANCE = 6  # Max differing SimHash bits (of 64) to count as the same draft
+AI_DRAFT_CACHE_ENTRIES = 5  # Improved drafts remembered per session
+AI_DRAFT_CACHE_TTL = 1800
+
+# Trivial and well-formed requests are answered by local heuristics instead of the model (see qa/ai_routing.py);
+# question improvements only in background jobs, since a user asking for one wants the model's
+AI_ROUTING = {
+    'enabled': True,
+    'trivial_max_words': 20,  # Question bodies this short are handled locally
+    'well_formed_max_words': 300,  # Longest well-formed question handled locally
+    'answer_trivial_max_words': 12,  # Answers this short get local feedback in background jobs
+}
+
+# Pooled HTTP connections per event loop for the async AI views under /api/async/ (see qa/async_views.py)
+AI_ASYNC_MAX_CONNECTIONS = 100
+
+# Most answer ids accepted by GET /api/answers/my_votes/
+MY_VOTES_MAX_IDS = 200
+
+# Question views are buffered and added to view_count in batches (see qa/view_counter.py)
+VIEW_COUNT_BUFFERED = True
+VIEW_COUNT_FLUSH_INTERVAL = 5.0  # Seconds between flushes
+VIEW_COUNT_BATCH_SIZE = 500  # Questions per UPDATE; a full buffer flushes early
+
+# Unique question viewers are counted with HyperLogLog sketches (see qa/unique_viewers.py)
+UNIQUE_VIEWERS_PRECISION = 12  # 4096 registers per sketch, about 1.6% standard error
+UNIQUE_VIEWERS_DAILY = True  # Also keep a sketch per question and day, for weekly and monthly uniques
+UNIQUE_VIEWERS_MAX_DAYS = 90  # Longest ?days= window of GET /api/questions/<id>/unique_viewers/
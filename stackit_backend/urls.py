@@ -23,8 +23,9 @@ from rest_framework.routers import DefaultRouter
 from users.views import UserViewSet, AuthViewSet
 from qa.views import (
     QuestionViewSet, AnswerViewSet, LearningJournalViewSet, 
-    UserPreferenceViewSet, AIServiceViewSet
+    UserPreferenceViewSet, AIServiceViewSet, AIJobViewSet
 )
+from qa import async_views
 from communities.views import CommunityViewSet, CommunityInviteViewSet, CommunityJoinRequestViewSet
 from .views import serve_frontend
 
@@ -37,6 +38,7 @@ router.register(r'answers', AnswerViewSet, basename='answer')
 router.register(r'learning-journal', LearningJournalViewSet, basename='learning-journal')
 router.register(r'preferences', UserPreferenceViewSet, basename='preference')
 router.register(r'ai-services', AIServiceViewSet, basename='ai-service')
+router.register(r'ai-jobs', AIJobViewSet, basename='ai-job')
 router.register(r'communities', CommunityViewSet, basename='community')
 router.register(r'community-invites', CommunityInviteViewSet, basename='community-invite')
 router.register(r'community-join-requests', CommunityJoinRequestViewSet, basename='community-join-request')
@@ -46,6 +48,14 @@ urlpatterns = [
     path('api/', include(router.urls)),
     path('api-auth/', include('rest_framework.urls')),
     
+    # Async versions of the AI actions for ASGI deployments (see qa/async_views.py)
+    path('api/async/questions/improve_draft_with_ai/', async_views.improve_draft),
+    path('api/async/questions/<uuid:pk>/improve_with_ai/', async_views.improve_question),
+    path('api/async/answers/<uuid:pk>/get_ai_feedback/', async_views.answer_feedback),
+    path('api/async/answers/<uuid:pk>/improve_with_ai/', async_views.improve_answer),
+    path('api/async/learning-journal/analyze_confidence_trend/', async_views.analyze_confidence_trend),
+    path('api/async/learning-journal/suggest_learning_path/', async_views.suggest_learning_path),
+    
     # Frontend routes - serve HTML files
     path('', serve_frontend, {'page_name': 'index'}, name='home'),
     path('dashboard/', serve_frontend, {'page_name': 'dashboard'}, name='dashboard'),